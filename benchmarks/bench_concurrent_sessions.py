@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent chat sessions on the sync and async agent stacks.
+
+Both stacks talk to a local StubOpenAIServer and a stub Neo4j client, so the numbers show how many
+conversations a single process can push through, not OpenAI or AuraDB speed. The sync path runs
+sessions on a fixed number of worker threads, like a Streamlit server; the async path runs all
+sessions on one event loop.
+
+    python benchmarks/bench_concurrent_sessions.py --sessions 50 --sync-workers 8
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from utils.stub_backends import StubOpenAIServer, StubNeo4jClient, AsyncStubNeo4jClient
+
+
+def summarize(label, latencies, elapsed, failures):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)] if latencies else 0.0
+    print(f"{label:<6} sessions={len(latencies) + failures:<4} failures={failures:<3} "
+          f"wall={elapsed:6.2f}s throughput={len(latencies) / elapsed:6.2f} turns/s "
+          f"p50={statistics.median(latencies) if latencies else 0.0:5.2f}s p95={p95:5.2f}s")
+
+
+def run_sync(sessions, workers, query_latency):
+    from agent.openai_agent import OpenAIAgent
+
+    agent = OpenAIAgent()
+    neo4j_client = StubNeo4jClient(query_latency=query_latency)
+
+    def session(i):
+        started = time.perf_counter()
+        response = agent.chat_with_knowledgegraph(f"Which processes exist? (session {i})", neo4j_client)
+        return response["status"], time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(session, range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for status, latency in outcomes if status == "success"]
+    summarize("sync", latencies, elapsed, len(outcomes) - len(latencies))
+
+
+async def run_async(sessions, query_latency):
+    from agent.async_openai_agent import AsyncOpenAIAgent
+
+    async with AsyncOpenAIAgent() as agent:
+        neo4j_client = AsyncStubNeo4jClient(query_latency=query_latency)
+        await agent._ensure_assistant()
+
+        async def session(i):
+            started = time.perf_counter()
+            response = await agent.chat_with_knowledgegraph(f"Which processes exist? (session {i})", neo4j_client)
+            return response["status"], time.perf_counter() - started
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(session(i) for i in range(sessions)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for status, latency in outcomes if status == "success"]
+    summarize("async", latencies, elapsed, len(outcomes) - len(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent sessions on the sync and async agents")
+    parser.add_argument("--sessions", type=int, default=50, help="Number of concurrent chat turns (default: 50)")
+    parser.add_argument("--sync-workers", type=int, default=8, help="Worker threads for the sync path (default: 8)")
+    parser.add_argument("--model-latency", type=float, default=0.5, help="Seconds per stub assistant run (default: 0.5)")
+    parser.add_argument("--query-latency", type=float, default=0.05, help="Seconds per stub Neo4j query (default: 0.05)")
+    parser.add_argument("--polling", action="store_true", help="Poll runs instead of streaming them")
+    args = parser.parse_args()
+
+    with StubOpenAIServer(model_latency=args.model_latency) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_STREAMING"] = "false" if args.polling else "true"
+        # Every turn should go through Cypher generation, not the query cache
+        os.environ["CYPHER_CACHE_ENABLED"] = "false"
+
+        print(f"Stub OpenAI at {server.base_url}, {args.model_latency}s per run, "
+              f"{args.query_latency}s per query, {'polling' if args.polling else 'streaming'}")
+        run_sync(args.sessions, args.sync_workers, args.query_latency)
+        asyncio.run(run_async(args.sessions, args.query_latency))
+        print(f"Stub OpenAI handled {server.request_count} requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-report latency of compiling Typst reports to PDF with each backend.
+
+"cli" starts a `typst compile` process per report, as reports used to be compiled; "bindings" keeps
+a typst Python bindings compiler alive between reports. Every report has a table of the given number
+of rows and a unique title, so nothing is served from the report cache. The first report of a backend
+is shown separately, since the bindings discover the fonts then.
+
+    python benchmarks/bench_report_compile.py --rows 10,1000 --reports 10
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from utils.report_generator import TypstReportGenerator
+from utils.typst_compiler import create_compiler, typst
+
+
+def sample_rows(count):
+    return [
+        {"process": f"Process {i}", "owner": f"Team {i % 7}", "systems": i % 5, "status": "active" if i % 3 else "planned"}
+        for i in range(count)
+    ]
+
+
+def measure(backend, rows, reports, work_dir):
+    compiler = create_compiler(backend, pool_size=1)
+    generator = TypstReportGenerator(compiler=compiler)
+    data = sample_rows(rows)
+    latencies = []
+    for i in range(reports):
+        typst_file_path = os.path.join(work_dir, f"{backend}_{rows}_{i}.typ")
+        with open(typst_file_path, 'w', encoding='utf-8') as f:
+            f.write(generator._create_typst_content(f"Process report {i}", data, "Which processes are there?", ""))
+        started = time.perf_counter()
+        compiler.compile(typst_file_path, typst_file_path[:-4] + ".pdf")
+        latencies.append(time.perf_counter() - started)
+
+    warm = latencies[1:] or latencies
+    print(f"{backend:<9} rows={rows:<6} reports={reports:<4} first={latencies[0] * 1000:8.1f}ms "
+          f"warm_p50={statistics.median(warm) * 1000:8.1f}ms warm_mean={statistics.mean(warm) * 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-report Typst compile latency per backend")
+    parser.add_argument("--rows", default="10,1000", help="Comma separated table sizes (default: 10,1000)")
+    parser.add_argument("--reports", type=int, default=10, help="Reports compiled per backend and size (default: 10)")
+    args = parser.parse_args()
+
+    backends = []
+    if shutil.which("typst"):
+        backends.append("cli")
+    else:
+        print("typst CLI not found, skipping the cli backend")
+    if typst is not None:
+        backends.append("bindings")
+    else:
+        print("typst Python package not installed (pip install typst), skipping the bindings backend")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in [int(value) for value in args.rows.split(",")]:
+            for backend in backends:
+                measure(backend, rows, args.reports, work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark the memory and startup work of Streamlit sessions with per-session or shared resources.
+
+"per-session" builds a Neo4jClient and an OpenAIAgent for every session, like app.py used to;
+"shared" builds them once and gives each session only its messages and thread_id, like the
+st.cache_resource singletons in app.py. The agents talk to a local StubOpenAIServer and the Neo4j
+drivers are never connected, so the memory shown is the Python objects alone; with a database
+every per-session driver would also keep its own pool of up to NEO4J_MAX_POOL_SIZE connections.
+
+    python benchmarks/bench_session_memory.py --sessions 1,10,50
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from utils.stub_backends import StubOpenAIServer
+
+
+def build_sessions(count, shared):
+    """Create the resources of count sessions, returning them with everything to close afterwards."""
+    from agent.openai_agent import OpenAIAgent
+    from database.neo4j_client import Neo4jClient
+
+    if shared:
+        neo4j_client, agent = Neo4jClient(), OpenAIAgent()
+        sessions = [{"messages": [], "thread_id": None} for _ in range(count)]
+        return sessions, [(neo4j_client, agent)]
+    sessions = [{"messages": [], "thread_id": None, "neo4j_client": Neo4jClient(), "openai_agent": OpenAIAgent()}
+                for _ in range(count)]
+    return sessions, [(session["neo4j_client"], session["openai_agent"]) for session in sessions]
+
+
+def close_resources(resources):
+    for neo4j_client, agent in resources:
+        neo4j_client.close()
+        agent.__exit__(None, None, None)
+
+
+def measure(server, count, shared):
+    requests_before = server.request_count
+    threads_before = threading.active_count()
+    tracemalloc.start()
+    started = time.perf_counter()
+    sessions, resources = build_sessions(count, shared)
+    elapsed = time.perf_counter() - started
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    threads = threading.active_count() - threads_before
+    close_resources(resources)
+    del sessions, resources
+
+    label = "shared" if shared else "per-session"
+    print(f"{label:<12} sessions={count:<4} memory={allocated / 1024 / 1024:7.2f} MB "
+          f"startup={elapsed:6.2f}s api_requests={server.request_count - requests_before:<4} "
+          f"drivers={1 if shared else count:<4} threads={threads}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark session memory with per-session or shared resources")
+    parser.add_argument("--sessions", default="1,10,50", help="Comma separated session counts (default: 1,10,50)")
+    args = parser.parse_args()
+
+    with StubOpenAIServer(model_latency=0) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ.setdefault("NEO4J_URI", "neo4j://localhost:7687")
+        os.environ.setdefault("NEO4J_USERNAME", "neo4j")
+        os.environ.setdefault("NEO4J_PASSWORD", "stub")
+        os.environ["CYPHER_CACHE_ENABLED"] = "false"
+        os.environ["NEO4J_KILL_AFTER_SECONDS"] = "0"
+
+        # Warm up imports and the assistant registry, so only per-session work is measured
+        close_resources(build_sessions(1, shared=True)[1])
+
+        for count in [int(value) for value in args.sessions.split(",")]:
+            measure(server, count, shared=False)
+            measure(server, count, shared=True)
+
+
+if __name__ == "__main__":
+    main()
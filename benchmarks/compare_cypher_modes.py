@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare latency and accuracy of the Cypher generation modes (assistant, inline, completion).
+
+Each question is asked through chat_with_knowledgegraph in every mode. A turn counts as accurate when
+the rows of the last executed query match the rows of a hand-written reference query, ignoring column
+names and row order. Runs against the OpenAI and Neo4j credentials in src/.env, or against the local
+stubs with --stub (which only checks the plumbing, not accuracy).
+
+    python benchmarks/compare_cypher_modes.py --modes assistant inline completion
+"""
+
+import os
+import sys
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+QUESTIONS = [
+    ("List all processes in the knowledgegraph",
+     "MATCH (p:process) RETURN p.name"),
+    ("Which systems support the Car Rental process?",
+     "MATCH (p:process {name: 'Car Rental'})-[:has_step]->(:step)<-[:supports]-(sys:system) RETURN DISTINCT sys.name"),
+    ("Which department owns each process?",
+     "MATCH (d:department)-[:is_owner_of]->(p:process) RETURN d.name, p.name"),
+    ("Which roles perform steps in the Car Rental process?",
+     "MATCH (p:process {name: 'Car Rental'})-[:has_step]->(:step)<-[:performs]-(r:role) RETURN DISTINCT r.name"),
+    ("Which departments don't own a process?",
+     "MATCH (d:department) WHERE NOT (d)-[:is_owner_of]->(:process) RETURN d.name"),
+]
+
+
+def row_set(rows):
+    """Rows as a set of value tuples, so column aliases and ordering don't matter."""
+    return {tuple(sorted(str(value) for value in row.values())) for row in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Cypher generation modes")
+    parser.add_argument("--modes", nargs="+", default=["assistant", "inline", "completion"])
+    parser.add_argument("--stub", action="store_true", help="Use the local OpenAI and Neo4j stubs")
+    args = parser.parse_args()
+
+    # Measure generation, not the question cache
+    os.environ["CYPHER_CACHE_ENABLED"] = "false"
+
+    server = None
+    if args.stub:
+        from utils.stub_backends import StubOpenAIServer, StubNeo4jClient
+        server = StubOpenAIServer(model_latency=0.2).start()
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = "stub"
+        neo4j_client = StubNeo4jClient()
+    else:
+        from database.neo4j_client import Neo4jClient
+        neo4j_client = Neo4jClient()
+
+    from agent.openai_agent import OpenAIAgent
+
+    references = [row_set(neo4j_client.execute_query(cypher)) for _, cypher in QUESTIONS]
+    summary = []
+
+    for mode in args.modes:
+        agent = OpenAIAgent(cypher_mode=mode)
+        latencies = []
+        correct = 0
+        for (question, _), reference in zip(QUESTIONS, references):
+            response = agent.chat_with_knowledgegraph(question, neo4j_client)
+            latencies.append(response["metrics"]["latency_seconds"])
+            queries = response.get("executed_queries", [])
+            if queries and row_set(queries[-1]["results"]) == reference:
+                correct += 1
+        summary.append((mode, statistics.median(latencies), max(latencies), correct))
+
+    print(f"\n{'mode':<12}{'p50 turn':>10}{'max turn':>10}{'accurate':>10}")
+    for mode, p50, worst, correct in summary:
+        print(f"{mode:<12}{p50:>9.2f}s{worst:>9.2f}s{correct:>7}/{len(QUESTIONS)}")
+
+    if server is not None:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
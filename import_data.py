@@ -18,12 +18,57 @@ def main():
         default="main", 
         help="Git branch to import from (default: main)"
     )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Read the CSV files from the local data directory and send them in batches instead of LOAD CSV from GitHub"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Apply only the rows of the local CSV files that changed since the last import, without clearing the graph"
+    )
+    parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="Switch readers back to the database of the previous blue/green import"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Rows per write transaction in local mode (default: 1000)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Node files imported concurrently in local mode (default: 4)"
+    )
     
     args = parser.parse_args()
     
-    print(f"Starting CSV data import to Neo4j from {args.repo}...")
+    if args.rollback:
+        importer = CSVImporter()
+        try:
+            importer.rollback()
+        except Exception as e:
+            print(f"\n❌ Rollback failed: {e}")
+        finally:
+            importer.close()
+        return
+    
+    source = "the local data directory" if args.local or args.incremental else args.repo
+    print(f"Starting CSV data import to Neo4j from {source}...")
     
-    importer = CSVImporter(github_repo=args.repo, branch=args.branch)
+    importer = CSVImporter(
+        github_repo=args.repo,
+        branch=args.branch,
+        local=args.local,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        incremental=args.incremental
+    )
     
     try:
         importer.import_all_data()
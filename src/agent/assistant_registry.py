@@ -0,0 +1,198 @@
+import os
+import json
+import threading
+from openai.types.beta import Assistant
+from database.json_files import remove_stale_temp_files, write_json_atomic
+from .query_cache import schema_fingerprint
+
+
+def definition_hash(definition):
+    """Hash of an assistant definition (name, model, instructions and tools)."""
+    return schema_fingerprint(definition)
+
+
+def _matches(assistant, definition):
+    """True if an existing assistant has the model, instructions and function tools of a definition."""
+    def functions(tools):
+        return sorted(json.dumps({"name": tool["function"]["name"], "parameters": tool["function"].get("parameters")},
+                                 sort_keys=True)
+                      for tool in tools if tool.get("type") == "function")
+    tools = [tool.model_dump() if hasattr(tool, "model_dump") else tool for tool in assistant.tools or []]
+    return (
+        assistant.model == definition["model"]
+        and assistant.instructions == definition["instructions"]
+        and functions(tools) == functions(definition["tools"])
+    )
+
+
+class AssistantRegistry:
+    """
+    Process-wide map from assistant definitions to the OpenAI assistants implementing them.
+
+    A definition is resolved from memory, then from the cache file (no API call), then from
+    OPENAI_ASSISTANT_ID if that assistant matches the definition, then from the assistants tagged with
+    the definition hash, and finally by creating one. Assistants are shared by every agent and process
+    using the same definition, so they are never deleted on exit; a changed definition simply resolves
+    to a new assistant.
+
+    Entries are keyed by definition hash and remember the API base URL they were resolved with; an
+    entry for another base URL (e.g. a local stub) is resolved again and replaced. Resolving a
+    definition drops the entries of older definitions with the same name, so the registry holds one
+    entry per assistant name.
+    """
+
+    def __init__(self, cache_file=None):
+        if cache_file is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.cache')
+            cache_file = os.path.join(cache_dir, 'assistants.json')
+        self.cache_file = cache_file
+        self._assistants = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _key(client, definition):
+        return definition_hash(definition)
+
+    def _lookup(self, client, key):
+        entry = self._assistants.get(key)
+        if entry is not None and entry["base_url"] == str(client.base_url):
+            return entry["assistant"]
+        return None
+
+    def resolve(self, client, definition, refresh=False):
+        """
+        Return the assistant for a definition, creating it if needed.
+
+        Args:
+            client (OpenAI): Client to look up or create the assistant with
+            definition (dict): name, model, instructions and tools of the assistant
+            refresh (bool): Ignore the cached assistant, e.g. because it was deleted elsewhere
+        """
+        key = self._key(client, definition)
+        with self._lock:
+            if refresh:
+                self._forget(key)
+            assistant = self._lookup(client, key)
+            if assistant is None:
+                assistant = self._find_or_create(client, definition)
+                self._remember(key, client, definition, assistant)
+            return assistant
+
+    async def resolve_async(self, client, definition, refresh=False):
+        """Async variant of resolve for AsyncOpenAI; callers serialize resolutions themselves."""
+        key = self._key(client, definition)
+        if refresh:
+            with self._lock:
+                self._forget(key)
+        assistant = self._lookup(client, key)
+        if assistant is None:
+            assistant = await self._find_or_create_async(client, definition)
+            with self._lock:
+                self._remember(key, client, definition, assistant)
+        return assistant
+
+    def forget(self, client, definition):
+        """Drop the assistant of a definition, e.g. after deleting it."""
+        with self._lock:
+            self._forget(self._key(client, definition))
+
+    def _find_or_create(self, client, definition):
+        digest = definition_hash(definition)
+        assistant_id = os.getenv("OPENAI_ASSISTANT_ID")
+        if assistant_id:
+            try:
+                assistant = client.beta.assistants.retrieve(assistant_id=assistant_id)
+                if _matches(assistant, definition):
+                    print(f"Using assistant {assistant_id} from OPENAI_ASSISTANT_ID")
+                    return assistant
+                print(f"Assistant {assistant_id} from OPENAI_ASSISTANT_ID does not match the current definition")
+            except Exception as e:
+                print(f"Error retrieving assistant {assistant_id}: {e}")
+
+        try:
+            for assistant in client.beta.assistants.list(limit=100):
+                if (assistant.metadata or {}).get("definition_hash") == digest:
+                    print(f"Reusing existing assistant with ID: {assistant.id}")
+                    return assistant
+        except Exception as e:
+            print(f"Error listing assistants: {e}")
+
+        assistant = client.beta.assistants.create(**definition, metadata={"definition_hash": digest})
+        print(f"Created new assistant with ID: {assistant.id}")
+        return assistant
+
+    async def _find_or_create_async(self, client, definition):
+        digest = definition_hash(definition)
+        assistant_id = os.getenv("OPENAI_ASSISTANT_ID")
+        if assistant_id:
+            try:
+                assistant = await client.beta.assistants.retrieve(assistant_id=assistant_id)
+                if _matches(assistant, definition):
+                    print(f"Using assistant {assistant_id} from OPENAI_ASSISTANT_ID")
+                    return assistant
+                print(f"Assistant {assistant_id} from OPENAI_ASSISTANT_ID does not match the current definition")
+            except Exception as e:
+                print(f"Error retrieving assistant {assistant_id}: {e}")
+
+        try:
+            async for assistant in client.beta.assistants.list(limit=100):
+                if (assistant.metadata or {}).get("definition_hash") == digest:
+                    print(f"Reusing existing assistant with ID: {assistant.id}")
+                    return assistant
+        except Exception as e:
+            print(f"Error listing assistants: {e}")
+
+        assistant = await client.beta.assistants.create(**definition, metadata={"definition_hash": digest})
+        print(f"Created new assistant with ID: {assistant.id}")
+        return assistant
+
+    def _remember(self, key, client, definition, assistant):
+        # Older definitions of the same assistant are superseded by this one
+        for stale_key in [other for other, entry in self._assistants.items()
+                          if entry["name"] == definition["name"] and other != key]:
+            del self._assistants[stale_key]
+        self._assistants[key] = {"base_url": str(client.base_url), "name": definition["name"], "assistant": assistant}
+        self._save()
+
+    def _forget(self, key):
+        if self._assistants.pop(key, None) is not None:
+            self._save()
+
+    def _load(self):
+        remove_stale_temp_files(os.path.dirname(self.cache_file))
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except Exception as e:
+            print(f"Could not load assistant registry: {e}")
+            return
+        for key, entry in stored.items():
+            # Entries of the earlier "<base_url>#<hash>" layout are resolved again
+            if not isinstance(entry, dict) or "assistant" not in entry:
+                continue
+            self._assistants[key] = {**entry, "assistant": Assistant.model_construct(**entry["assistant"])}
+
+    def _save(self):
+        try:
+            write_json_atomic(self.cache_file, {
+                key: {**entry, "assistant": entry["assistant"].model_dump(mode="json")}
+                for key, entry in self._assistants.items()
+            })
+        except Exception as e:
+            print(f"Could not save assistant registry: {e}")
+
+
+_shared_registry = None
+_shared_registry_lock = threading.Lock()
+
+
+def shared_registry():
+    """The registry shared by all agents of this process."""
+    global _shared_registry
+    with _shared_registry_lock:
+        if _shared_registry is None:
+            _shared_registry = AssistantRegistry()
+        return _shared_registry
@@ -0,0 +1,547 @@
+import os
+import json
+import time
+import asyncio
+from openai import AsyncOpenAI, NotFoundError
+from dotenv import load_dotenv
+from .openai_agent import OpenAIAgent
+from .turn import Turn, RunOutcome, PendingMessages, RUN_FINAL_STATES, tool_error_output, tool_timeout_output
+from .metrics import TurnMetrics, RepairStats
+from .query_templates import ENTITY_INDEX_QUERY
+from .result_budget import ResultBudget
+from .cypher_preflight import CypherPreflight, CypherPreflightError
+from .thread_janitor import AsyncThreadJanitor
+from .assistant_registry import shared_registry
+from database.neo4j_client import Neo4jQueryError
+from database.query_control import Cancelled
+
+class AsyncOpenAIAgent(OpenAIAgent):
+    """
+    asyncio variant of OpenAIAgent built on AsyncOpenAI, for serving many conversations from one process.
+
+    Instructions, tool definitions and result formatting are shared with OpenAIAgent; every method that
+    talks to OpenAI or Neo4j is a coroutine here and expects an AsyncNeo4jClient. The assistant is
+    resolved on first use because __init__ cannot await.
+    """
+
+    def __init__(self, streaming=None, cypher_mode=None, assistant_registry=None):
+        load_dotenv()
+
+        self.api_key = os.getenv("OPENAI_API_KEY")
+        self.client = AsyncOpenAI(api_key=self.api_key)
+        self.cypher_mode = self._resolve_cypher_mode(cypher_mode)
+
+        # Stream run events by default, polling with adaptive backoff is the fallback
+        if streaming is None:
+            streaming = os.getenv("OPENAI_STREAMING", "true").lower() == "true"
+        self.use_streaming = streaming
+        self.poll_interval_min = float(os.getenv("OPENAI_POLL_MIN_INTERVAL", "0.1"))
+        self.poll_interval_max = float(os.getenv("OPENAI_POLL_MAX_INTERVAL", "1.0"))
+
+        # Tool calls of one requires_action step run concurrently, bounded per turn
+        self.tool_call_workers = max(1, int(os.getenv("OPENAI_TOOL_CALL_WORKERS", "4")))
+        self.tool_call_timeout = float(os.getenv("OPENAI_TOOL_CALL_TIMEOUT", "120"))
+        self._tool_executor = None
+
+        self.report_generator = self._create_report_generator()
+        self.report_jobs = self._create_report_jobs()
+        self.assistant_registry = assistant_registry or shared_registry()
+        self.assistant = None
+        self._assistant_lock = asyncio.Lock()
+        self.thread_janitor = None
+        if os.getenv("OPENAI_DELETE_SCRATCH_THREADS", "true").lower() == "true":
+            self.thread_janitor = AsyncThreadJanitor(self.client)
+        self.query_cache = self._create_query_cache()
+        self.result_budget = ResultBudget.from_env()
+        self.cypher_preflight = CypherPreflight.from_env()
+        self.max_repair_attempts = int(os.getenv("CYPHER_REPAIR_MAX_ATTEMPTS", "2"))
+        self.repair_stats = RepairStats()
+        self.template_engine = self._create_template_engine()
+        self.graph_snapshot = self._create_graph_snapshot()
+        self.pending_messages = PendingMessages.from_env()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Finish pending thread deletions, report jobs and Cypher cache writes, and close the underlying
+        HTTP client.
+        """
+        if self.thread_janitor is not None:
+            await self.thread_janitor.close()
+        if self.report_jobs is not None:
+            await asyncio.to_thread(self.report_jobs.shutdown)
+        if self.query_cache is not None:
+            await asyncio.to_thread(self.query_cache.flush)
+        await self.client.close()
+
+    async def cleanup_assistant(self):
+        """Delete the assistant and drop it from the registry, see OpenAIAgent.cleanup_assistant."""
+        if self.assistant:
+            try:
+                await self.client.beta.assistants.delete(assistant_id=self.assistant.id)
+                print(f"Deleted assistant with ID: {self.assistant.id}")
+                self.assistant_registry.forget(self.client, self._assistant_definition())
+                self.assistant = None
+            except Exception as e:
+                print(f"Error deleting assistant: {e}")
+
+    async def _ensure_assistant(self):
+        """Resolve the assistant once, even if several conversations start at the same time."""
+        if self.assistant is None:
+            async with self._assistant_lock:
+                if self.assistant is None:
+                    self.assistant = await self._create_or_get_assistant()
+        return self.assistant
+
+    async def _create_or_get_assistant(self, refresh=False):
+        """Resolve the OpenAI assistant with knowledgegraph schema and instructions through the registry."""
+        try:
+            return await self.assistant_registry.resolve_async(self.client, self._assistant_definition(), refresh)
+        except Exception as e:
+            print(f"Error creating assistant: {e}")
+            raise
+
+    async def _match_template(self, question, neo4j_client):
+        if self.template_engine is None:
+            return None
+        if self.template_engine.needs_refresh():
+            snapshot = await self.graph_snapshot.current_async(neo4j_client) if self.graph_snapshot is not None else None
+            if snapshot is not None:
+                self.template_engine.load_index(snapshot.entity_rows())
+            else:
+                self.template_engine.load_index(await neo4j_client.execute_query(ENTITY_INDEX_QUERY))
+        return self.template_engine.match(question)
+
+    async def _run_template_query(self, template_match, neo4j_client):
+        if self.graph_snapshot is not None:
+            snapshot = await self.graph_snapshot.current_async(neo4j_client)
+            if snapshot is not None:
+                rows = snapshot.answer(template_match.template_name, template_match.params)
+                if rows is not None:
+                    return rows
+        return await neo4j_client.execute_query(template_match.cypher, template_match.params, query_class="template")
+
+    async def _wait_for_run_completion(self, thread_id, run_id, timeout=60, metrics=None):
+        """Wait for a run to complete, polling with an interval that backs off while the status is unchanged."""
+        start_time = time.time()
+        interval = self.poll_interval_min
+        last_status = None
+        while time.time() - start_time < timeout:
+            if metrics is not None:
+                metrics.cancel_token.raise_if_cancelled()
+            run = await self.client.beta.threads.runs.retrieve(
+                thread_id=thread_id,
+                run_id=run_id
+            )
+            if metrics is not None:
+                metrics.poll()
+            if run.status != last_status:
+                last_status = run.status
+                interval = self.poll_interval_min
+            if run.status in RUN_FINAL_STATES:
+                return run
+            await asyncio.sleep(interval)
+            interval = min(interval * 1.5, self.poll_interval_max)
+        raise TimeoutError(f"Run {run_id} did not complete within {timeout} seconds")
+
+    async def _iter_run_stream(self, stream, outcome):
+        """Read a run event stream into outcome until the run completes or requires action, yielding text_delta events."""
+        async with stream:
+            async for event in stream:
+                for delta in outcome.read(event):
+                    yield delta
+        outcome.finish()
+
+    async def _start_run(self, thread_id, messages, **options):
+        """Start a run with a single call, see OpenAIAgent._start_run."""
+        threads = self.client.beta.threads
+        start_run = threads.create_and_run if thread_id is None else threads.runs.create
+        try:
+            return await start_run(**self._run_request(thread_id, messages), **options)
+        except NotFoundError:
+            print(f"Assistant {self.assistant.id} or thread {thread_id} not found, resolving the assistant again")
+            async with self._assistant_lock:
+                self.assistant = await self._create_or_get_assistant(refresh=True)
+            return await start_run(**self._run_request(thread_id, messages), **options)
+
+    async def _drive_run(self, thread_id, outcome, run_id=None, tool_outputs=None, messages=None):
+        """
+        Start a run, or resume one with tool outputs, and follow it until it completes or requires action,
+        see OpenAIAgent._drive_run.
+        """
+        await self._ensure_assistant()
+        metrics = outcome.metrics
+        metrics.api_call()
+        if self.use_streaming:
+            if run_id is None:
+                stream = await self._start_run(thread_id, messages, stream=True)
+            else:
+                stream = await self.client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=thread_id,
+                    run_id=run_id,
+                    tool_outputs=tool_outputs,
+                    stream=True
+                )
+            async for event in self._iter_run_stream(stream, outcome):
+                yield event
+            return
+
+        if run_id is None:
+            run = await self._start_run(thread_id, messages)
+            thread_id, run_id = run.thread_id, run.id
+        else:
+            await self.client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run_id,
+                tool_outputs=tool_outputs
+            )
+        outcome.polled(await self._wait_for_run_completion(thread_id, run_id, metrics=metrics))
+
+    async def _get_last_message_text(self, thread_id, metrics):
+        """Fetch the text of the most recent message in a thread."""
+        metrics.api_call()
+        messages = await self.client.beta.threads.messages.list(thread_id=thread_id, limit=1)
+        return messages.data[0].content[0].text.value
+
+    async def _generate_cypher_query(self, user_question, context="", metrics=None, prompt=None):
+        """
+        Translate a question into a Cypher query, with a chat completion in "completion" mode
+        and with a separate assistant run otherwise.
+
+        Returns:
+            str: The generated Cypher query
+        """
+        metrics = metrics or TurnMetrics(self.run_mode)
+        prompt = prompt or self._build_cypher_prompt(user_question, context)
+
+        if self.cypher_mode == "completion":
+            completion = await self.client.chat.completions.create(**self._cypher_completion_request(prompt))
+            metrics.api_call()
+            return self._clean_cypher(json.loads(completion.choices[0].message.content)["cypher"])
+
+        outcome = RunOutcome(metrics, emit_text=False)
+        async for _ in self._drive_run(None, outcome, messages=[{"role": "user", "content": prompt}]):
+            pass
+
+        run, cypher_query = outcome.run, outcome.message_text
+        try:
+            if run.status != "completed":
+                raise Exception(f"Knowledgegraph query failed with status: {run.status}")
+
+            if cypher_query is None:
+                cypher_query = await self._get_last_message_text(run.thread_id, metrics)
+        finally:
+            if self.thread_janitor is not None:
+                self.thread_janitor.discard(run.thread_id)
+
+        return self._clean_cypher(cypher_query)
+
+    async def _check_query(self, cypher_query, params, neo4j_client, metrics=None):
+        """Run the pre-flight checks on a query, returning it as possibly rewritten."""
+        started = time.perf_counter()
+        try:
+            checked = await self.cypher_preflight.check_async(cypher_query, neo4j_client, params)
+        except CypherPreflightError as e:
+            if metrics is not None:
+                metrics.preflight(time.perf_counter() - started, rejected=True)
+            e.query = cypher_query
+            raise
+        if metrics is not None:
+            metrics.preflight(time.perf_counter() - started, rewritten=checked != cypher_query)
+        return checked
+
+    async def _execute_checked_query(self, cypher_query, params, neo4j_client, metrics=None):
+        """Run the pre-flight checks on a query and execute it, see OpenAIAgent._execute_checked_query."""
+        if self.cypher_preflight is not None:
+            cypher_query = await self._check_query(cypher_query, params, neo4j_client, metrics)
+        query_results, total_rows = await neo4j_client.fetch_rows(
+            cypher_query, params, raise_errors=True, query_class="generated",
+            cancel_token=metrics.cancel_token if metrics is not None else None
+        )
+        return cypher_query, query_results, total_rows
+
+    async def _execute_with_repair(self, cypher_query, params, source, user_question, context, neo4j_client, metrics=None):
+        """Execute a query, repairing it if it fails, see OpenAIAgent._execute_with_repair."""
+        attempt = 0
+        started = None
+        while True:
+            try:
+                cypher_query, query_results, total_rows = await self._execute_checked_query(
+                    cypher_query, params, neo4j_client, metrics
+                )
+            except (CypherPreflightError, Neo4jQueryError) as e:
+                if attempt:
+                    self._record_repair(attempt, started, False, metrics)
+                if not self._can_repair(e, source, attempt):
+                    raise
+                if metrics is not None:
+                    metrics.cancel_token.raise_if_cancelled()
+                attempt += 1
+                started = time.perf_counter()
+                cypher_query = await self._generate_cypher_query(
+                    user_question, context, metrics, prompt=self._build_repair_prompt(user_question, context, cypher_query, e)
+                )
+                continue
+            if attempt:
+                self._record_repair(attempt, started, True, metrics)
+            return cypher_query, query_results, total_rows, attempt
+
+    async def _handle_query_knowledgegraph(self, arguments, neo4j_client, executed_queries, metrics=None):
+        """Handle the query_knowledgegraph function call."""
+        user_question = arguments.get("user_question", "")
+        context = arguments.get("context", "")
+
+        try:
+            # In inline mode the assistant already wrote the query
+            cypher_query = self._clean_cypher(arguments.get("cypher") or "")
+            params = {}
+            query_results = None
+            source = "inline"
+
+            if not cypher_query and not context:
+                template_match = await self._match_template(user_question, neo4j_client)
+                if template_match is not None:
+                    cypher_query, params = template_match.cypher, template_match.params
+                    source = "template"
+                    query_results = await self._run_template_query(template_match, neo4j_client)
+
+            if not cypher_query and self.query_cache is not None:
+                cypher_query = self.query_cache.get(user_question, context)
+                if cypher_query:
+                    source = "cache"
+
+            generated = not cypher_query
+            if generated:
+                source = self.cypher_mode
+                started = time.perf_counter()
+                cypher_query = await self._generate_cypher_query(user_question, context, metrics)
+                if metrics is not None:
+                    metrics.cypher_generated(time.perf_counter() - started)
+
+            if query_results is None:
+                executed_query, query_results, total_rows, repairs = await self._execute_with_repair(
+                    cypher_query, params, source, user_question, context, neo4j_client, metrics
+                )
+                if repairs:
+                    source = "repair"
+                generated = generated or (source != "inline" and executed_query != cypher_query)
+                cypher_query = executed_query
+            else:
+                total_rows = len(query_results)
+
+            return self._record_query(executed_queries, user_question, context, cypher_query, params,
+                                      query_results, total_rows, source, generated, metrics)
+
+        except (CypherPreflightError, Neo4jQueryError) as e:
+            return self._query_error_output(e)
+
+        except Cancelled:
+            # The turn was cancelled, so no tool output is sent for it
+            raise
+
+        except Exception as e:
+            print(f"Error querying knowledgegraph: {e}")
+            return "No data collected"
+
+    async def _handle_generate_report(self, arguments, neo4j_client, executed_queries, metrics=None):
+        """Handle the generate_report function call, queuing or compiling the report off the event loop."""
+        report_title, user_question, context, query_args = self._report_arguments(arguments)
+
+        try:
+            report_queries = []
+            await self._handle_query_knowledgegraph(query_args, neo4j_client, report_queries, metrics)
+            executed_queries.extend(report_queries)
+
+            data = report_queries[-1]["results"] if report_queries else []
+            return await asyncio.to_thread(self._build_report, report_title, data, user_question, context)
+
+        except Cancelled:
+            raise
+
+        except Exception as e:
+            return self._report_error(report_title, e)
+
+    async def _handle_function_call(self, function_name, arguments, neo4j_client, executed_queries, generated_reports=None, metrics=None):
+        """Route function calls to appropriate handlers."""
+        if function_name == "query_knowledgegraph":
+            return await self._handle_query_knowledgegraph(arguments, neo4j_client, executed_queries, metrics)
+        elif function_name == "generate_report":
+            result, report_data = await self._handle_generate_report(arguments, neo4j_client, executed_queries, metrics)
+            self._collect_report(generated_reports, report_data)
+            return result
+        else:
+            raise ValueError(f"Unknown function: {function_name}")
+
+    async def _run_tool_call(self, tool_call, neo4j_client, metrics, semaphore, timed_out):
+        """
+        Execute a single tool call, collecting its queries and reports in lists of its own; a call
+        running into the tool call timeout is added to timed_out.
+
+        Returns:
+            tuple: (output, executed_queries, generated_reports)
+        """
+        function_name = tool_call.function.name
+        executed_queries = []
+        generated_reports = []
+
+        async with semaphore:
+            try:
+                arguments = json.loads(tool_call.function.arguments)
+                result = await asyncio.wait_for(
+                    self._handle_function_call(function_name, arguments, neo4j_client, executed_queries, generated_reports, metrics),
+                    timeout=self.tool_call_timeout
+                )
+                output = str(result)
+            except Cancelled:
+                raise
+            except asyncio.TimeoutError:
+                output = tool_timeout_output(function_name, self.tool_call_timeout)
+                timed_out.append(tool_call)
+            except Exception as e:
+                output = tool_error_output(function_name, e)
+
+        return output, executed_queries, generated_reports
+
+    async def _execute_tool_calls(self, turn, neo4j_client):
+        """
+        Execute the tool calls the turn's run requires concurrently.
+
+        Returns:
+            list: Tool outputs in the order of the tool calls
+        """
+        metrics = turn.metrics
+        tool_calls = turn.run.required_action.submit_tool_outputs.tool_calls
+        metrics.tool_calls += len(tool_calls)
+        semaphore = asyncio.Semaphore(self.tool_call_workers)
+        timed_out = []
+        outcomes = await asyncio.gather(*(
+            self._run_tool_call(tool_call, neo4j_client, metrics, semaphore, timed_out) for tool_call in tool_calls
+        ))
+        # Abandoning a timed out call does not stop its query on the server, so terminate it there
+        if timed_out:
+            await self._terminate_turn_queries(neo4j_client, metrics)
+
+        return turn.add_tool_outcomes(tool_calls, outcomes)
+
+    @staticmethod
+    async def _terminate_turn_queries(neo4j_client, metrics):
+        """Terminate the transactions of a turn still running on the server, see OpenAIAgent._terminate_turn_queries."""
+        try:
+            terminated = await neo4j_client.terminate_transactions(turn_id=metrics.cancel_token.turn_id)
+        except Exception as e:
+            print(f"Could not terminate the queries of turn {metrics.cancel_token.turn_id}: {e}")
+            return
+        if terminated:
+            neo4j_client.metrics.interrupted("cancel", terminated)
+
+    async def _cancel_run(self, run):
+        """Cancel a run waiting for tool outputs, see OpenAIAgent._cancel_run."""
+        if run is None or run.status != "requires_action":
+            return
+        try:
+            await self.client.beta.threads.runs.cancel(thread_id=run.thread_id, run_id=run.id)
+        except Exception as e:
+            print(f"Could not cancel run {run.id}: {e}")
+
+    async def generate_report(self, report_title, user_question, neo4j_client, context="", cypher=None):
+        """
+        Query the knowledgegraph for a question and compile a report from the results, outside of
+        an assistant turn (e.g. for the HTTP API).
+
+        Args:
+            cypher (str, optional): Query to run instead of generating one, checked like inline queries
+
+        Returns:
+            dict: report (the job, see get_report_job, or files, title and records_count, or error and title),
+                executed_queries and metrics
+        """
+        metrics = TurnMetrics(self.run_mode, self.cypher_mode)
+        executed_queries = []
+        arguments = {"report_title": report_title, "user_question": user_question, "context": context, "cypher": cypher}
+        _, report = await self._handle_generate_report(arguments, neo4j_client, executed_queries, metrics)
+        metrics.finish()
+        return {"report": report, "executed_queries": executed_queries, "metrics": metrics.to_dict()}
+
+    async def chat_with_knowledgegraph(self, user_message, neo4j_client, thread_id=None):
+        """
+        Enhanced chat method that integrates knowledgegraph operations.
+
+        Args:
+            user_message (str): The user's message
+            neo4j_client: AsyncNeo4jClient instance for executing knowledgegraph queries
+            thread_id (str, optional): Existing thread ID to continue conversation
+
+        Returns:
+            dict: Response containing message, any query results, generated reports, thread_id and turn metrics
+        """
+        response = None
+        async for event in self.stream_chat_with_knowledgegraph(user_message, neo4j_client, thread_id):
+            if event["type"] == "done":
+                response = event["response"]
+        return response
+
+    async def stream_chat_with_knowledgegraph(self, user_message, neo4j_client, thread_id=None, cancel_token=None):
+        """
+        Async generator variant of chat_with_knowledgegraph, yielding the same events as
+        OpenAIAgent.stream_chat_with_knowledgegraph. The turn is also cancelled when the task
+        consuming it is cancelled or the generator is closed.
+        """
+        turn = Turn(TurnMetrics(self.run_mode, self.cypher_mode, cancel_token), thread_id)
+        metrics = turn.metrics
+
+        try:
+            template_match = None
+            if self._can_answer_directly(user_message, thread_id):
+                template_match = await self._match_template(user_message, neo4j_client)
+            if template_match is not None:
+                query_results = await self._run_template_query(template_match, neo4j_client)
+                for event in self._answer_from_template(user_message, template_match, query_results, turn):
+                    yield event
+                return
+
+            messages = turn.start_messages(self._take_pending_messages(thread_id), user_message)
+
+            outcome = RunOutcome(metrics)
+            async for event in self._drive_run(turn.openai_thread_id, outcome, messages=messages):
+                yield event
+            turn.follow(outcome.run)
+
+            while turn.run.status == "requires_action":
+                for event in turn.tool_call_events():
+                    yield event
+                tool_outputs = await self._execute_tool_calls(turn, neo4j_client)
+                for event in turn.result_events():
+                    yield event
+
+                outcome = RunOutcome(metrics)
+                async for event in self._drive_run(turn.thread_id, outcome, run_id=turn.run.id, tool_outputs=tool_outputs):
+                    yield event
+                turn.follow(outcome.run)
+
+            turn.check_completed()
+
+            response_text = outcome.message_text
+            if response_text is None:
+                response_text = await self._get_last_message_text(turn.thread_id, metrics)
+                metrics.first_token()
+                yield {"type": "text_delta", "text": response_text}
+
+            response_text = self._fix_sandbox_links(response_text, turn.generated_reports)
+
+            yield turn.done(response_text)
+
+        except (GeneratorExit, asyncio.CancelledError):
+            # The caller abandoned the turn, stop its queries still running on the server
+            await neo4j_client.cancel(metrics.cancel_token)
+            raise
+        except Cancelled:
+            await neo4j_client.cancel(metrics.cancel_token)
+            await self._cancel_run(turn.run)
+            yield turn.cancelled()
+        except Exception as e:
+            yield turn.failed(e)
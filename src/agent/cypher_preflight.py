@@ -0,0 +1,306 @@
+import os
+import re
+from database.csv_importer import CSV_NODES, CSV_RELATIONSHIPS
+from database.result_cache import mask_literals
+
+# Property keys per node label and the (from, to) labels of each relationship type, as imported
+NODE_PROPERTIES = {label: set(columns) for label, _, columns in CSV_NODES}
+RELATIONSHIP_ENDPOINTS = {rel_type: (from_label, to_label) for rel_type, _, (from_label, _), (to_label, _) in CSV_RELATIONSHIPS}
+
+# GQL status codes of planner notifications that point at expensive queries
+CARTESIAN_PRODUCT_STATUS = "03N90"
+UNBOUNDED_PATH_STATUS = "03N91"
+
+_NAME = r"`?[A-Za-z_]\w*`?"
+# (var:label:label {props}) and label predicates in parentheses
+_NODE_PATTERN = re.compile(rf"\(\s*(\w*)\s*((?:[:|&]\s*!?\s*{_NAME}\s*)+)(\{{[^{{}}]*\}})?")
+# -[var:type|type *min..max {props}]-
+_RELATIONSHIP_PATTERN = re.compile(rf"\[\s*(\w*)\s*:\s*(!?\s*{_NAME}(?:\s*\|\s*:?\s*{_NAME})*)([^\[\]]*)\]")
+_RELATIONSHIP_BRACKETS = re.compile(r"-\s*(\[[^\[\]]*\])")
+_VARIABLE_LENGTH = re.compile(r"\*\s*(\d*)\s*(\.\.)?\s*(\d*)")
+_PROPERTY_ACCESS = re.compile(r"(?<![\w.`$])([A-Za-z_]\w*)\.([A-Za-z_]\w*)\b(?!\s*\()")
+_MAP_KEY = re.compile(r"([A-Za-z_]\w*)\s*:")
+# (a:label)-[:type]->(b:label), with a lookahead so chained patterns are all seen
+_NODE = r"\(\s*(\w*)\s*(?::\s*`?(\w+)`?)?[^()]*\)"
+_HOP = re.compile(rf"{_NODE}\s*(<?-\s*\[\s*\w*\s*:\s*`?(\w+)`?[^\[\]|]*\]\s*->?)\s*(?={_NODE})")
+
+
+class CypherPreflightError(ValueError):
+    """A query was rejected before execution; code says why (a check name or the Neo4j error code)."""
+
+    def __init__(self, message, code, query=None):
+        super().__init__(message)
+        self.code = code
+        self.query = query
+
+
+def _names(text):
+    return [name.strip("`") for name in re.findall(_NAME, text)]
+
+
+def _replace_spans(query, replacements):
+    """Apply (start, end, text) replacements, which must not overlap."""
+    for start, end, text in sorted(replacements, reverse=True):
+        query = query[:start] + text + query[end:]
+    return query
+
+
+def _plan_operators(plan):
+    """Yield every operator of a plan tree as reported by the server."""
+    if not plan:
+        return
+    yield plan
+    for child in plan.get("children") or []:
+        yield from _plan_operators(child)
+
+
+class CypherPreflight:
+    """
+    Checks a Cypher query before it runs.
+
+    The static check compares labels, relationship types, property keys and relationship directions
+    with the imported schema. Harmless slips are rewritten: wrongly cased labels and types, reversed
+    relationships, and variable-length paths without an upper bound, which get `max_path_length`.
+    Anything else raises CypherPreflightError. Then EXPLAIN has the server parse and plan the query
+    without running it, which catches syntax errors, cartesian products and estimated row counts above
+    `max_estimated_rows`.
+    """
+
+    def __init__(self, max_path_length=4, max_estimated_rows=100000, explain=True):
+        self.max_path_length = max_path_length
+        self.max_estimated_rows = max_estimated_rows
+        self.explain = explain
+        self._labels = {label.lower(): label for label in NODE_PROPERTIES}
+        self._types = {rel_type.lower(): rel_type for rel_type in RELATIONSHIP_ENDPOINTS}
+
+    @classmethod
+    def from_env(cls):
+        """Create the pre-flight from the environment, None if disabled."""
+        if os.getenv("CYPHER_PREFLIGHT_ENABLED", "true").lower() != "true":
+            return None
+        return cls(
+            max_path_length=int(os.getenv("CYPHER_PREFLIGHT_MAX_PATH_LENGTH", "4")),
+            max_estimated_rows=float(os.getenv("CYPHER_PREFLIGHT_MAX_ESTIMATED_ROWS", "100000")),
+            explain=os.getenv("CYPHER_PREFLIGHT_EXPLAIN", "true").lower() == "true",
+        )
+
+    # Static checks
+
+    def check_static(self, query):
+        """
+        Check a query against the schema.
+
+        Returns:
+            str: The query, rewritten where a slip could be fixed
+        Raises:
+            CypherPreflightError: If the query cannot be fixed
+        """
+        if not query or not query.strip():
+            raise CypherPreflightError("The query is empty.", "empty_query")
+        query = self._fix_names(query)
+        query = self._bound_paths(query)
+        query = self._fix_directions(query)
+        self._check_properties(query)
+        return query
+
+    def _fix_names(self, query):
+        """Map labels and relationship types to their schema spelling, rejecting unknown ones."""
+        masked = mask_literals(query)
+        replacements = []
+        for pattern, group, known, kind in (
+            (_NODE_PATTERN, 2, self._labels, "label"),
+            (_RELATIONSHIP_PATTERN, 2, self._types, "relationship type"),
+        ):
+            for match in pattern.finditer(masked):
+                for name_match in re.finditer(_NAME, match.group(group)):
+                    name = name_match.group(0).strip("`")
+                    spelling = known.get(name.lower())
+                    if spelling is None:
+                        raise CypherPreflightError(
+                            f"Unknown {kind} '{name}'. The schema has: {', '.join(sorted(known.values()))}.",
+                            f"unknown_{kind.replace(' ', '_')}"
+                        )
+                    if spelling != name:
+                        start = match.start(group) + name_match.start()
+                        replacements.append((start, start + len(name_match.group(0)), spelling))
+        return _replace_spans(query, replacements)
+
+    def _bound_paths(self, query):
+        """Give variable-length relationships without an upper bound max_path_length as bound."""
+        masked = mask_literals(query)
+        replacements = []
+        for match in _RELATIONSHIP_BRACKETS.finditer(masked):
+            length = _VARIABLE_LENGTH.search(match.group(1))
+            if length is None:
+                continue
+            low, dots, high = length.groups()
+            low = int(low) if low else 1
+            if dots and high:
+                high = int(high)
+            elif not dots and length.group(1):
+                high = low
+            else:
+                high = None
+            if high is not None and high <= self.max_path_length:
+                continue
+            if high is not None or low > self.max_path_length:
+                raise CypherPreflightError(
+                    f"Variable-length relationship '{match.group(1)}' may follow more than {self.max_path_length} hops; "
+                    f"the longest path in the schema is much shorter.",
+                    "path_too_long"
+                )
+            replacements.append((match.start(1) + length.start(), match.start(1) + length.end(), f"*{low}..{self.max_path_length}"))
+        return _replace_spans(query, replacements)
+
+    def _bound_labels(self, masked):
+        """Map variables to the labels (nodes) or relationship types they are bound to in patterns."""
+        nodes = {}
+        relationships = {}
+        for match in _NODE_PATTERN.finditer(masked):
+            if match.group(1):
+                nodes.setdefault(match.group(1), set()).update(_names(match.group(2)))
+        for match in _RELATIONSHIP_PATTERN.finditer(masked):
+            if match.group(1):
+                relationships.setdefault(match.group(1), set()).update(_names(match.group(2)))
+        return nodes, relationships
+
+    def _fix_directions(self, query):
+        """Turn around relationships written against the direction the schema has them in."""
+        masked = mask_literals(query)
+        nodes, _ = self._bound_labels(masked)
+
+        def label_of(variable, label):
+            if label:
+                return label
+            labels = nodes.get(variable, set())
+            return next(iter(labels)) if len(labels) == 1 else None
+
+        replacements = []
+        for match in _HOP.finditer(masked):
+            left_var, left_label, arrow, rel_type, right_var, right_label = match.groups()
+            left, right = label_of(left_var, left_label), label_of(right_var, right_label)
+            pointing_left, pointing_right = arrow.startswith("<"), arrow.endswith(">")
+            if rel_type not in RELATIONSHIP_ENDPOINTS or not left or not right or pointing_left == pointing_right:
+                continue
+            source, target = (right, left) if pointing_left else (left, right)
+            expected = RELATIONSHIP_ENDPOINTS[rel_type]
+            if (source, target) == expected:
+                continue
+            if (target, source) != expected:
+                raise CypherPreflightError(
+                    f"Relationship '{rel_type}' does not connect {source} to {target}; "
+                    f"it goes from {expected[0]} to {expected[1]}.",
+                    "wrong_endpoints"
+                )
+            turned = arrow[1:] + ">" if pointing_left else "<" + arrow[:-1]
+            replacements.append((match.start(3), match.end(3), turned))
+        return _replace_spans(query, replacements)
+
+    def _check_properties(self, query):
+        """Reject property keys the labels of a variable do not have."""
+        masked = mask_literals(query)
+        nodes, relationships = self._bound_labels(masked)
+
+        for match in _NODE_PATTERN.finditer(masked):
+            if match.group(3):
+                self._check_keys(_names(match.group(2)), _MAP_KEY.findall(match.group(3)))
+        for variable, key in _PROPERTY_ACCESS.findall(masked):
+            if variable in nodes:
+                self._check_keys(nodes[variable], [key])
+            elif variable in relationships:
+                raise CypherPreflightError(
+                    f"Relationships have no properties, '{variable}.{key}' is always null.", "unknown_property"
+                )
+
+    @staticmethod
+    def _check_keys(labels, keys):
+        allowed = set().union(*(NODE_PROPERTIES.get(label, set()) for label in labels))
+        for key in keys:
+            if key not in allowed:
+                raise CypherPreflightError(
+                    f"Unknown property '{key}' for {'/'.join(sorted(labels))}. "
+                    f"Available properties: {', '.join(sorted(allowed))}.",
+                    "unknown_property"
+                )
+
+    # Plan checks
+
+    def check_plan(self, explained):
+        """
+        Check the plan and notifications returned by a client's explain().
+
+        Raises:
+            CypherPreflightError: For cartesian products and row estimates above max_estimated_rows
+        """
+        statuses = {notification["gql_status"] for notification in explained.get("notifications", [])}
+        operators = list(_plan_operators(explained.get("plan")))
+        if CARTESIAN_PRODUCT_STATUS in statuses or any(
+            op.get("operatorType", "").startswith("CartesianProduct") for op in operators
+        ):
+            raise CypherPreflightError(
+                "The query builds a cartesian product of disconnected patterns. "
+                "Connect the patterns through relationships or use separate queries.",
+                "cartesian_product"
+            )
+        if UNBOUNDED_PATH_STATUS in statuses:
+            raise CypherPreflightError(
+                f"The query has a variable-length path without an upper bound; use at most {self.max_path_length} hops.",
+                "path_too_long"
+            )
+        estimated_rows = max(
+            ((op.get("args") or op.get("arguments") or {}).get("EstimatedRows", 0) for op in operators), default=0
+        )
+        if estimated_rows > self.max_estimated_rows:
+            raise CypherPreflightError(
+                f"The planner estimates {estimated_rows:,.0f} intermediate rows, more than the "
+                f"{self.max_estimated_rows:,.0f} allowed. Filter earlier or aggregate.",
+                "row_estimate"
+            )
+
+    @staticmethod
+    def _explain_error(error):
+        """Turn a Neo4j error from EXPLAIN into a rejection if it is about the statement itself."""
+        code = getattr(error, "code", None) or ""
+        if code.startswith("Neo.ClientError.Statement."):
+            return CypherPreflightError(getattr(error, "message", None) or str(error), code)
+        return None
+
+    def check(self, query, neo4j_client, params=None):
+        """
+        Run the static checks and EXPLAIN the query.
+
+        EXPLAIN failures that are not about the query, e.g. a connection problem, are logged and the
+        query is passed on, so execution reports them as usual.
+
+        Returns:
+            str: The query to execute
+        Raises:
+            CypherPreflightError: If the query was rejected
+        """
+        query = self.check_static(query)
+        if self.explain:
+            try:
+                explained = neo4j_client.explain(query, params)
+            except Exception as e:
+                rejection = self._explain_error(e)
+                if rejection is not None:
+                    raise rejection from e
+                print(f"Could not EXPLAIN query, skipping plan checks: {e}")
+                return query
+            self.check_plan(explained)
+        return query
+
+    async def check_async(self, query, neo4j_client, params=None):
+        """check() for an AsyncNeo4jClient."""
+        query = self.check_static(query)
+        if self.explain:
+            try:
+                explained = await neo4j_client.explain(query, params)
+            except Exception as e:
+                rejection = self._explain_error(e)
+                if rejection is not None:
+                    raise rejection from e
+                print(f"Could not EXPLAIN query, skipping plan checks: {e}")
+                return query
+            self.check_plan(explained)
+        return query
@@ -0,0 +1,136 @@
+import time
+import threading
+from database.query_control import CancelToken
+
+class TurnMetrics:
+    """Latency and API call counters for a single chat turn, and the token to cancel it with."""
+
+    def __init__(self, mode, cypher_mode=None, cancel_token=None):
+        self.mode = mode
+        self.cypher_mode = cypher_mode
+        self.cancel_token = cancel_token or CancelToken()
+        self.started = time.perf_counter()
+        self.finished = None
+        self.first_token_at = None
+        self.api_calls = 0
+        self.polls = 0
+        self.tool_calls = 0
+        self.cypher_generations = 0
+        self.cypher_generation_seconds = 0.0
+        self.tool_output_tokens = 0
+        self.tool_output_tokens_saved = 0
+        self.tool_output_tokens_estimated = False
+        self.preflight_checks = 0
+        self.preflight_rewrites = 0
+        self.preflight_rejections = 0
+        self.preflight_seconds = 0.0
+        self.repair_attempts = 0
+        self.repairs_succeeded = 0
+        self.repair_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def api_call(self, count=1):
+        """Record OpenAI API requests made during the turn."""
+        with self._lock:
+            self.api_calls += count
+
+    def poll(self):
+        """Record a runs.retrieve call made by the polling fallback."""
+        with self._lock:
+            self.polls += 1
+            self.api_calls += 1
+
+    def cypher_generated(self, seconds):
+        """Record the time spent generating one Cypher query."""
+        with self._lock:
+            self.cypher_generations += 1
+            self.cypher_generation_seconds += seconds
+
+    def preflight(self, seconds, rewritten=False, rejected=False):
+        """Record one pre-flight check of a Cypher query and whether it rewrote or rejected the query."""
+        with self._lock:
+            self.preflight_checks += 1
+            self.preflight_seconds += seconds
+            if rewritten:
+                self.preflight_rewrites += 1
+            if rejected:
+                self.preflight_rejections += 1
+
+    def repair(self, seconds, succeeded):
+        """Record one attempt at repairing a failing Cypher query, including running the repaired query."""
+        with self._lock:
+            self.repair_attempts += 1
+            self.repair_seconds += seconds
+            if succeeded:
+                self.repairs_succeeded += 1
+
+    def tool_output(self, tokens, baseline_tokens, estimated=False):
+        """
+        Record the tokens of a query result sent to the model, and what indented JSON would have cost;
+        estimated marks counts estimated from characters instead of tokenized.
+        """
+        with self._lock:
+            self.tool_output_tokens += tokens
+            self.tool_output_tokens_saved += baseline_tokens - tokens
+            self.tool_output_tokens_estimated = self.tool_output_tokens_estimated or estimated
+
+    def first_token(self):
+        """Record the moment the first piece of the reply became available."""
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def to_dict(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return {
+            "mode": self.mode,
+            "latency_seconds": round(end - self.started, 3),
+            "time_to_first_token_seconds": (
+                round(self.first_token_at - self.started, 3) if self.first_token_at is not None else None
+            ),
+            "api_calls": self.api_calls,
+            "polls": self.polls,
+            "tool_calls": self.tool_calls,
+            "cypher_mode": self.cypher_mode,
+            "cypher_generations": self.cypher_generations,
+            "cypher_generation_seconds": round(self.cypher_generation_seconds, 3),
+            "tool_output_tokens": self.tool_output_tokens,
+            "tool_output_tokens_saved": self.tool_output_tokens_saved,
+            "tool_output_tokens_estimated": self.tool_output_tokens_estimated,
+            "preflight_checks": self.preflight_checks,
+            "preflight_rewrites": self.preflight_rewrites,
+            "preflight_rejections": self.preflight_rejections,
+            "preflight_seconds": round(self.preflight_seconds, 3),
+            "repair_attempts": self.repair_attempts,
+            "repairs_succeeded": self.repairs_succeeded,
+            "repair_seconds": round(self.repair_seconds, 3),
+        }
+
+
+class RepairStats:
+    """Success rate and added latency of Cypher repairs across turns, by attempt number."""
+
+    def __init__(self):
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def record(self, attempt, seconds, succeeded):
+        with self._lock:
+            stats = self._attempts.setdefault(attempt, {"attempts": 0, "succeeded": 0, "seconds": 0.0})
+            stats["attempts"] += 1
+            stats["seconds"] += seconds
+            if succeeded:
+                stats["succeeded"] += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                attempt: {
+                    "attempts": stats["attempts"],
+                    "success_rate": round(stats["succeeded"] / stats["attempts"], 3),
+                    "avg_seconds": round(stats["seconds"] / stats["attempts"], 3),
+                }
+                for attempt, stats in sorted(self._attempts.items())
+            }
@@ -1,64 +1,115 @@
 import os
 import json
 import time
-import signal
-import atexit
-import threading
 import re
-from openai import OpenAI
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from openai import OpenAI, NotFoundError
 from dotenv import load_dotenv
 from utils.report_generator import TypstReportGenerator
+from utils.typst_compiler import create_compiler
+from utils.report_jobs import ReportJobQueue, ReportQueueFull
+from .query_cache import CypherQueryCache, schema_fingerprint
+from .metrics import TurnMetrics, RepairStats
+from .query_templates import QueryTemplateEngine, ENTITY_INDEX_QUERY
+from .result_budget import ResultBudget, count_tokens, tokens_are_estimated
+from .cypher_preflight import CypherPreflight, CypherPreflightError
+from .thread_janitor import ThreadJanitor
+from .assistant_registry import shared_registry
+from .turn import Turn, RunOutcome, PendingMessages, LOCAL_THREAD_PREFIX, RUN_FINAL_STATES, tool_error_output, tool_timeout_output
+from database.graph_snapshot import GraphSnapshotStore
+from database.neo4j_client import Neo4jQueryError
+from database.query_control import Cancelled
+
+ASSISTANT_NAME = "Knowledgegraph AI Assistant"
+ASSISTANT_MODEL = "gpt-4o"
+
+CYPHER_MODES = ["assistant", "inline", "completion"]
 
 class OpenAIAgent:
-    def __init__(self, cleanup_on_exit=True):
+    def __init__(self, streaming=None, cypher_mode=None, assistant_registry=None):
         load_dotenv()
         
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.client = OpenAI(api_key=self.api_key)
-        self.cleanup_on_exit = cleanup_on_exit
-        self.report_generator = TypstReportGenerator()
+        self.cypher_mode = self._resolve_cypher_mode(cypher_mode)
+        
+        # Stream run events by default, polling with adaptive backoff is the fallback
+        if streaming is None:
+            streaming = os.getenv("OPENAI_STREAMING", "true").lower() == "true"
+        self.use_streaming = streaming
+        self.poll_interval_min = float(os.getenv("OPENAI_POLL_MIN_INTERVAL", "0.1"))
+        self.poll_interval_max = float(os.getenv("OPENAI_POLL_MAX_INTERVAL", "1.0"))
+        
+        # Tool calls of one requires_action step run concurrently on a bounded pool
+        tool_call_workers = int(os.getenv("OPENAI_TOOL_CALL_WORKERS", "4"))
+        self.tool_call_timeout = float(os.getenv("OPENAI_TOOL_CALL_TIMEOUT", "120"))
+        self._tool_executor = None
+        if tool_call_workers > 1:
+            self._tool_executor = ThreadPoolExecutor(max_workers=tool_call_workers, thread_name_prefix="tool-call")
+        self.report_generator = self._create_report_generator()
+        self.report_jobs = self._create_report_jobs()
+        # The assistant is shared with every agent using the same definition and resolved once per process
+        self.assistant_registry = assistant_registry or shared_registry()
         self.assistant = self._create_or_get_assistant()
+        # Threads of Cypher generation runs are only needed for one run and deleted in the background
+        self.thread_janitor = None
+        if os.getenv("OPENAI_DELETE_SCRATCH_THREADS", "true").lower() == "true":
+            self.thread_janitor = ThreadJanitor(self.client)
+        self.query_cache = self._create_query_cache()
+        self.result_budget = ResultBudget.from_env()
+        self.cypher_preflight = CypherPreflight.from_env()
+        # Failing generated queries are repaired up to this many times before the assistant gets the error
+        self.max_repair_attempts = int(os.getenv("CYPHER_REPAIR_MAX_ATTEMPTS", "2"))
+        self.repair_stats = RepairStats()
+        self.template_engine = self._create_template_engine()
+        self.graph_snapshot = self._create_graph_snapshot()
         
-        # Register cleanup handlers for various exit scenarios
-        if cleanup_on_exit:
-            atexit.register(self.cleanup_assistant)
-            # Only register signal handlers if we're in the main thread
-            try:
-                if threading.current_thread() is threading.main_thread():
-                    signal.signal(signal.SIGINT, self._signal_handler)
-                    signal.signal(signal.SIGTERM, self._signal_handler)
-            except ValueError:
-                # Signal handlers can't be registered in non-main threads
-                # This is expected in Streamlit and other threading environments
-                pass
+        # Template answers are added to their OpenAI thread on the next assistant run
+        self.pending_messages = PendingMessages.from_env()
     
     def __enter__(self):
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.cleanup_on_exit:
-            self.cleanup_assistant()
-    
-    def _signal_handler(self, signum, frame):
-        """Handle SIGINT (Ctrl-C) and SIGTERM signals to cleanup before exit."""
-        print(f"\nReceived signal {signum}, cleaning up assistant...")
-        self.cleanup_assistant()
-        exit(0)
+        if self.thread_janitor is not None:
+            self.thread_janitor.close()
+        if self.report_jobs is not None:
+            self.report_jobs.shutdown()
+        if self.query_cache is not None:
+            self.query_cache.flush()
     
     def cleanup_assistant(self):
-        """Delete the assistant to avoid accumulating unused assistants."""
-        if hasattr(self, 'assistant') and self.assistant:
+        """
+        Delete the assistant and drop it from the registry. The assistant is shared by every agent with
+        the same definition, so this is only for tearing down, never done on exit.
+        """
+        if self.assistant:
             try:
                 self.client.beta.assistants.delete(assistant_id=self.assistant.id)
                 print(f"Deleted assistant with ID: {self.assistant.id}")
+                self.assistant_registry.forget(self.client, self._assistant_definition())
                 self.assistant = None  # Prevent multiple deletion attempts
             except Exception as e:
                 print(f"Error deleting assistant: {e}")
     
+    @staticmethod
+    def _resolve_cypher_mode(cypher_mode):
+        """
+        Pick how Cypher queries are generated:
+            - "assistant": a separate assistant run on a scratch thread (default)
+            - "inline": the assistant passes the query as a tool argument in the same run
+            - "completion": a single chat completions call with structured output
+        """
+        cypher_mode = cypher_mode or os.getenv("OPENAI_CYPHER_MODE", "assistant")
+        if cypher_mode not in CYPHER_MODES:
+            raise ValueError(f"Unknown Cypher mode {cypher_mode!r}, expected one of {', '.join(CYPHER_MODES)}")
+        return cypher_mode
+    
     def _get_function_definitions(self):
         """Define the functions available to the assistant."""
         
-        return [
+        functions = [
             {
                 "type": "function",
                 "function": {
@@ -106,25 +157,22 @@ class OpenAIAgent:
                 }
             }
         ]
-    
-    def _create_or_get_assistant(self):
-        """Create or reuse an OpenAI assistant with knowledgegraph schema and instructions."""
-        assistant_name = "Knowledgegraph AI Assistant"
-        
-        # First, try to find an existing assistant with the same name
-        try:
-            assistants = self.client.beta.assistants.list()
-            for assistant in assistants.data:
-                if assistant.name == assistant_name:
-                    print(f"Reusing existing assistant with ID: {assistant.id}")
-                    return assistant
-        except Exception as e:
-            print(f"Error listing assistants: {e}")
         
-        # If no existing assistant found, create a new one
-       
+        # In inline mode the query is written in the same run that decides to call the tool
+        if self.cypher_mode == "inline":
+            for function in functions:
+                parameters = function["function"]["parameters"]
+                parameters["properties"]["cypher"] = {
+                    "type": "string",
+                    "description": "The Neo4j Cypher query that retrieves the data. It must respect the knowledgegraph schema in the instructions and must not LIMIT the results."
+                }
+                parameters["required"].append("cypher")
         
-        instructions = f"""You are a knowledgegraph AI assistant that can help with both general conversation and knowledgegraph operations.
+        return functions
+    
+    def _get_instructions(self):
+        """Return the assistant instructions including the knowledgegraph schema."""
+        return """You are a knowledgegraph AI assistant that can help with both general conversation and knowledgegraph operations.
 
 You have access to a Neo4j knowledgegraph with the following schema:
 
@@ -180,50 +228,244 @@ When to chat normally:
 
 Be conversational and helpful. If you're not sure whether to query the knowledgegraph or generate a report, ask the user for clarification."""
 
-        function_tools = self._get_function_definitions()
-
+    def _assistant_name(self):
+        """Assistants differ in their tools per Cypher mode, so each mode gets its own name."""
+        if self.cypher_mode == "inline":
+            return f"{ASSISTANT_NAME} (inline Cypher)"
+        return ASSISTANT_NAME
+    
+    def _assistant_definition(self):
+        """Name, model, instructions and tools of the assistant; the registry keys assistants by their hash."""
+        return {
+            "name": self._assistant_name(),
+            "model": ASSISTANT_MODEL,
+            "instructions": self._get_instructions(),
+            "tools": self._get_function_definitions(),
+        }
+    
+    def _create_or_get_assistant(self, refresh=False):
+        """Resolve the OpenAI assistant with knowledgegraph schema and instructions through the registry."""
         try:
-            assistant = self.client.beta.assistants.create(
-                name=assistant_name,
-                instructions=instructions,
-                model="gpt-4o",
-                tools=function_tools
-            )
-            print(f"Created new assistant with ID: {assistant.id}")
-            return assistant
+            return self.assistant_registry.resolve(self.client, self._assistant_definition(), refresh)
         except Exception as e:
             print(f"Error creating assistant: {e}")
             raise
     
-    def _wait_for_run_completion(self, thread_id, run_id, timeout=60):
-        """Wait for a run to complete, polling at 1-second intervals."""
+    def _create_query_cache(self):
+        """Create the question -> Cypher cache, tied to the current schema and model."""
+        if os.getenv("CYPHER_CACHE_ENABLED", "true").lower() != "true":
+            return None
+
+        schema_hash = schema_fingerprint(self._get_instructions(), ASSISTANT_MODEL)
+        return CypherQueryCache(
+            max_entries=int(os.getenv("CYPHER_CACHE_SIZE", "500")),
+            similarity_threshold=float(os.getenv("CYPHER_CACHE_SIMILARITY", "0.85")),
+            schema_hash=schema_hash
+        )
+    
+    def _create_report_generator(self):
+        """Create the report generator, compiling with a warm in-process Typst compiler when the bindings are installed."""
+        compiler = create_compiler(
+            os.getenv("TYPST_BACKEND", "auto"),
+            pool_size=max(1, int(os.getenv("REPORT_WORKERS", "2")))
+        )
+        return TypstReportGenerator(
+            max_bytes=int(float(os.getenv("REPORT_CACHE_MAX_MB", "200")) * 1024 * 1024),
+            max_age_hours=float(os.getenv("REPORT_CACHE_MAX_AGE_HOURS", "24")),
+            compiler=compiler
+        )
+    
+    def _create_report_jobs(self):
+        """Create the pool compiling reports in the background, None to compile them inside the tool call."""
+        report_workers = int(os.getenv("REPORT_WORKERS", "2"))
+        if report_workers <= 0:
+            return None
+        return ReportJobQueue(self.report_generator, max_workers=report_workers,
+                              max_pending=int(os.getenv("REPORT_QUEUE_MAX", "50")))
+    
+    def get_report_job(self, job_id):
+        """
+        State of a background report job.
+        
+        Returns:
+            dict or None: job_id, status (queued, running, done or failed), title, records_count and,
+                once done, typst_file and pdf_file or error; None if the job is unknown
+        """
+        if self.report_jobs is None:
+            return None
+        job = self.report_jobs.get(job_id)
+        return job.to_dict() if job is not None else None
+    
+    def _create_template_engine(self):
+        """Create the engine answering common question shapes without the LLM."""
+        if os.getenv("QUERY_TEMPLATES_ENABLED", "true").lower() != "true":
+            return None
+        return QueryTemplateEngine(index_ttl=float(os.getenv("QUERY_TEMPLATES_INDEX_TTL", "300")))
+    
+    def _create_graph_snapshot(self):
+        """Create the optional in-memory graph answering query templates without Neo4j round trips."""
+        source = os.getenv("GRAPH_SNAPSHOT", "off").lower()
+        if source == "off":
+            return None
+        return GraphSnapshotStore(source, check_interval=float(os.getenv("GRAPH_SNAPSHOT_CHECK_SECONDS", "30")))
+    
+    def _match_template(self, question, neo4j_client):
+        """Resolve a question to a query template, reloading the entity name index when it is stale."""
+        if self.template_engine is None:
+            return None
+        if self.template_engine.needs_refresh():
+            snapshot = self.graph_snapshot.current(neo4j_client) if self.graph_snapshot is not None else None
+            if snapshot is not None:
+                self.template_engine.load_index(snapshot.entity_rows())
+            else:
+                self.template_engine.load_index(neo4j_client.execute_query(ENTITY_INDEX_QUERY))
+        return self.template_engine.match(question)
+    
+    def _can_answer_directly(self, user_message, thread_id):
+        """True if a template answer may replace the assistant run for a user message; thread_id is None on a new conversation."""
+        return self.template_engine is not None and self.template_engine.answers_directly(
+            user_message, in_conversation=bool(thread_id))
+    
+    def _run_template_query(self, template_match, neo4j_client):
+        """Run a matched template on the graph snapshot if there is one, on Neo4j otherwise."""
+        if self.graph_snapshot is not None:
+            snapshot = self.graph_snapshot.current(neo4j_client)
+            if snapshot is not None:
+                rows = snapshot.answer(template_match.template_name, template_match.params)
+                if rows is not None:
+                    return rows
+        return neo4j_client.execute_query(template_match.cypher, template_match.params, query_class="template")
+    
+    def _defer_messages(self, thread_id, messages):
+        """
+        Remember messages to add to a thread before its next assistant run.
+        
+        Returns:
+            str: The thread ID to hand back to the caller, a local ID if there is no OpenAI thread yet
+        """
+        if not thread_id:
+            thread_id = f"{LOCAL_THREAD_PREFIX}{uuid.uuid4().hex}"
+        self.pending_messages.add(thread_id, messages)
+        return thread_id
+    
+    def _take_pending_messages(self, thread_id):
+        return self.pending_messages.take(thread_id)
+    
+    @property
+    def run_mode(self):
+        return "stream" if self.use_streaming else "poll"
+    
+    def _wait_for_run_completion(self, thread_id, run_id, timeout=60, metrics=None):
+        """Wait for a run to complete, polling with an interval that backs off while the status is unchanged."""
         start_time = time.time()
+        interval = self.poll_interval_min
+        last_status = None
         while time.time() - start_time < timeout:
+            if metrics is not None:
+                metrics.cancel_token.raise_if_cancelled()
             run = self.client.beta.threads.runs.retrieve(
                 thread_id=thread_id,
                 run_id=run_id
             )
-            print(run.status)
-            if run.status in ["completed", "failed", "cancelled", "expired","requires_action"]:
+            if metrics is not None:
+                metrics.poll()
+            if run.status != last_status:
+                print(run.status)
+                last_status = run.status
+                interval = self.poll_interval_min
+            if run.status in RUN_FINAL_STATES:
                 return run
-            time.sleep(1)
+            time.sleep(interval)
+            interval = min(interval * 1.5, self.poll_interval_max)
         raise TimeoutError(f"Run {run_id} did not complete within {timeout} seconds")
     
-    def _handle_query_knowledgegraph(self, arguments,neo4j_client,executed_queries):
-        """Handle the generate_cypher_query function call."""
-        user_question = arguments.get("user_question", "")
-        context = arguments.get("context", "")
+    def _iter_run_stream(self, stream, outcome):
+        """Read a run event stream into outcome until the run completes or requires action, yielding text_delta events."""
+        with stream:
+            for event in stream:
+                yield from outcome.read(event)
+        outcome.finish()
+    
+    def _run_request(self, thread_id, messages):
+        """
+        Arguments of the single call starting a run: on a new thread holding the messages when thread_id
+        is None (threads.create_and_run), otherwise on the thread with the messages added (runs.create).
+        """
+        request = {"assistant_id": self.assistant.id}
+        if thread_id is None:
+            request["thread"] = {"messages": messages or []}
+        else:
+            request["thread_id"] = thread_id
+            if messages:
+                request["additional_messages"] = messages
+        return request
+    
+    def _start_run(self, thread_id, messages, **options):
+        """
+        Start a run with a single call, see _run_request. If the registered assistant was deleted
+        elsewhere, it is resolved again and the run started once more.
+        """
+        threads = self.client.beta.threads
+        start_run = threads.create_and_run if thread_id is None else threads.runs.create
+        try:
+            return start_run(**self._run_request(thread_id, messages), **options)
+        except NotFoundError:
+            print(f"Assistant {self.assistant.id} or thread {thread_id} not found, resolving the assistant again")
+            self.assistant = self._create_or_get_assistant(refresh=True)
+            return start_run(**self._run_request(thread_id, messages), **options)
+    
+    def _drive_run(self, thread_id, outcome, run_id=None, tool_outputs=None, messages=None):
+        """
+        Start a run, or resume one with tool outputs, and follow it until it completes or requires action.
+        text_delta events are yielded as they arrive when streaming and outcome.emit_text is set; the final
+        run and message text (None when polling) end up in outcome, and run.thread_id is the thread used.
         
+        Args:
+            thread_id (str): Thread of the run, None to start the run on a new thread
+            outcome (RunOutcome): Receives the final run
+            messages (list, optional): Messages to add to the thread when starting the run
+        """
+        metrics = outcome.metrics
+        metrics.api_call()
+        if self.use_streaming:
+            if run_id is None:
+                stream = self._start_run(thread_id, messages, stream=True)
+            else:
+                stream = self.client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=thread_id,
+                    run_id=run_id,
+                    tool_outputs=tool_outputs,
+                    stream=True
+                )
+            yield from self._iter_run_stream(stream, outcome)
+            return
+        
+        if run_id is None:
+            run = self._start_run(thread_id, messages)
+            thread_id, run_id = run.thread_id, run.id
+        else:
+            self.client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run_id,
+                tool_outputs=tool_outputs
+            )
+        outcome.polled(self._wait_for_run_completion(thread_id, run_id, metrics=metrics))
+    
+    def _get_last_message_text(self, thread_id, metrics):
+        """Fetch the text of the most recent message in a thread."""
+        metrics.api_call()
+        messages = self.client.beta.threads.messages.list(thread_id=thread_id, limit=1)
+        assistant_message = messages.data[0]
+        return assistant_message.content[0].text.value
+    
+    def _build_cypher_prompt(self, user_question, context=""):
+        """Build the prompt asking the assistant for a Cypher query."""
         prompt = user_question
         if context:
             prompt += f"\n\nAdditional context: {context}"
         
-        # Create a dedicated thread just for Cypher generation
-        try:
-            query_thread = self.client.beta.threads.create()
-            
-            # Create a specialized assistant for query generation (or use a simple prompt)
-            query_prompt = f"""Generate a Neo4j Cypher query for the car sharing knowledgegraph that will answer this question: {prompt}
+        # Create a specialized assistant for query generation (or use a simple prompt)
+        return f"""Generate a Neo4j Cypher query for the car sharing knowledgegraph that will answer this question: {prompt}
 
 Use the schema defined in the instructions.
 
@@ -231,103 +473,378 @@ Important rules:
 - Don't LIMIT the results
 - Provide ONLY the Cypher query with no other text, explanations or formatting
 - Don't use ```cypher blocks, just the raw query"""
+    
+    def _build_repair_prompt(self, user_question, context, cypher_query, error):
+        """Build the prompt asking for a corrected version of a failing query."""
+        prompt = user_question
+        if context:
+            prompt += f"\n\nAdditional context: {context}"
+        
+        return f"""This Neo4j Cypher query for the car sharing knowledgegraph should answer the question: {prompt}
 
-            self.client.beta.threads.messages.create(
-                thread_id=query_thread.id,
-                role="user",
-                content=query_prompt
-            )
+{cypher_query}
+
+It failed with {error.code}: {error}
+
+Correct the query. Use the schema defined in the instructions.
+
+Important rules:
+- Don't LIMIT the results
+- Provide ONLY the Cypher query with no other text, explanations or formatting
+- Don't use ```cypher blocks, just the raw query"""
+    
+    @staticmethod
+    def _clean_cypher(cypher_query):
+        """Clean up any formatting artifacts around a generated query."""
+        return cypher_query.strip().replace("```cypher", "").replace("```", "").strip()
+    
+    def _cypher_completion_request(self, prompt):
+        """Build a chat completions request that returns the Cypher query as structured output."""
+        return {
+            "model": ASSISTANT_MODEL,
+            "temperature": 0,
+            "messages": [
+                {"role": "system", "content": self._get_instructions()},
+                {"role": "user", "content": prompt}
+            ],
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "cypher_query",
+                    "strict": True,
+                    "schema": {
+                        "type": "object",
+                        "properties": {"cypher": {"type": "string"}},
+                        "required": ["cypher"],
+                        "additionalProperties": False
+                    }
+                }
+            }
+        }
+    
+    def _generate_cypher_query(self, user_question, context="", metrics=None, prompt=None):
+        """
+        Translate a question into a Cypher query, with a chat completion in "completion" mode
+        and with a separate assistant run otherwise.
+        
+        Args:
+            prompt (str, optional): Prompt to use instead of the one built from the question, e.g. for repairs
+        
+        Returns:
+            str: The generated Cypher query
+        """
+        metrics = metrics or TurnMetrics(self.run_mode)
+        prompt = prompt or self._build_cypher_prompt(user_question, context)
+        
+        if self.cypher_mode == "completion":
+            completion = self.client.chat.completions.create(**self._cypher_completion_request(prompt))
+            metrics.api_call()
+            return self._clean_cypher(json.loads(completion.choices[0].message.content)["cypher"])
+        
+        # Run the assistant on a new thread holding just the prompt, created with the run in one call
+        outcome = RunOutcome(metrics, emit_text=False)
+        for _ in self._drive_run(None, outcome, messages=[{"role": "user", "content": prompt}]):
+            pass
+        run, cypher_query = outcome.run, outcome.message_text
+        try:
+            if run.status != "completed":
+                raise Exception(f"Knowledgegraph query failed with status: {run.status}")
             
-            # Run assistant to generate query
-            run = self.client.beta.threads.runs.create(
-                thread_id=query_thread.id,
-                assistant_id=self.assistant.id,
-            )
+            if cypher_query is None:
+                cypher_query = self._get_last_message_text(run.thread_id, metrics)
+        finally:
+            if self.thread_janitor is not None:
+                self.thread_janitor.discard(run.thread_id)
+        
+        return self._clean_cypher(cypher_query)
+    
+    def _check_query(self, cypher_query, params, neo4j_client, metrics=None):
+        """Run the pre-flight checks on a query, returning it as possibly rewritten."""
+        started = time.perf_counter()
+        try:
+            checked = self.cypher_preflight.check(cypher_query, neo4j_client, params)
+        except CypherPreflightError as e:
+            if metrics is not None:
+                metrics.preflight(time.perf_counter() - started, rejected=True)
+            e.query = cypher_query
+            raise
+        if metrics is not None:
+            metrics.preflight(time.perf_counter() - started, rewritten=checked != cypher_query)
+        if checked != cypher_query:
+            print(f"Pre-flight rewrote Cypher query to: {checked}")
+        return checked
+    
+    def _execute_checked_query(self, cypher_query, params, neo4j_client, metrics=None):
+        """
+        Run the pre-flight checks on a query and execute it.
+        
+        Returns:
+            tuple: (query as executed, rows, total number of rows)
+        Raises:
+            CypherPreflightError, Neo4jQueryError: If the query was rejected or failed
+        """
+        if self.cypher_preflight is not None:
+            cypher_query = self._check_query(cypher_query, params, neo4j_client, metrics)
+        query_results, total_rows = neo4j_client.fetch_rows(
+            cypher_query, params, raise_errors=True, query_class="generated",
+            cancel_token=metrics.cancel_token if metrics is not None else None
+        )
+        return cypher_query, query_results, total_rows
+    
+    def _execute_with_repair(self, cypher_query, params, source, user_question, context, neo4j_client, metrics=None):
+        """
+        Execute a query, repairing it while the pre-flight rejects it or Neo4j reports an error in the
+        statement, at most max_repair_attempts times. Each repair asks for a corrected query given the
+        question, the failing query and the error. Inline queries are not repaired here; the assistant
+        wrote them and gets the error to fix them itself.
+        
+        Returns:
+            tuple: (query as executed, rows, total number of rows, repair attempts made)
+        Raises:
+            CypherPreflightError, Neo4jQueryError: If the query could not be repaired
+        """
+        attempt = 0
+        started = None
+        while True:
+            try:
+                cypher_query, query_results, total_rows = self._execute_checked_query(
+                    cypher_query, params, neo4j_client, metrics
+                )
+            except (CypherPreflightError, Neo4jQueryError) as e:
+                if attempt:
+                    self._record_repair(attempt, started, False, metrics)
+                if not self._can_repair(e, source, attempt):
+                    raise
+                if metrics is not None:
+                    metrics.cancel_token.raise_if_cancelled()
+                attempt += 1
+                started = time.perf_counter()
+                print(f"Repairing Cypher query (attempt {attempt}) after {e.code}: {e}")
+                cypher_query = self._generate_cypher_query(
+                    user_question, context, metrics, prompt=self._build_repair_prompt(user_question, context, cypher_query, e)
+                )
+                continue
+            if attempt:
+                self._record_repair(attempt, started, True, metrics)
+            return cypher_query, query_results, total_rows, attempt
+    
+    def _can_repair(self, error, source, attempt):
+        """True if a rejected or failing query gets another repair attempt; inline queries are left to the assistant."""
+        repairable = isinstance(error, CypherPreflightError) or error.is_query_error
+        return repairable and source != "inline" and attempt < self.max_repair_attempts
+    
+    def _record_repair(self, attempt, started, succeeded, metrics=None):
+        seconds = time.perf_counter() - started
+        self.repair_stats.record(attempt, seconds, succeeded)
+        if metrics is not None:
+            metrics.repair(seconds, succeeded)
+    
+    def get_repair_stats(self):
+        """
+        Success rate and average added latency of Cypher repairs since start, by attempt number.
+        
+        Returns:
+            dict: attempt number -> attempts, success_rate and avg_seconds
+        """
+        return self.repair_stats.to_dict()
+    
+    def _format_query_output(self, cypher_query, query_results, params=None, total_rows=None, metrics=None):
+        """Build the tool output sent back to the assistant for an executed query, within the result budget."""
+        if params:
+            cypher_query += f"\nParameters: {json.dumps(params)}"
+        results_text, sent_rows = self.result_budget.format_rows(query_results, total_rows)
+        if metrics is not None:
+            # Compare against the same rows as indented JSON, the format tool outputs used before
+            metrics.tool_output(count_tokens(results_text), count_tokens(json.dumps(sent_rows, indent=2, default=str)),
+                                estimated=tokens_are_estimated())
+        return f"Query executed: {cypher_query}\n\nResults: {results_text}"
+    
+    def _record_query(self, executed_queries, user_question, context, cypher_query, params, query_results,
+                      total_rows, source, generated, metrics=None):
+        """
+        Cache a generated query that ran, add it to the executed queries and build the tool output.
+        
+        Returns:
+            str: The tool output with the query and its results, within the result budget
+        """
+        # Only queries that ran are cached
+        if generated and self.query_cache is not None:
+            self.query_cache.put(user_question, context, cypher_query)
+        
+        executed_queries.append({
+            "query": cypher_query,
+            "params": params,
+            "results": query_results,
+            "total_rows": total_rows,
+            "source": source
+        })
+        return self._format_query_output(cypher_query, query_results, params, total_rows, metrics)
+    
+    @staticmethod
+    def _query_error_output(error):
+        """Tool output for a rejected or failed query; nothing was returned, so tell the assistant why."""
+        if isinstance(error, CypherPreflightError):
+            return f"Query rejected before execution: {error}\nQuery: {error.query}"
+        return f"Query failed with {error.code}: {error}\nQuery: {error.query}"
+    
+    def _handle_query_knowledgegraph(self, arguments,neo4j_client,executed_queries, metrics=None):
+        """Handle the generate_cypher_query function call."""
+        user_question = arguments.get("user_question", "")
+        context = arguments.get("context", "")
+        
+        try:
+            # In inline mode the assistant already wrote the query
+            cypher_query = self._clean_cypher(arguments.get("cypher") or "")
+            params = {}
+            query_results = None
+            source = "inline"
             
-            # Wait for completion
-            run = self._wait_for_run_completion(query_thread.id, run.id)
+            # Common question shapes map to a parameterized query without asking the LLM
+            if not cypher_query and not context:
+                template_match = self._match_template(user_question, neo4j_client)
+                if template_match is not None:
+                    cypher_query, params = template_match.cypher, template_match.params
+                    source = "template"
+                    print(f"Using query template {template_match.template_name} with {params}")
+                    query_results = self._run_template_query(template_match, neo4j_client)
             
-            if run.status == "completed":
-                messages = self.client.beta.threads.messages.list(thread_id=query_thread.id, limit=1)
-                assistant_message = messages.data[0]
-                cypher_query = assistant_message.content[0].text.value.strip()
-                
-                # Clean up any formatting artifacts
-                cypher_query = cypher_query.replace("```cypher", "").replace("```", "").strip()
-                
-                print(f"Generated Cypher query: {cypher_query}")
-
-                query_results = neo4j_client.execute_query(cypher_query)
-                
-                executed_queries.append({
-                   "query": cypher_query,
-                   "results": query_results
-                })
-                                
-                # Return both query and results to the assistant
-                results_summary = f"Query executed: {cypher_query}\n\nResults: {json.dumps(query_results, indent=2)}"
-                
-                # For report generation, we need to track the raw results separately
-                self._last_query_results = query_results
-                                
-                return results_summary
+            if not cypher_query and self.query_cache is not None:
+                cypher_query = self.query_cache.get(user_question, context)
+                if cypher_query:
+                    source = "cache"
+                    print(f"Using cached Cypher query: {cypher_query}")
+            
+            generated = not cypher_query
+            if generated:
+                source = self.cypher_mode
+                started = time.perf_counter()
+                cypher_query = self._generate_cypher_query(user_question, context, metrics)
+                generation_seconds = time.perf_counter() - started
+                if metrics is not None:
+                    metrics.cypher_generated(generation_seconds)
+                print(f"Generated Cypher query in {generation_seconds:.2f}s: {cypher_query}")
+            
+            # Templates are known to be valid, everything else is checked before it runs and repaired if it fails
+            if query_results is None:
+                executed_query, query_results, total_rows, repairs = self._execute_with_repair(
+                    cypher_query, params, source, user_question, context, neo4j_client, metrics
+                )
+                if repairs:
+                    source = "repair"
+                # Cached queries that had to be fixed or repaired are cached again under the original question
+                generated = generated or (source != "inline" and executed_query != cypher_query)
+                cypher_query = executed_query
             else:
-                raise Exception(f"Knowledgegraph query failed with status: {run.status}")
+                total_rows = len(query_results)
+            
+            # Return both query and results to the assistant
+            return self._record_query(executed_queries, user_question, context, cypher_query, params,
+                                      query_results, total_rows, source, generated, metrics)
+        
+        except (CypherPreflightError, Neo4jQueryError) as e:
+            return self._query_error_output(e)
+        
+        except Cancelled:
+            # The turn was cancelled, so no tool output is sent for it
+            raise
                 
         except Exception as e:
             print(f"Error querying knowledgegraph: {e}")
            
             return "No data collected"
     
-    def _handle_generate_report(self, arguments, neo4j_client, executed_queries):
+    def _build_report(self, report_title, data, user_question, context):
+        """
+        Render and compile a report from query results, in the background when there is a report job queue.
+        
+        Returns:
+            tuple: (message for the assistant, report data for the UI)
+        """
+        # An identical report generated earlier is served from disk right away
+        cached = self.report_generator.cached_report(report_title, data, user_question, context)
+        if cached is None and self.report_jobs is not None:
+            job = self.report_jobs.submit(report_title, data, user_question, context)
+            user_message = f"✅ Report '{report_title}' with {job.records_count} records is being generated. It will be available for download in the interface below as soon as it is ready."
+            return user_message, job.to_dict()
+        
+        # Generate the report
+        typst_file, pdf_file = cached or self.report_generator.generate_report(
+            title=report_title,
+            data=data,
+            user_question=user_question,
+            context=context
+        )
+        
+        # Return file paths for the UI to handle
+        result = {
+            "typst_file": typst_file,
+            "pdf_file": pdf_file,
+            "title": report_title,
+            "records_count": len(data) if data else 0
+        }
+        
+        # Return a user-friendly message to the assistant instead of file paths
+        user_message = f"✅ Report '{report_title}' has been generated successfully with {len(data) if data else 0} records. The report files are now available for download in the interface below."
+        
+        return user_message, result
+    
+    def _handle_generate_report(self, arguments, neo4j_client, executed_queries, metrics=None):
         """Handle the generate_report function call."""
-        report_title = arguments.get("report_title", "Knowledgegraph Report")
-        user_question = arguments.get("user_question", "")
-        context = arguments.get("context", "")
+        report_title, user_question, context, query_args = self._report_arguments(arguments)
         
         try:
             # First, query the knowledgegraph to get data for the report
-            query_args = {"user_question": user_question, "context": context}
-            data_result = self._handle_query_knowledgegraph(query_args, neo4j_client, executed_queries)
+            # Track this report's query separately so concurrent tool calls can't mix up results
+            report_queries = []
+            self._handle_query_knowledgegraph(query_args, neo4j_client, report_queries, metrics)
+            executed_queries.extend(report_queries)
             
-            # Get the actual query results from the cached data
-            data = getattr(self, '_last_query_results', [])
-            
-            print(f"DEBUG: Using cached query results: {data}")
-            print(f"DEBUG: Data length: {len(data) if data else 0}")
-            
-            # Generate the report
-            typst_file, pdf_file = self.report_generator.generate_report(
-                title=report_title,
-                data=data,
-                user_question=user_question,
-                context=context
-            )
+            # Get the actual query results for the report
+            data = report_queries[-1]["results"] if report_queries else []
             
-            # Clean up old reports
-            self.report_generator.cleanup_old_reports(max_age_hours=24)
-            
-            # Return file paths for the UI to handle
-            result = {
-                "typst_file": typst_file,
-                "pdf_file": pdf_file,
-                "title": report_title,
-                "records_count": len(data) if data else 0
-            }
-            
-            # Return a user-friendly message to the assistant instead of file paths
-            user_message = f"✅ Report '{report_title}' has been generated successfully with {len(data) if data else 0} records. The report files are now available for download in the interface below."
-            
-            return user_message, result
+            return self._build_report(report_title, data, user_question, context)
+        
+        except Cancelled:
+            raise
             
         except Exception as e:
-            print(f"Error generating report: {e}")
-            error_result = {
-                "error": str(e),
-                "title": report_title
-            }
-            error_message = f"❌ Failed to generate report '{report_title}': {str(e)}"
-            return error_message, error_result
+            return self._report_error(report_title, e)
+    
+    @staticmethod
+    def _report_arguments(arguments):
+        """
+        Read the generate_report arguments.
+        
+        Returns:
+            tuple: (report_title, user_question, context, arguments for the report's query)
+        """
+        report_title = arguments.get("report_title", "Knowledgegraph Report")
+        user_question = arguments.get("user_question", "")
+        context = arguments.get("context", "")
+        query_args = {"user_question": user_question, "context": context, "cypher": arguments.get("cypher")}
+        return report_title, user_question, context, query_args
+    
+    @staticmethod
+    def _report_error(report_title, error):
+        """
+        Returns:
+            tuple: (message for the assistant, report data with the error) for a report that failed
+        """
+        print(f"Error generating report: {error}")
+        error_result = {
+            "error": str(error),
+            "title": report_title
+        }
+        if isinstance(error, ReportQueueFull):
+            error_result["queue_full"] = True
+        error_message = f"❌ Failed to generate report '{report_title}': {str(error)}"
+        return error_message, error_result
+    
+    @staticmethod
+    def _collect_report(generated_reports, report_data):
+        """Track a generated report; failed reports are only reported to the assistant."""
+        if generated_reports is not None and report_data and "error" not in report_data:
+            generated_reports.append(report_data)
     
     def _fix_sandbox_links(self, response_text, generated_reports):
         """
@@ -361,21 +878,85 @@ Important rules:
         
         return modified_text
 
-    def _handle_function_call(self, function_name, arguments, neo4j_client, executed_queries, generated_reports=None):
+    def _handle_function_call(self, function_name, arguments, neo4j_client, executed_queries, generated_reports=None, metrics=None):
         """Route function calls to appropriate handlers."""
         if function_name == "query_knowledgegraph":
-            return self._handle_query_knowledgegraph(arguments,neo4j_client,executed_queries)
+            return self._handle_query_knowledgegraph(arguments,neo4j_client,executed_queries, metrics)
         elif function_name == "generate_report":
-            result, report_data = self._handle_generate_report(arguments,neo4j_client,executed_queries)
-            # Track generated reports
-            if generated_reports is not None and report_data:
-                if "error" not in report_data:
-                    print(f"DEBUG: Adding report data to generated_reports: {report_data}")
-                    generated_reports.append(report_data)
+            result, report_data = self._handle_generate_report(arguments,neo4j_client,executed_queries, metrics)
+            self._collect_report(generated_reports, report_data)
             return result
         else:
             raise ValueError(f"Unknown function: {function_name}")
     
+    def _run_tool_call(self, tool_call, neo4j_client, metrics):
+        """
+        Execute a single tool call, collecting its queries and reports in lists of its own.
+        
+        Returns:
+            tuple: (output, executed_queries, generated_reports)
+        """
+        function_name = tool_call.function.name
+        executed_queries = []
+        generated_reports = []
+        
+        try:
+            arguments = json.loads(tool_call.function.arguments)
+            print(f"Function called: {function_name} with args: {arguments}")
+            result = self._handle_function_call(function_name, arguments, neo4j_client, executed_queries, generated_reports, metrics)
+            output = str(result)
+        except Cancelled:
+            raise
+        except Exception as e:
+            output = tool_error_output(function_name, e)
+        
+        return output, executed_queries, generated_reports
+    
+    def _execute_tool_calls(self, turn, neo4j_client):
+        """
+        Execute the tool calls the turn's run requires, concurrently when there is a worker pool.
+        
+        Returns:
+            list: Tool outputs in the order of the tool calls
+        """
+        metrics = turn.metrics
+        tool_calls = turn.run.required_action.submit_tool_outputs.tool_calls
+        metrics.tool_calls += len(tool_calls)
+        
+        if self._tool_executor is None:
+            outcomes = [self._run_tool_call(tool_call, neo4j_client, metrics) for tool_call in tool_calls]
+        else:
+            futures = [
+                self._tool_executor.submit(self._run_tool_call, tool_call, neo4j_client, metrics)
+                for tool_call in tool_calls
+            ]
+            deadline = time.monotonic() + self.tool_call_timeout
+            outcomes = []
+            timed_out = False
+            for tool_call, future in zip(tool_calls, futures):
+                try:
+                    outcomes.append(future.result(timeout=max(0, deadline - time.monotonic())))
+                except FuturesTimeoutError:
+                    future.cancel()
+                    outcomes.append((tool_timeout_output(tool_call.function.name, self.tool_call_timeout), [], []))
+                    timed_out = True
+            # The worker threads cannot be stopped, but their queries still running on the server can
+            if timed_out:
+                self._terminate_turn_queries(neo4j_client, metrics)
+        
+        return turn.add_tool_outcomes(tool_calls, outcomes)
+    
+    @staticmethod
+    def _terminate_turn_queries(neo4j_client, metrics):
+        """Terminate the transactions of a turn still running on the server, e.g. after a tool call timed out."""
+        try:
+            terminated = neo4j_client.terminate_transactions(turn_id=metrics.cancel_token.turn_id)
+        except Exception as e:
+            print(f"Could not terminate the queries of turn {metrics.cancel_token.turn_id}: {e}")
+            return
+        if terminated:
+            neo4j_client.metrics.interrupted("cancel", terminated)
+    
     def chat_with_knowledgegraph(self, user_message, neo4j_client, thread_id=None):
         """
         Enhanced chat method that integrates knowledgegraph operations.
@@ -386,98 +967,119 @@ Important rules:
             thread_id (str, optional): Existing thread ID to continue conversation
             
         Returns:
-            dict: Response containing message, any query results, generated reports, and thread_id
+            dict: Response containing message, any query results, generated reports, thread_id and turn metrics
         """
-        executed_queries = []
-        generated_reports = []
-        
+        response = None
+        for event in self.stream_chat_with_knowledgegraph(user_message, neo4j_client, thread_id):
+            if event["type"] == "done":
+                response = event["response"]
+        return response
+    
+    def _cancel_run(self, run):
+        """Cancel a run waiting for tool outputs, so the thread accepts new messages again."""
+        if run is None or run.status != "requires_action":
+            return
         try:
-            # Create or use existing thread
-            if thread_id:
-                thread = self.client.beta.threads.retrieve(thread_id)
-            else:
-                thread = self.client.beta.threads.create()
+            self.client.beta.threads.runs.cancel(thread_id=run.thread_id, run_id=run.id)
+        except Exception as e:
+            print(f"Could not cancel run {run.id}: {e}")
+    
+    def _answer_from_template(self, user_message, template_match, query_results, turn):
+        """Answer a question from the results of a query template, yielding the same events as an assistant turn."""
+        print(f"Answered from query template {template_match.template_name} with {template_match.params}")
+        turn.executed_queries.append({
+            "query": template_match.cypher,
+            "params": template_match.params,
+            "results": query_results,
+            "total_rows": len(query_results),
+            "source": "template"
+        })
+        yield from turn.result_events()
+        
+        answer = self.template_engine.format_answer(template_match, query_results)
+        turn.metrics.first_token()
+        yield {"type": "text_delta", "text": answer}
+        
+        # Keep the conversation coherent for the assistant without calling OpenAI now
+        turn.thread_id = self._defer_messages(turn.thread_id, [("user", user_message), ("assistant", answer)])
+        
+        yield turn.done(answer, answered_by="template")
+    
+    def stream_chat_with_knowledgegraph(self, user_message, neo4j_client, thread_id=None, cancel_token=None):
+        """
+        Generator variant of chat_with_knowledgegraph that reports progress as it happens.
+        
+        The turn stops at the next query, streamed record or run event once cancel_token is cancelled,
+        or when the caller closes the generator; queries of the turn still running are terminated.
+        
+        Args:
+            user_message (str): The user's message
+            neo4j_client: Neo4j client instance for executing knowledgegraph queries
+            thread_id (str, optional): Existing thread ID to continue conversation
+            cancel_token (CancelToken, optional): Token to cancel the turn with from another thread
             
-            # Add user message to thread
-            self.client.beta.threads.messages.create(
-                thread_id=thread.id,
-                role="user",
-                content=user_message
-            )
+        Yields:
+            dict: Events with a "type" key:
+                - "text_delta": {"text"} a chunk of the assistant's reply
+                - "tool_call": {"name", "arguments"} a function call is being executed
+                - "query_result": {"query", "results"} a knowledgegraph query finished
+                - "report": {"report"} a report was generated
+                - "done": {"response"} the same dict chat_with_knowledgegraph returns
+        """
+        turn = Turn(TurnMetrics(self.run_mode, self.cypher_mode, cancel_token), thread_id)
+        metrics = turn.metrics
+        
+        try:
+            # Answer common question shapes straight from a template, without any OpenAI call, unless the
+            # question needs the conversation or a direct answer rather than a list
+            template_match = None
+            if self._can_answer_directly(user_message, thread_id):
+                template_match = self._match_template(user_message, neo4j_client)
+            if template_match is not None:
+                query_results = self._run_template_query(template_match, neo4j_client)
+                yield from self._answer_from_template(user_message, template_match, query_results, turn)
+                return
             
-            # Run the assistant
-            run = self.client.beta.threads.runs.create(
-                thread_id=thread.id,
-                assistant_id=self.assistant.id,
-            )
+            # Start the run with the user message and any template answers given since the last run,
+            # on a new thread unless the conversation already has one
+            messages = turn.start_messages(self._take_pending_messages(thread_id), user_message)
             
-            # Wait for completion and handle function calls
-            while True:
-                run = self._wait_for_run_completion(thread.id, run.id)
-                
-                if run.status == "requires_action":
-                    # Handle function calls
-                    tool_outputs = []
-                    for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-                        function_name = tool_call.function.name
-                        arguments = json.loads(tool_call.function.arguments)
-                        
-                        print(f"Function called: {function_name} with args: {arguments}")
-                        
-                        try:
-                            result = self._handle_function_call(function_name, arguments, neo4j_client, executed_queries, generated_reports)
-                            tool_outputs.append({
-                                "tool_call_id": tool_call.id,
-                                "output": str(result)
-                            })
-                                
-                        except Exception as e:
-                            error_msg = f"Error executing {function_name}: {str(e)}"
-                            print(error_msg)
-                            tool_outputs.append({
-                                "tool_call_id": tool_call.id,
-                                "output": error_msg
-                            })
-                    
-                    # Submit tool outputs and continue
-                    run = self.client.beta.threads.runs.submit_tool_outputs(
-                        thread_id=thread.id,
-                        run_id=run.id,
-                        tool_outputs=tool_outputs
-                    )
-                    continue
+            # Run the assistant, handling function calls as soon as they are requested
+            outcome = RunOutcome(metrics)
+            yield from self._drive_run(turn.openai_thread_id, outcome, messages=messages)
+            turn.follow(outcome.run)
+            while turn.run.status == "requires_action":
+                yield from turn.tool_call_events()
+                tool_outputs = self._execute_tool_calls(turn, neo4j_client)
+                yield from turn.result_events()
                 
-                elif run.status == "completed":
-                    break
-                elif run.status in ["failed", "cancelled", "expired"]:
-                    raise Exception(f"Run {run.status}: {run.last_error}")
+                outcome = RunOutcome(metrics)
+                yield from self._drive_run(turn.thread_id, outcome, run_id=turn.run.id, tool_outputs=tool_outputs)
+                turn.follow(outcome.run)
             
-            # Get the assistant's response
-            messages = self.client.beta.threads.messages.list(thread_id=thread.id, limit=1)
-            assistant_message = messages.data[0]
+            turn.check_completed()
             
-            response_text = assistant_message.content[0].text.value
+            # Get the assistant's response unless the stream already delivered it
+            response_text = outcome.message_text
+            if response_text is None:
+                response_text = self._get_last_message_text(turn.thread_id, metrics)
+                metrics.first_token()
+                yield {"type": "text_delta", "text": response_text}
             
             # Fix any sandbox file links in the response
-            response_text = self._fix_sandbox_links(response_text, generated_reports)
+            response_text = self._fix_sandbox_links(response_text, turn.generated_reports)
             
-            return {
-                "message": response_text,
-                "thread_id": thread.id,
-                "executed_queries": executed_queries,
-                "generated_reports": generated_reports,
-                "status": "success"
-            }
+            done = turn.done(response_text)
+            print(f"Turn metrics: {done['response']['metrics']}")
+            yield done
             
+        except GeneratorExit:
+            # The caller abandoned the turn, stop its queries still running on the server
+            neo4j_client.cancel(metrics.cancel_token)
+            raise
+        except Cancelled:
+            neo4j_client.cancel(metrics.cancel_token)
+            self._cancel_run(turn.run)
+            yield turn.cancelled()
         except Exception as e:
-            print(f"Error in chat_with_knowledgegraph: {e}")
-            return {
-                "message": "I'm sorry, I encountered an error processing your request. Please try again.",
-                "thread_id": thread_id,
-                "executed_queries": executed_queries,
-                "status": "error",
-                "error": str(e)
-            }
-    
-    
-   
+            yield turn.failed(e)
@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from database.json_files import remove_stale_temp_files, write_json_atomic
+
+# Words that carry no meaning for matching questions against each other
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "by", "with",
+    "is", "are", "be", "do", "does", "what", "which", "who", "whom", "show", "me",
+    "list", "give", "get", "find", "please", "can", "you", "i", "we", "our",
+    "that", "this", "these", "those", "there", "their", "it", "its", "from", "as",
+}
+
+# Negations, quantifiers and comparisons change what a question asks for, so two questions are
+# only near-duplicates if they agree on all of these (and on every number)
+QUALIFIERS = {
+    "not", "no", "none", "nor", "never", "without", "except", "excluding", "only",
+    "all", "any", "every", "each", "more", "less", "fewer", "most", "least",
+    "above", "below", "over", "under", "greater", "smaller", "than",
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+}
+
+
+def normalize_text(text):
+    """Lowercase, spell out "n't" as "not", strip punctuation and collapse whitespace."""
+    text = (text or "").lower()
+    text = re.sub(r"n['’]t\b", " not", text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def tokenize(text):
+    """Return the set of meaningful tokens of a normalized text."""
+    return {token for token in normalize_text(text).split() if token not in STOPWORDS}
+
+
+def is_qualifier(token):
+    return token in QUALIFIERS or token.isdigit()
+
+
+def schema_fingerprint(*parts):
+    """Hash the assistant instructions, tools and model so cache entries can be tied to a schema."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, str):
+            part = json.dumps(part, sort_keys=True)
+        digest.update(part.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CypherQueryCache:
+    """
+    Persistent question -> Cypher cache with LRU eviction.
+
+    Exact lookups use the normalized question and context. Near-duplicates are found
+    by token (Jaccard) similarity; a near-duplicate is only reused if every string
+    literal in its cached Cypher also appears in the new question, so that
+    "steps of Car Rental" never returns the query written for "steps of Car Maintenance",
+    and if both questions have the same qualifiers, so that "roles that never perform"
+    never returns the query written for "roles that perform".
+
+    Changes are written to the cache file at most every save_delay seconds, and at exit.
+    """
+
+    def __init__(self, cache_file=None, max_entries=500, similarity_threshold=0.85, schema_hash="", save_delay=2.0):
+        if cache_file is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.cache')
+            cache_file = os.path.join(cache_dir, 'cypher_cache.json')
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.schema_hash = schema_hash
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.save_delay = save_delay
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        self._flush_at_exit = False
+        self._load()
+
+    @staticmethod
+    def make_key(user_question, context=""):
+        return f"{normalize_text(user_question)}||{normalize_text(context)}"
+
+    def get(self, user_question, context=""):
+        """
+        Look up the Cypher query for a question.
+
+        Returns:
+            str or None: The cached Cypher query, or None on a miss
+        """
+        key = self.make_key(user_question, context)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["cypher"]
+
+            tokens = tokenize(f"{user_question} {context}")
+            question_text = normalize_text(f"{user_question} {context}")
+            best_key, best_score = None, 0.0
+            for candidate_key, candidate in self._entries.items():
+                candidate_tokens = set(candidate["tokens"])
+                score = self._similarity(tokens, candidate_tokens)
+                if score > best_score and self._qualifiers_match(tokens, candidate_tokens) \
+                        and self._literals_match(candidate["cypher"], question_text):
+                    best_key, best_score = candidate_key, score
+
+            if best_key is not None and best_score >= self.similarity_threshold:
+                self._entries.move_to_end(best_key)
+                self.near_hits += 1
+                return self._entries[best_key]["cypher"]
+
+            self.misses += 1
+            return None
+
+    def put(self, user_question, context, cypher):
+        """Store a generated Cypher query; the cache file is written shortly after."""
+        key = self.make_key(user_question, context)
+        with self._lock:
+            self._entries[key] = {
+                "cypher": cypher,
+                "tokens": sorted(tokenize(f"{user_question} {context}")),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._schedule_save()
+
+    def invalidate(self):
+        """Drop all cached queries, e.g. after the schema changed."""
+        with self._lock:
+            self._entries.clear()
+            self._schedule_save()
+
+    def flush(self):
+        """Write pending changes to the cache file now."""
+        # Writes are serialized, so an older snapshot never replaces a newer one
+        with self._save_lock:
+            with self._lock:
+                timer, self._save_timer = self._save_timer, None
+                if timer is None:
+                    return
+                timer.cancel()
+                payload = {"schema_hash": self.schema_hash, "entries": list(self._entries.items())}
+            try:
+                write_json_atomic(self.cache_file, payload)
+            except Exception as e:
+                print(f"Could not save Cypher cache: {e}")
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+        }
+
+    @staticmethod
+    def _similarity(tokens_a, tokens_b):
+        if not tokens_a or not tokens_b:
+            return 0.0
+        return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+    @staticmethod
+    def _qualifiers_match(tokens_a, tokens_b):
+        """True if no negation, quantifier, comparison or number appears in only one of the questions."""
+        return not any(is_qualifier(token) for token in tokens_a ^ tokens_b)
+
+    @staticmethod
+    def _literals_match(cypher, question_text):
+        literals = re.findall(r"'([^']*)'|\"([^\"]*)\"", cypher)
+        for single, double in literals:
+            literal = normalize_text(single or double)
+            if literal and literal not in question_text:
+                return False
+        return True
+
+    def _schedule_save(self):
+        """Batch the changes of the next save_delay seconds into one write; called with the lock held."""
+        if self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(self.save_delay, self.flush)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+        if not self._flush_at_exit:
+            self._flush_at_exit = True
+            atexit.register(self.flush)
+
+    def _load(self):
+        remove_stale_temp_files(os.path.dirname(self.cache_file))
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except Exception as e:
+            print(f"Could not load Cypher cache: {e}")
+            return
+
+        if stored.get("schema_hash") != self.schema_hash:
+            print("Schema changed, discarding cached Cypher queries")
+            return
+
+        for key, entry in stored.get("entries", []):
+            self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
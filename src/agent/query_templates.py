@@ -0,0 +1,233 @@
+import re
+import time
+import threading
+from .query_cache import normalize_text
+
+# Loads the names the templates can refer to
+ENTITY_INDEX_QUERY = """
+MATCH (n)
+WHERE n:process OR n:department OR n:role OR n:step OR n:system
+RETURN labels(n)[0] AS label, n.name AS name
+"""
+
+LABEL_PLURALS = {
+    "process": "processes",
+    "department": "departments",
+    "role": "roles",
+    "step": "steps",
+    "system": "systems",
+}
+
+# Questions asking for reasoning, comparison or hypotheticals always go to the LLM
+REASONING_WORDS = re.compile(
+    r"\b(why|how|should|could|would|risk|impact|compare|comparison|summar\w*|explain|consolidat\w*|"
+    r"expect\w*|recommend\w*|suggest\w*|if|not|without|except|count|many|most|least|report|document)\b"
+)
+
+# Yes/no questions and questions about one element by position want an answer, not the list a template returns
+YES_NO_QUESTION = re.compile(r"^(is|are|was|were|does|do|did|has|have|had|can|will)\b")
+ORDINAL_WORDS = re.compile(
+    r"\b(first|second|third|fourth|fifth|last|next|previous|final|initial|\d+(st|nd|rd|th))\b"
+)
+
+# Words referring back to an earlier message; in a conversation they need the thread to be understood
+FOLLOW_UP_WORDS = re.compile(
+    r"^(and|also|what about|how about)\b|\b(it|its|they|them|their|this|that|these|those|same|one|ones|"
+    r"other|another|former|latter|above|else)\b"
+)
+
+
+class QueryTemplate:
+    """A question shape answered by a fixed, parameterized Cypher query."""
+
+    def __init__(self, name, keywords, cypher, entity_label=None, title=None, excluded=None):
+        self.name = name
+        self.keywords = re.compile(keywords)
+        self.excluded = re.compile(excluded) if excluded else None
+        self.cypher = cypher
+        self.entity_label = entity_label
+        self.title = title
+
+    def matches(self, question_text):
+        if not self.keywords.search(question_text):
+            return False
+        return not (self.excluded and self.excluded.search(question_text))
+
+
+TEMPLATES = [
+    QueryTemplate(
+        "steps_of_process",
+        keywords=r"\bsteps?\b",
+        excluded=r"\b(roles?|systems?|departments?|who|owns?|owner|supports?|performs?)\b",
+        entity_label="process",
+        title="Steps of the {name} process",
+        cypher="MATCH (p:process {name: $name})-[:has_step]->(s:step) RETURN s.name AS step, s.description AS description",
+    ),
+    QueryTemplate(
+        "roles_in_process",
+        keywords=r"\b(roles?|who performs?|performed by)\b",
+        excluded=r"\b(systems?|departments?|owns?|owner|supports?)\b",
+        entity_label="process",
+        title="Roles performing steps of the {name} process",
+        cypher="MATCH (p:process {name: $name})-[:has_step]->(s:step)<-[:performs]-(r:role) RETURN r.name AS role, s.name AS step",
+    ),
+    QueryTemplate(
+        "systems_for_process",
+        keywords=r"\bsystems?\b",
+        excluded=r"\b(roles?|departments?|owns?|owner|performs?)\b",
+        entity_label="process",
+        title="Systems supporting the {name} process",
+        cypher="MATCH (p:process {name: $name})-[:has_step]->(s:step)<-[:supports]-(sys:system) RETURN DISTINCT sys.name AS system, sys.category AS category",
+    ),
+    QueryTemplate(
+        "systems_for_step",
+        keywords=r"\bsystems?\b",
+        excluded=r"\b(roles?|departments?|owns?|owner|performs?)\b",
+        entity_label="step",
+        title="Systems supporting the {name} step",
+        cypher="MATCH (sys:system)-[:supports]->(s:step {name: $name}) RETURN sys.name AS system, sys.category AS category",
+    ),
+    QueryTemplate(
+        "owner_of_process",
+        keywords=r"\b(owns?|owner|owned|responsible)\b",
+        excluded=r"\b(roles?|systems?|steps?)\b",
+        entity_label="process",
+        title="Owner of the {name} process",
+        cypher="MATCH (d:department)-[:is_owner_of]->(p:process {name: $name}) RETURN d.name AS department",
+    ),
+]
+
+# "List all processes" style questions without an entity
+LIST_PATTERN = re.compile(r"^(list|show|show me|give me|what are|which are)( all)?( the)?( of the)? (\w+)( in the (knowledgegraph|knowledge graph))?$")
+
+
+class TemplateMatch:
+    """A template resolved against a question, ready to run."""
+
+    def __init__(self, template_name, cypher, params, title):
+        self.template_name = template_name
+        self.cypher = cypher
+        self.params = params
+        self.title = title
+
+
+class QueryTemplateEngine:
+    """
+    Answers common question shapes with parameterized Cypher, without asking the LLM.
+
+    Entity names in a question are resolved against an in-memory index of node names, loaded
+    from Neo4j with ENTITY_INDEX_QUERY and refreshed every `index_ttl` seconds. A question is only
+    answered from a template if exactly one template matches it unambiguously; everything else
+    falls back to the LLM.
+    """
+
+    def __init__(self, index_ttl=300):
+        self.index_ttl = index_ttl
+        self.hits = 0
+        self.misses = 0
+        self._names = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def needs_refresh(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.index_ttl
+
+    def load_index(self, rows):
+        """Build the name index from the rows of ENTITY_INDEX_QUERY."""
+        names = {}
+        for row in rows:
+            label, name = row.get("label"), row.get("name")
+            if label in LABEL_PLURALS and name:
+                names[normalize_text(name)] = (label, name)
+        with self._lock:
+            self._names = names
+            self._loaded_at = time.monotonic()
+
+    def find_entities(self, question_text):
+        """
+        Find the entity names mentioned in a normalized question, longest names first.
+
+        Returns:
+            list: (label, name) tuples, overlapping shorter mentions removed
+        """
+        found = []
+        covered = question_text
+        with self._lock:
+            candidates = sorted(self._names.items(), key=lambda item: len(item[0]), reverse=True)
+        for normalized_name, (label, name) in candidates:
+            pattern = rf"\b{re.escape(normalized_name)}\b"
+            if re.search(pattern, covered):
+                found.append((label, name))
+                covered = re.sub(pattern, " ", covered)
+        return found
+
+    @staticmethod
+    def answers_directly(question, in_conversation=False):
+        """
+        True if a template answer can be the whole reply to a user message: not a yes/no question, not about
+        an element by position and, in a conversation, not a follow-up that refers to earlier messages.
+        Everything else goes to the assistant, which sees the thread and can still use the templates.
+        """
+        question_text = normalize_text(question)
+        if YES_NO_QUESTION.search(question_text) or ORDINAL_WORDS.search(question_text):
+            return False
+        return not (in_conversation and FOLLOW_UP_WORDS.search(question_text))
+
+    def match(self, question):
+        """
+        Resolve a question to a template.
+
+        Returns:
+            TemplateMatch or None: None if the question needs the LLM
+        """
+        question_text = normalize_text(question)
+        if not question_text or REASONING_WORDS.search(question_text):
+            self.misses += 1
+            return None
+
+        list_match = LIST_PATTERN.match(question_text)
+        if list_match:
+            for label, plural in LABEL_PLURALS.items():
+                if list_match.group(5) in (label, plural):
+                    self.hits += 1
+                    return TemplateMatch(
+                        "list_" + plural,
+                        f"MATCH (n:{label}) RETURN n.name AS {label}, n.description AS description",
+                        {},
+                        f"All {plural}"
+                    )
+
+        entities = self.find_entities(question_text)
+        if len(entities) != 1:
+            self.misses += 1
+            return None
+        label, name = entities[0]
+
+        candidates = [t for t in TEMPLATES if t.entity_label == label and t.matches(question_text)]
+        if len(candidates) != 1:
+            self.misses += 1
+            return None
+
+        template = candidates[0]
+        self.hits += 1
+        return TemplateMatch(template.name, template.cypher, {"name": name}, template.title.format(name=name))
+
+    @staticmethod
+    def format_answer(match, rows):
+        """Render template results as a short markdown answer."""
+        if not rows:
+            return f"**{match.title}**\n\nThe knowledgegraph has no matching data."
+
+        lines = [f"**{match.title}** ({len(rows)})", ""]
+        for row in rows:
+            values = [str(value) for key, value in row.items() if key != "description" and value is not None]
+            line = f"- **{values[0]}**" if values else "-"
+            if len(values) > 1:
+                line += f" ({', '.join(values[1:])})"
+            if row.get("description"):
+                line += f": {row['description']}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def stats(self):
+        return {"names": len(self._names), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,173 @@
+import os
+import re
+import json
+from collections import Counter
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# How rows are written into tool outputs
+ENCODINGS = ["columnar", "tsv", "json"]
+
+# Repeated text values at least this long are written once and referenced as "$<index>"
+MIN_SHARED_VALUE_CHARS = 16
+VALUE_REFERENCE = re.compile(r"^\$\d+$")
+
+_tokenizer = None
+
+
+def count_tokens(text):
+    """Tokens of text for the gpt-4o tokenizer, estimated at four characters per token without tiktoken."""
+    global _tokenizer
+    if tiktoken is not None and _tokenizer is None:
+        try:
+            _tokenizer = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _tokenizer = False
+    if _tokenizer:
+        return len(_tokenizer.encode(text))
+    return (len(text) + 3) // 4
+
+
+def tokens_are_estimated():
+    """True if count_tokens estimates from characters, because tiktoken or its encoding is unavailable."""
+    if tiktoken is not None and _tokenizer is None:
+        count_tokens("")
+    return not _tokenizer
+
+
+def _compact_json(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _tsv_cell(value):
+    if value is None:
+        return ""
+    text = value if isinstance(value, str) else _compact_json(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+class ResultBudget:
+    """
+    Limits and encoding of the query results sent back to the model in a tool output.
+
+    Rows are added until either `max_rows` or `max_bytes` is reached; text values longer than
+    `max_value_chars` are shortened. What was left out is summarized in a note, so the model knows
+    the answer is partial. The UI and reports still get every fetched row.
+
+    The default columnar encoding writes the column names once and every row as an array, and
+    writes repeated long text values only once. "tsv" writes a header line and tab separated rows,
+    "json" a compact array of objects.
+    """
+
+    def __init__(self, max_rows=200, max_bytes=16000, max_value_chars=1000, encoding="columnar"):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown tool output format '{encoding}', expected one of {', '.join(ENCODINGS)}")
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_value_chars = max_value_chars
+        self.encoding = encoding
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_rows=int(os.getenv("OPENAI_TOOL_OUTPUT_MAX_ROWS", "200")),
+            max_bytes=int(os.getenv("OPENAI_TOOL_OUTPUT_MAX_BYTES", "16000")),
+            max_value_chars=int(os.getenv("OPENAI_TOOL_OUTPUT_MAX_VALUE_CHARS", "1000")),
+            encoding=os.getenv("OPENAI_TOOL_OUTPUT_FORMAT", "columnar").lower(),
+        )
+
+    def _shorten(self, row):
+        """Return the row with long text values cut, and how many values were cut."""
+        shortened = {}
+        cut = 0
+        for key, value in row.items():
+            if isinstance(value, str) and len(value) > self.max_value_chars:
+                value = value[:self.max_value_chars] + "…"
+                cut += 1
+            shortened[key] = value
+        return shortened, cut
+
+    def _row_size(self, row):
+        """Bytes a row takes in the output before shared values are factored out."""
+        if self.encoding == "json":
+            encoded = _compact_json(row)
+        elif self.encoding == "tsv":
+            encoded = "\t".join(_tsv_cell(value) for value in row.values())
+        else:
+            encoded = _compact_json(list(row.values()))
+        return len(encoded.encode("utf-8")) + 1
+
+    def _encode_columnar(self, rows):
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+        counts = Counter(
+            value for row in rows for value in row.values()
+            if isinstance(value, str) and (len(value) >= MIN_SHARED_VALUE_CHARS or VALUE_REFERENCE.match(value))
+        )
+        # Literal "$<n>" strings always go through the table, so every "$<n>" cell is a reference
+        shared = [value for value, count in counts.items() if count > 1 or VALUE_REFERENCE.match(value)]
+        references = {value: f"${index}" for index, value in enumerate(shared)}
+
+        encoded = {
+            "columns": columns,
+            "rows": [[references.get(row.get(column), row.get(column)) if isinstance(row.get(column), str)
+                      else row.get(column) for column in columns] for row in rows],
+        }
+        if shared:
+            encoded["values"] = shared
+        return _compact_json(encoded), bool(shared)
+
+    def _encode(self, rows):
+        """Encode the selected rows, returning the text and whether it uses shared value references."""
+        if self.encoding == "json":
+            return _compact_json(rows), False
+        if self.encoding == "tsv":
+            columns = list(dict.fromkeys(key for row in rows for key in row))
+            lines = ["\t".join(_tsv_cell(column) for column in columns)]
+            lines += ["\t".join(_tsv_cell(row.get(column)) for column in columns) for row in rows]
+            return "\n".join(lines), False
+        return self._encode_columnar(rows)
+
+    def format_rows(self, rows, total_rows=None):
+        """
+        Encode rows within the budget.
+
+        Args:
+            rows (list): Fetched result rows
+            total_rows (int, optional): Rows the query produced, if more than were fetched
+
+        Returns:
+            tuple: (text for the tool output, the shortened rows it contains)
+        """
+        if total_rows is None:
+            total_rows = len(rows)
+
+        selected = []
+        used_bytes = 2
+        cut_values = 0
+        for row in rows[:self.max_rows]:
+            shortened, cut = self._shorten(row)
+            size = self._row_size(shortened)
+            # Always send at least one row, even if it alone exceeds the byte budget
+            if selected and used_bytes + size > self.max_bytes:
+                break
+            selected.append(shortened)
+            used_bytes += size
+            cut_values += cut
+
+        text, uses_references = self._encode(selected)
+        notes = []
+        if uses_references:
+            notes.append('Cells like "$0" stand for the entry with that index in "values".')
+        if len(selected) < total_rows:
+            notes.append(
+                f"Showing {len(selected)} of {total_rows} rows, {total_rows - len(selected)} rows were left out "
+                f"to fit the response budget. Aggregate or filter in Cypher to cover them."
+            )
+        if cut_values:
+            notes.append(f"{cut_values} long text values were shortened to {self.max_value_chars} characters.")
+        if notes:
+            text += "\n\nNote: " + " ".join(notes)
+        return text, selected
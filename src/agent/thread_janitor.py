@@ -0,0 +1,85 @@
+import queue
+import atexit
+import asyncio
+import threading
+
+
+class ThreadJanitor:
+    """
+    Deletes the throwaway threads of Cypher generation runs on a background thread, so deleting
+    them adds no latency to the turn and they do not pile up on the account.
+
+    Deletions still queued at exit get a few seconds to finish.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.deleted = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def discard(self, thread_id):
+        """Queue a thread for deletion."""
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="thread-janitor", daemon=True)
+                self._worker.start()
+                atexit.register(self.close)
+        self._queue.put(thread_id)
+
+    def _run(self):
+        while True:
+            thread_id = self._queue.get()
+            if thread_id is None:
+                return
+            try:
+                self.client.beta.threads.delete(thread_id)
+                self.deleted += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Error deleting thread {thread_id}: {e}")
+
+    def close(self, timeout=5):
+        """Stop the worker after the queued deletions, waiting at most timeout seconds."""
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._queue.put(None)
+            worker.join(timeout)
+
+    def stats(self):
+        return {"deleted": self.deleted, "failed": self.failed, "pending": self._queue.qsize()}
+
+
+class AsyncThreadJanitor:
+    """ThreadJanitor for AsyncOpenAI, deleting each thread in its own task on the running event loop."""
+
+    def __init__(self, client):
+        self.client = client
+        self.deleted = 0
+        self.failed = 0
+        self._tasks = set()
+
+    def discard(self, thread_id):
+        """Schedule a thread for deletion."""
+        task = asyncio.get_running_loop().create_task(self._delete(thread_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _delete(self, thread_id):
+        try:
+            await self.client.beta.threads.delete(thread_id)
+            self.deleted += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"Error deleting thread {thread_id}: {e}")
+
+    async def close(self, timeout=5):
+        """Wait for scheduled deletions, at most timeout seconds."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    def stats(self):
+        return {"deleted": self.deleted, "failed": self.failed, "pending": len(self._tasks)}
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# Conversations answered only from templates so far have no OpenAI thread yet
+LOCAL_THREAD_PREFIX = "local_"
+
+# Run states in which the assistant waits for us or has stopped for good
+RUN_FINAL_STATES = ["completed", "failed", "cancelled", "expired", "incomplete", "requires_action"]
+
+
+def is_run_event(event):
+    """True for events about the run itself; thread.run.step.* events carry run steps, whose statuses look alike."""
+    return event.event.startswith("thread.run.") and not event.event.startswith("thread.run.step.")
+
+
+class RunOutcome:
+    """
+    Where an assistant run ended up: the run in a final state and, for streamed runs, the text of the
+    last completed assistant message.
+
+    read() takes the events of a run stream one at a time, so OpenAIAgent and AsyncOpenAIAgent follow
+    a stream the same way and only differ in how they iterate it.
+    """
+
+    def __init__(self, metrics, emit_text=True):
+        self.metrics = metrics
+        self.emit_text = emit_text
+        self.run = None
+        self.message_text = None
+
+    def read(self, event):
+        """
+        Take in one event of a run stream.
+
+        Returns:
+            list: text_delta events to pass on to the caller
+        """
+        self.metrics.cancel_token.raise_if_cancelled()
+        deltas = []
+        if event.event == "thread.message.delta":
+            if self.emit_text:
+                for delta in event.data.delta.content or []:
+                    if delta.type == "text" and delta.text and delta.text.value:
+                        self.metrics.first_token()
+                        deltas.append({"type": "text_delta", "text": delta.text.value})
+        elif event.event == "thread.message.completed":
+            for content in event.data.content:
+                if content.type == "text":
+                    self.message_text = content.text.value
+        elif is_run_event(event) and event.data.status in RUN_FINAL_STATES:
+            self.run = event.data
+            print(self.run.status)
+        elif event.event == "error":
+            raise Exception(f"Run stream error: {event.data}")
+        return deltas
+
+    def polled(self, run):
+        """Record the final state of a run that was polled instead of streamed, which delivers no text."""
+        self.run = run
+        self.message_text = None
+
+    def finish(self):
+        """Check the run reached a final state before its stream ended."""
+        if self.run is None:
+            raise Exception("Run stream ended before the run reached a final state")
+        return self.run
+
+
+class PendingMessages:
+    """
+    Messages to add to a thread before its next assistant run, e.g. the questions answered from templates.
+
+    Conversations that are abandoned never take their messages, so at most max_threads threads are kept,
+    least recently used first out, and messages older than ttl seconds are dropped.
+    """
+
+    def __init__(self, max_threads=10000, ttl=86400):
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_threads=int(os.getenv("QUERY_TEMPLATES_PENDING_MAX_THREADS", "10000")),
+            ttl=float(os.getenv("QUERY_TEMPLATES_PENDING_TTL", "86400")),
+        )
+
+    def add(self, thread_id, messages):
+        with self._lock:
+            _, pending = self._threads.pop(thread_id, (None, []))
+            self._threads[thread_id] = (time.monotonic(), pending + list(messages))
+            self._expire()
+
+    def take(self, thread_id):
+        """Remove and return the (role, content) messages of a thread, oldest first."""
+        if not thread_id:
+            return []
+        with self._lock:
+            self._expire()
+            _, pending = self._threads.pop(thread_id, (None, []))
+            return pending
+
+    def __len__(self):
+        return len(self._threads)
+
+    def _expire(self):
+        """Drop expired threads and the least recently used ones above max_threads; called with the lock held."""
+        oldest_allowed = time.monotonic() - self.ttl
+        while self._threads:
+            added_at, _ = next(iter(self._threads.values()))
+            if added_at >= oldest_allowed and len(self._threads) <= self.max_threads:
+                break
+            self._threads.popitem(last=False)
+
+
+def tool_error_output(function_name, error):
+    """Tool output telling the assistant a function call failed."""
+    output = f"Error executing {function_name}: {error}"
+    print(output)
+    return output
+
+
+def tool_timeout_output(function_name, timeout):
+    return tool_error_output(function_name, f"timed out after {timeout} seconds")
+
+
+class Turn:
+    """
+    The state of one chat turn, shared by OpenAIAgent and AsyncOpenAIAgent: the thread, the current
+    run, the queries and reports of the turn's tool calls, and the events and response built from them.
+    """
+
+    def __init__(self, metrics, thread_id=None):
+        self.metrics = metrics
+        self.thread_id = thread_id
+        self.run = None
+        self.executed_queries = []
+        self.generated_reports = []
+        self._queries_reported = 0
+        self._reports_reported = 0
+
+    @property
+    def openai_thread_id(self):
+        """The OpenAI thread to run on, None to start a new one."""
+        if self.thread_id and not self.thread_id.startswith(LOCAL_THREAD_PREFIX):
+            return self.thread_id
+        return None
+
+    @staticmethod
+    def start_messages(pending_messages, user_message):
+        """Messages to start the run with: template answers given since the last run, then the user message."""
+        messages = [{"role": role, "content": content} for role, content in pending_messages]
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def follow(self, run):
+        """Make run the turn's current run, whose thread the conversation continues on."""
+        self.run = run
+        self.thread_id = run.thread_id
+
+    def tool_call_events(self):
+        """tool_call events for the function calls the current run requires."""
+        self.metrics.cancel_token.raise_if_cancelled()
+        return [
+            {
+                "type": "tool_call",
+                "name": tool_call.function.name,
+                "arguments": json.loads(tool_call.function.arguments or "{}")
+            }
+            for tool_call in self.run.required_action.submit_tool_outputs.tool_calls
+        ]
+
+    def add_tool_outcomes(self, tool_calls, outcomes):
+        """
+        Merge the (output, executed_queries, generated_reports) outcomes of tool calls in call order,
+        so outputs, queries and reports line up with the tool calls.
+
+        Returns:
+            list: Tool outputs to submit
+        """
+        tool_outputs = []
+        for tool_call, (output, call_queries, call_reports) in zip(tool_calls, outcomes):
+            tool_outputs.append({
+                "tool_call_id": tool_call.id,
+                "output": output
+            })
+            self.executed_queries.extend(call_queries)
+            self.generated_reports.extend(call_reports)
+        return tool_outputs
+
+    def result_events(self):
+        """query_result and report events for the queries and reports added since the last call."""
+        events = [{"type": "query_result", "query": query_data["query"], "results": query_data["results"]}
+                  for query_data in self.executed_queries[self._queries_reported:]]
+        events += [{"type": "report", "report": report} for report in self.generated_reports[self._reports_reported:]]
+        self._queries_reported = len(self.executed_queries)
+        self._reports_reported = len(self.generated_reports)
+        return events
+
+    def check_completed(self):
+        if self.run.status != "completed":
+            raise Exception(f"Run {self.run.status}: {self.run.last_error}")
+
+    def response(self, message, status="success", answered_by="assistant", error=None):
+        """
+        The response of the turn. Every path returns the same keys, so callers can rely on them:
+        message, thread_id, executed_queries (each with query, params, results, total_rows and source),
+        generated_reports, metrics, answered_by ("assistant" or "template"), status ("success",
+        "cancelled" or "error") and error (None unless the status is "error").
+        """
+        self.metrics.finish()
+        return {
+            "message": message,
+            "thread_id": self.thread_id,
+            "executed_queries": self.executed_queries,
+            "generated_reports": self.generated_reports,
+            "metrics": self.metrics.to_dict(),
+            "answered_by": answered_by,
+            "status": status,
+            "error": error
+        }
+
+    def done(self, message, **response_options):
+        return {"type": "done", "response": self.response(message, **response_options)}
+
+    def cancelled(self):
+        print(f"Turn {self.metrics.cancel_token.turn_id} cancelled")
+        return self.done("The request was cancelled.", status="cancelled")
+
+    def failed(self, error):
+        print(f"Error in chat_with_knowledgegraph: {error}")
+        return self.done("I'm sorry, I encountered an error processing your request. Please try again.",
+                         status="error", error=str(error))
@@ -0,0 +1,251 @@
+"""
+Headless HTTP API for the chat agent, for other services and load-balanced deployments.
+
+Each worker process shares one AsyncOpenAIAgent and one AsyncNeo4jClient, and so one Neo4j
+connection pool, across all requests. Conversations run concurrently on the event loop and are
+kept apart by their thread_id.
+
+Every request needs one of the keys in API_KEYS, as "Authorization: Bearer <key>" or
+"X-API-Key: <key>"; without API_KEYS all requests are refused.
+
+    cd src && uvicorn api_server:app --host 127.0.0.1 --port 8000 --workers 4
+    cd src && python api_server.py --stub      # local stand-ins for OpenAI and Neo4j
+
+Endpoints:
+    GET  /health               Neo4j reachability and client metrics
+    POST /chat                 {"message", "thread_id"?} -> the chat_with_knowledgegraph response
+    POST /chat/stream          Same body, answered with Server-Sent Events, one per agent event
+                               (text_delta, tool_call, query_result, report, done); closing the
+                               connection cancels the turn
+    POST /query                {"query", "params"?, "max_rows"?} -> rows of a read-only Cypher query,
+                               only with API_QUERY_ENABLED=true
+    POST /reports              {"title"?, "question", "context"?, "cypher"?} -> report job (202); "cypher"
+                               needs API_QUERY_ENABLED=true and a read-only query; 503 while
+                               REPORT_QUEUE_MAX reports are waiting or compiling
+    GET  /reports/jobs/{id}    State of a report job, with download URLs once it is done
+    GET  /reports/{file_name}  Download a generated report (.pdf or .typ)
+"""
+
+import os
+import json
+import secrets
+import argparse
+from typing import Optional
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.security import APIKeyHeader, HTTPAuthorizationCredentials, HTTPBearer
+from pydantic import BaseModel, Field
+from agent.async_openai_agent import AsyncOpenAIAgent
+from database.async_neo4j_client import AsyncNeo4jClient
+from database.neo4j_client import Neo4jQueryError
+from database.result_cache import is_read_query
+
+REPORT_EXTENSIONS = (".pdf", ".typ")
+
+# Seconds a client is asked to wait before submitting a report again while the report queue is full
+REPORT_RETRY_AFTER_SECONDS = 10
+
+
+class ChatRequest(BaseModel):
+    message: str
+    thread_id: Optional[str] = None
+
+
+class QueryRequest(BaseModel):
+    query: str
+    params: dict = Field(default_factory=dict)
+    max_rows: Optional[int] = None
+
+
+class ReportRequest(BaseModel):
+    question: str
+    title: str = "Knowledgegraph Report"
+    context: str = ""
+    cypher: Optional[str] = None
+
+
+def json_response(payload, status_code=200):
+    """JSON response that also encodes Neo4j values such as dates, as strings."""
+    return Response(json.dumps(payload, default=str), status_code=status_code, media_type="application/json")
+
+
+def server_sent_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def with_download_urls(report):
+    """Add the download URLs of a report's files, which live in the server's reports directory."""
+    report = dict(report)
+    for key in ("pdf_file", "typst_file"):
+        if report.get(key):
+            report[key.replace("_file", "_url")] = f"/reports/{os.path.basename(report[key])}"
+    return report
+
+
+def check_api_query(query, query_enabled):
+    """Refuse Cypher sent by API callers unless API_QUERY_ENABLED is set and the query only reads."""
+    if not query_enabled:
+        raise HTTPException(status_code=403, detail="Running Cypher through the API is disabled")
+    if not is_read_query(query):
+        raise HTTPException(status_code=400, detail="Only read queries can be run through the API")
+
+
+def configured_api_keys():
+    return [key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip()]
+
+
+def create_app(agent_factory=AsyncOpenAIAgent, neo4j_client_factory=AsyncNeo4jClient, api_keys=None,
+               query_enabled=None):
+    """
+    Build the API application. The agent and Neo4j client are created on startup and shared by
+    all requests of the worker.
+
+    api_keys defaults to API_KEYS and query_enabled, which adds POST /query, to API_QUERY_ENABLED.
+    """
+    if api_keys is None:
+        api_keys = configured_api_keys()
+    if query_enabled is None:
+        query_enabled = os.getenv("API_QUERY_ENABLED", "false").lower() == "true"
+    if not api_keys:
+        print("API_KEYS is not set, all API requests will be refused")
+
+    bearer = HTTPBearer(auto_error=False)
+    api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+    async def require_api_key(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
+                              api_key: Optional[str] = Depends(api_key_header)):
+        key = credentials.credentials if credentials is not None else api_key
+        if not key or not any(secrets.compare_digest(key.encode(), valid.encode()) for valid in api_keys):
+            raise HTTPException(status_code=401, detail="Invalid or missing API key",
+                                headers={"WWW-Authenticate": "Bearer"})
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.agent = agent_factory()
+        app.state.neo4j_client = neo4j_client_factory()
+        yield
+        await app.state.agent.close()
+        await app.state.neo4j_client.close()
+
+    app = FastAPI(title="Knowledge Graph AI Assistant API", lifespan=lifespan,
+                  dependencies=[Depends(require_api_key)])
+
+    @app.get("/health")
+    async def health():
+        neo4j_client = app.state.neo4j_client
+        neo4j_health = await neo4j_client.health()
+        return json_response(
+            {"neo4j": neo4j_health, "metrics": neo4j_client.get_metrics()},
+            status_code=200 if neo4j_health["status"] == "ok" else 503
+        )
+
+    @app.post("/chat")
+    async def chat(request: ChatRequest):
+        response = await app.state.agent.chat_with_knowledgegraph(
+            request.message, app.state.neo4j_client, request.thread_id
+        )
+        response["generated_reports"] = [with_download_urls(report) for report in response.get("generated_reports", [])]
+        return json_response(response, status_code=500 if response["status"] == "error" else 200)
+
+    @app.post("/chat/stream")
+    async def chat_stream(request: ChatRequest):
+        async def events():
+            # A closed connection cancels this generator, and with it the turn and its queries
+            async for event in app.state.agent.stream_chat_with_knowledgegraph(
+                request.message, app.state.neo4j_client, request.thread_id
+            ):
+                if event["type"] == "report":
+                    event = {**event, "report": with_download_urls(event["report"])}
+                elif event["type"] == "done":
+                    reports = event["response"].get("generated_reports", [])
+                    event = {**event, "response": {
+                        **event["response"], "generated_reports": [with_download_urls(report) for report in reports]
+                    }}
+                yield server_sent_event(event)
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    if query_enabled:
+        @app.post("/query")
+        async def query(request: QueryRequest):
+            check_api_query(request.query, query_enabled)
+            try:
+                rows, total_rows = await app.state.neo4j_client.fetch_rows(
+                    request.query, request.params, max_rows=request.max_rows, raise_errors=True,
+                    query_class="generated"
+                )
+            except Neo4jQueryError as e:
+                return json_response({"error": str(e), "code": e.code}, status_code=400 if e.is_query_error else 502)
+            return json_response({"rows": rows, "total_rows": total_rows, "truncated": total_rows > len(rows)})
+
+    @app.post("/reports")
+    async def reports(request: ReportRequest):
+        if request.cypher:
+            check_api_query(request.cypher, query_enabled)
+        result = await app.state.agent.generate_report(
+            request.title, request.question, app.state.neo4j_client, request.context, request.cypher
+        )
+        if result["report"].get("queue_full"):
+            response = json_response(result, status_code=503)
+            response.headers["Retry-After"] = str(REPORT_RETRY_AFTER_SECONDS)
+            return response
+        if "error" in result["report"]:
+            return json_response(result, status_code=500)
+        result["report"] = with_download_urls(result["report"])
+        return json_response(result, status_code=202 if "job_id" in result["report"] else 200)
+
+    @app.get("/reports/jobs/{job_id}")
+    async def report_job(job_id: str):
+        job = app.state.agent.get_report_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Report job not found")
+        return json_response(with_download_urls(job))
+
+    @app.get("/reports/{file_name}")
+    async def download_report(file_name: str):
+        reports_dir = app.state.agent.report_generator.reports_dir
+        file_path = os.path.join(reports_dir, file_name)
+        if os.path.basename(file_name) != file_name or not file_name.endswith(REPORT_EXTENSIONS) \
+                or not os.path.isfile(file_path):
+            raise HTTPException(status_code=404, detail="Report not found")
+        media_type = "application/pdf" if file_name.endswith(".pdf") else "text/plain"
+        return FileResponse(file_path, media_type=media_type, filename=file_name)
+
+    return app
+
+
+app = create_app()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the Knowledge Graph AI Assistant HTTP API")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--stub", action="store_true",
+                        help="Answer with local stand-ins for OpenAI and Neo4j instead of the configured services")
+    parser.add_argument("--model-latency", type=float, default=0.5, help="Seconds per stub assistant run (default: 0.5)")
+    args = parser.parse_args()
+
+    if not args.stub:
+        uvicorn.run(app, host=args.host, port=args.port)
+        return
+
+    from utils.stub_backends import StubOpenAIServer, AsyncStubNeo4jClient
+
+    api_keys = configured_api_keys() or [secrets.token_urlsafe(16)]
+    with StubOpenAIServer(model_latency=args.model_latency) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = "stub"
+        print(f"Stub OpenAI at {server.base_url}, stub Neo4j returning the sample processes")
+        if not os.getenv("API_KEYS"):
+            print(f"API key for this run: {api_keys[0]}")
+        uvicorn.run(create_app(neo4j_client_factory=AsyncStubNeo4jClient, api_keys=api_keys),
+                    host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,41 @@ import streamlit as st
 from database.neo4j_client import Neo4jClient
 from agent.openai_agent import OpenAIAgent
 
+@st.cache_resource
+def get_neo4j_client():
+    """Neo4j client shared by all sessions, so the process has a single driver and connection pool."""
+    return Neo4jClient()
+
+@st.cache_resource
+def get_openai_agent():
+    """
+    Agent shared by all sessions, with its OpenAI client, assistant and report generator.
+    Conversations are kept apart by their thread_id in the session state.
+    """
+    return OpenAIAgent()
+
+@st.fragment(run_every="2s")
+def wait_for_report(openai_agent, job_id):
+    """Show that a report is being compiled, rerunning the app once its job is done."""
+    job = openai_agent.get_report_job(job_id)
+    if job is None or job["status"] not in ("queued", "running"):
+        st.rerun()
+    st.info("⏳ Compiling report...")
+
+def refresh_report(report, openai_agent):
+    """Merge the current state of a background report job into the report data of a message."""
+    if report.get("status") in ("queued", "running"):
+        job = openai_agent.get_report_job(report["job_id"])
+        if job is None:
+            report.update(status="failed", error="The report job is no longer available")
+        else:
+            report.update(job)
+    return report
+
 def initialize_session_state():
+    """Per-session state is only the conversation: its messages and OpenAI thread."""
     if "messages" not in st.session_state:
         st.session_state.messages = []
-    if "neo4j_client" not in st.session_state:
-        st.session_state.neo4j_client = Neo4jClient()
-    if "openai_agent" not in st.session_state:
-        st.session_state.openai_agent = OpenAIAgent()
     if "thread_id" not in st.session_state:
         st.session_state.thread_id = None
 
@@ -21,14 +49,26 @@ def main():
     # Initialize session state and verify connections
     try:
         initialize_session_state()
+        neo4j_client = get_neo4j_client()
+        openai_agent = get_openai_agent()
         # Test Neo4j connection
-        st.session_state.neo4j_client.execute_query("RETURN 1 as test")
+        health = neo4j_client.health()
+        if health["status"] != "ok":
+            raise Exception(health["error"])
         st.success("Connected to OpenAI Assistant and Neo4j knowledgegraph")
     except Exception as e:
         st.error(f"Error connecting to services: {str(e)}")
         st.info("Please check your API keys and knowledgegraph credentials in the .env file")
         return
     
+    # Show where Neo4j time goes: pool usage, connection acquisition waits and query times
+    with st.sidebar.expander("Neo4j connection"):
+        st.json(neo4j_client.get_metrics())
+    
+    # Show how often repairing failing generated Cypher works, by attempt
+    with st.sidebar.expander("Cypher repairs"):
+        st.json(openai_agent.get_repair_stats())
+    
     # Display chat messages
     for i, message in enumerate(st.session_state.messages):
         with st.chat_message(message["role"]):
@@ -36,6 +76,16 @@ def main():
             
             # Show executed queries and reports for assistant messages
             if message["role"] == "assistant":
+                # Show turn latency and API usage if available
+                metrics = message.get("metrics")
+                if metrics:
+                    first_token = metrics.get("time_to_first_token_seconds")
+                    first_token_text = f" · first token {first_token:.1f}s" if first_token is not None else ""
+                    tokens_saved = metrics.get("tool_output_tokens_saved")
+                    estimated = "~" if metrics.get("tool_output_tokens_estimated") else ""
+                    tokens_saved_text = f" · {estimated}{tokens_saved} result tokens saved" if tokens_saved else ""
+                    st.caption(f"{metrics['latency_seconds']:.1f}s{first_token_text} · {metrics['api_calls']} API calls · {metrics['mode']}{tokens_saved_text}")
+                
                 # Show executed queries if any
                 executed_queries = message.get("executed_queries", [])
                 if executed_queries:
@@ -43,7 +93,12 @@ def main():
                         for j, query_data in enumerate(executed_queries):
                             st.write(f"**Query {j+1}:**")
                             st.code(query_data["query"], language="cypher")
+                            if query_data.get("params"):
+                                st.caption(f"Parameters: {query_data['params']}")
                             st.write("**Results:**")
+                            total_rows = query_data.get("total_rows")
+                            if total_rows and total_rows > len(query_data["results"]):
+                                st.caption(f"Showing the first {len(query_data['results'])} of {total_rows} records")
                             st.json(query_data["results"])
                             if j < len(executed_queries) - 1:
                                 st.divider()
@@ -53,9 +108,14 @@ def main():
                 if generated_reports:
                     with st.expander(f"Generated Reports ({len(generated_reports)})"):
                         for j, report in enumerate(generated_reports):
+                            report = refresh_report(report, openai_agent)
                             st.write(f"**Report {j+1}: {report.get('title', 'Untitled Report')}**")
                             st.write(f"Records analyzed: {report.get('records_count', 0)}")
                             
+                            # Reports compile in the background; show their downloads once they are ready
+                            if report.get("status") in ("queued", "running"):
+                                wait_for_report(openai_agent, report["job_id"])
+                            
                             col1, col2 = st.columns(2)
                             
                             # Download Typst file
@@ -101,34 +161,54 @@ def main():
         with st.chat_message("user"):
             st.write(prompt)
         
-        # Generate response using unified chat method
-        with st.spinner("Processing your request..."):
-            # Use the new chat method that handles both conversation and knowledgegraph queries
-            response_data = st.session_state.openai_agent.chat_with_knowledgegraph(
-                user_message=prompt,
-                neo4j_client=st.session_state.neo4j_client,
-                thread_id=st.session_state.thread_id
-            )
-            
-            # Update thread ID for conversation continuity
-            st.session_state.thread_id = response_data.get("thread_id")
+        # Stream the response as it is generated
+        with st.chat_message("assistant"):
+            status = st.status("Processing your request...", expanded=False)
+            response_data = {}
             
-            # Get the assistant's response and metadata
-            assistant_response = response_data.get("message", "I'm sorry, I couldn't process your request.")
-            executed_queries = response_data.get("executed_queries", [])
-            generated_reports = response_data.get("generated_reports", [])
+            def response_stream():
+                # Use the streaming chat method that handles both conversation and knowledgegraph queries
+                for event in openai_agent.stream_chat_with_knowledgegraph(
+                    user_message=prompt,
+                    neo4j_client=neo4j_client,
+                    thread_id=st.session_state.thread_id
+                ):
+                    if event["type"] == "text_delta":
+                        yield event["text"]
+                    elif event["type"] == "tool_call":
+                        status.update(label=f"Running {event['name']}...")
+                        status.write(f"Calling `{event['name']}`: {event['arguments'].get('user_question', '')}")
+                    elif event["type"] == "query_result":
+                        status.write(f"Query returned {len(event['results'])} records")
+                        status.code(event["query"], language="cypher")
+                    elif event["type"] == "report":
+                        status.write(f"Report generated: {event['report'].get('title', 'Untitled Report')}")
+                    elif event["type"] == "done":
+                        response_data.update(event["response"])
             
-            # Add assistant response to chat history with metadata
-            message_data = {
-                "role": "assistant", 
-                "content": assistant_response,
-                "executed_queries": executed_queries,
-                "generated_reports": generated_reports
-            }
-            st.session_state.messages.append(message_data)
-            
-            if response_data.get("status") == "error":
-                st.session_state.last_error = response_data.get("error", "Unknown error occurred")
+            st.write_stream(response_stream())
+            status.update(label="Done", state="complete")
+        
+        # Update thread ID for conversation continuity
+        st.session_state.thread_id = response_data.get("thread_id")
+        
+        # Get the assistant's response and metadata
+        assistant_response = response_data.get("message", "I'm sorry, I couldn't process your request.")
+        executed_queries = response_data.get("executed_queries", [])
+        generated_reports = response_data.get("generated_reports", [])
+        
+        # Add assistant response to chat history with metadata
+        message_data = {
+            "role": "assistant", 
+            "content": assistant_response,
+            "executed_queries": executed_queries,
+            "generated_reports": generated_reports,
+            "metrics": response_data.get("metrics")
+        }
+        st.session_state.messages.append(message_data)
+        
+        if response_data.get("status") == "error":
+            st.session_state.last_error = response_data.get("error", "Unknown error occurred")
         
         # Rerun to refresh the display with new messages
         st.rerun()
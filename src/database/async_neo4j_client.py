@@ -0,0 +1,330 @@
+import os
+import time
+import asyncio
+from neo4j import AsyncGraphDatabase, Query, READ_ACCESS, WRITE_ACCESS, unit_of_work
+from dotenv import load_dotenv
+from .neo4j_client import GRAPH_GENERATION_QUERY, GRAPH_META_QUERY, DEFAULT_MAX_POOL_SIZE, AUTO_COMMIT_STATEMENTS, Neo4jQueryError, driver_config, explain_summary
+from .result_cache import QueryResultCache, is_read_query
+from .client_metrics import ClientMetrics, pool_usage
+from .query_control import APP_TRANSACTIONS_QUERY, TERMINATE_TRANSACTIONS_QUERY, Cancelled, TransactionControl, is_timeout
+
+class AsyncNeo4jClient:
+    """asyncio counterpart of Neo4jClient built on the async neo4j driver."""
+    
+    def __init__(self, cache_results=None, database=None):
+        load_dotenv()
+        
+        self.uri = os.getenv("NEO4J_URI")
+        self.username = os.getenv("NEO4J_USERNAME")
+        self.password = os.getenv("NEO4J_PASSWORD")
+        
+        config = driver_config()
+        self.driver = AsyncGraphDatabase.driver(
+            self.uri, 
+            auth=(self.username, self.password),
+            **config
+        )
+        self.max_pool_size = config.get("max_connection_pool_size", DEFAULT_MAX_POOL_SIZE)
+        self.bookmark_manager = AsyncGraphDatabase.bookmark_manager()
+        self.metrics = ClientMetrics()
+        self.max_result_rows = int(os.getenv("NEO4J_MAX_RESULT_ROWS", "0"))
+        
+        # Optional result cache, invalidated whenever the graph generation changes
+        if cache_results is None:
+            cache_results = os.getenv("NEO4J_RESULT_CACHE", "false").lower() == "true"
+        self.result_cache = None
+        if cache_results:
+            max_mb = float(os.getenv("NEO4J_RESULT_CACHE_MAX_MB", "32"))
+            self.result_cache = QueryResultCache(max_bytes=int(max_mb * 1024 * 1024))
+        self.generation_check_interval = float(os.getenv("NEO4J_GENERATION_CHECK_SECONDS", "30"))
+        self._last_generation_check = 0.0
+        
+        # Reads follow the active database of blue/green imports, resolved on the first query
+        self.meta_database = os.getenv("NEO4J_DATABASE") or None
+        self.database = database or self.meta_database
+        self.follow_active_database = database is None and bool(os.getenv("NEO4J_BLUE_GREEN_DATABASES"))
+        
+        # Transaction timeouts per query class, turn cancellation and the kill switch, started with the first query
+        self.transaction_control = TransactionControl(self.metrics)
+        self._kill_switch_task = None
+    
+    async def execute_query(self, query, params=None, raise_errors=False, query_class=None, cancel_token=None):
+        """
+        Execute a Cypher query against the Neo4j database
+        
+        Args:
+            query (str): The Cypher query to execute
+            params (dict, optional): Parameters for the query
+            raise_errors (bool): Raise Neo4jQueryError on errors instead of returning an empty list
+            query_class (str, optional): Query class picking the transaction timeout, see Neo4jClient.execute_query
+            cancel_token (CancelToken, optional): Token of the chat turn the query belongs to
+        
+        Returns:
+            list: Query results
+        """
+        if params is None:
+            params = {}
+        
+        cacheable = self.result_cache is not None and is_read_query(query)
+        if cacheable or self.follow_active_database:
+            await self._check_graph_generation()
+        if cacheable:
+            cached = self.result_cache.get(query, params)
+            if cached is not None:
+                return cached
+        
+        try:
+            results = await self._run_query(query, params, self.database, query_class, cancel_token)
+        except Cancelled:
+            raise
+        except Exception as e:
+            print(f"Error executing Neo4j query: {e}")
+            if raise_errors:
+                raise Neo4jQueryError.from_error(e, query) from e
+            return []
+        
+        if cacheable:
+            self.result_cache.put(query, params, results)
+        elif self.result_cache is not None:
+            # Our own writes make every cached result suspect
+            self.result_cache.clear()
+        return results
+    
+    def session(self, database=None, **config):
+        """Open a session sharing this client's bookmarks."""
+        return self.driver.session(database=database, bookmark_manager=self.bookmark_manager, **config)
+    
+    async def stream_query(self, query, params=None, query_class=None, cancel_token=None):
+        """Async generator streaming the records of a read query, see Neo4jClient.stream_query."""
+        if self.follow_active_database:
+            await self._check_graph_generation()
+        self._start_kill_switch()
+        timeout, metadata = self.transaction_control.config(query, query_class, cancel_token)
+        self.transaction_control.begin(cancel_token)
+        self.metrics.begin(True)
+        started = time.perf_counter()
+        error = False
+        try:
+            async with self.session(self.database, default_access_mode=READ_ACCESS) as session:
+                async with await session.begin_transaction(metadata=metadata, timeout=timeout) as tx:
+                    self.metrics.acquired(time.perf_counter() - started)
+                    result = await tx.run(query, params or {})
+                    async for record in result:
+                        self.transaction_control.check(cancel_token)
+                        yield record.data()
+        except Exception as e:
+            error = True
+            if is_timeout(e):
+                self.metrics.interrupted("timeout")
+            raise
+        finally:
+            self.metrics.end(time.perf_counter() - started, error=error)
+            self.transaction_control.end(cancel_token)
+    
+    async def fetch_rows(self, query, params=None, max_rows=None, raise_errors=False, query_class=None, cancel_token=None):
+        """Execute a query keeping at most max_rows records, see Neo4jClient.fetch_rows."""
+        if max_rows is None:
+            max_rows = self.max_result_rows
+        if not max_rows or not is_read_query(query):
+            rows = await self.execute_query(query, params, raise_errors, query_class, cancel_token)
+            return rows, len(rows)
+        
+        if params is None:
+            params = {}
+        if self.result_cache is not None:
+            await self._check_graph_generation()
+            cached = self.result_cache.get(query, params)
+            if cached is not None:
+                return cached[:max_rows], len(cached)
+        
+        rows = []
+        total_rows = 0
+        try:
+            async for record in self.stream_query(query, params, query_class, cancel_token):
+                total_rows += 1
+                if total_rows <= max_rows:
+                    rows.append(record)
+        except Cancelled:
+            raise
+        except Exception as e:
+            print(f"Error executing Neo4j query: {e}")
+            if raise_errors:
+                raise Neo4jQueryError.from_error(e, query) from e
+            return [], 0
+        
+        if self.result_cache is not None and total_rows <= max_rows:
+            self.result_cache.put(query, params, rows)
+        return rows, total_rows
+    
+    async def explain(self, query, params=None):
+        """Plan a query without running it, see Neo4jClient.explain."""
+        if self.follow_active_database:
+            await self._check_graph_generation()
+        access_mode = READ_ACCESS if is_read_query(query) else WRITE_ACCESS
+        timeout, metadata = self.transaction_control.config(query, "internal")
+        async with self.session(self.database, default_access_mode=access_mode) as session:
+            result = await session.run(Query(f"EXPLAIN {query}", metadata, timeout), params or {})
+            return explain_summary(await result.consume())
+    
+    async def _run_query(self, query, params, database=None, query_class=None, cancel_token=None):
+        """Run a query in a read or write managed transaction, like Neo4jClient._run_query."""
+        self._start_kill_switch()
+        timeout, metadata = self.transaction_control.config(query, query_class, cancel_token)
+        self.transaction_control.begin(cancel_token)
+        read = is_read_query(query)
+        self.metrics.begin(read)
+        started = time.perf_counter()
+        attempts = 0
+        
+        @unit_of_work(metadata=metadata, timeout=timeout)
+        async def work(tx):
+            nonlocal attempts
+            if attempts == 0:
+                self.metrics.acquired(time.perf_counter() - started)
+            attempts += 1
+            result = await tx.run(query, params)
+            return [record.data() async for record in result]
+        
+        try:
+            async with self.session(database) as session:
+                if AUTO_COMMIT_STATEMENTS.search(query):
+                    attempts = 1
+                    result = await session.run(Query(query, metadata, timeout), params)
+                    records = [record.data() async for record in result]
+                elif read:
+                    records = await session.execute_read(work)
+                else:
+                    records = await session.execute_write(work)
+        except Exception as e:
+            if is_timeout(e):
+                self.metrics.interrupted("timeout")
+            self.metrics.end(time.perf_counter() - started, attempts, error=True)
+            raise
+        finally:
+            self.transaction_control.end(cancel_token)
+        self.metrics.end(time.perf_counter() - started, attempts)
+        return records
+    
+    async def terminate_transactions(self, older_than=0, turn_id=None, excluded_classes=()):
+        """Terminate running transactions of this app, see Neo4jClient.terminate_transactions."""
+        params = self.transaction_control.terminate_params(older_than, turn_id, excluded_classes)
+        async with self.session(self.meta_database) as session:
+            result = await session.run(APP_TRANSACTIONS_QUERY, params)
+            ids = [record["transactionId"] async for record in result]
+            if ids:
+                result = await session.run(TERMINATE_TRANSACTIONS_QUERY, {"ids": ids})
+                await result.consume()
+        return len(ids)
+    
+    async def cancel(self, cancel_token):
+        """Cancel a chat turn and terminate its running transactions, see Neo4jClient.cancel."""
+        cancel_token.cancel()
+        if not self.transaction_control.running(cancel_token.turn_id):
+            return 0
+        try:
+            terminated = await self.terminate_transactions(turn_id=cancel_token.turn_id)
+        except Exception as e:
+            print(f"Could not terminate transactions of turn {cancel_token.turn_id}: {e}")
+            return 0
+        self.metrics.interrupted("cancel", terminated)
+        return terminated
+    
+    def _start_kill_switch(self):
+        """Start the kill switch task on the running event loop, if enabled and not started yet."""
+        if self.transaction_control.kill_after > 0 and self._kill_switch_task is None:
+            self._kill_switch_task = asyncio.get_running_loop().create_task(self._run_kill_switch())
+    
+    async def _run_kill_switch(self):
+        """Periodically terminate transactions (except writes) running longer than kill_after, see Neo4jClient."""
+        kill_after = self.transaction_control.kill_after
+        while True:
+            await asyncio.sleep(self.transaction_control.kill_check_interval)
+            try:
+                killed = await self.terminate_transactions(older_than=kill_after, excluded_classes=["write"])
+            except Exception as e:
+                print(f"Kill switch could not check transactions: {e}")
+                continue
+            if killed:
+                print(f"Kill switch terminated {killed} transactions running longer than {kill_after}s")
+                self.metrics.interrupted("kill_switch", killed)
+    
+    async def health(self):
+        """Check that the database is reachable, see Neo4jClient.health."""
+        started = time.perf_counter()
+        try:
+            server_info = await self.driver.get_server_info()
+            return {
+                "status": "ok",
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+                "server": server_info.agent,
+                "database": self.database,
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+                "database": self.database,
+                "error": str(e),
+            }
+    
+    def get_metrics(self):
+        """Query counters and timings, connection pool usage and result cache statistics, see Neo4jClient.get_metrics."""
+        metrics = self.metrics.to_dict()
+        metrics["pool"] = pool_usage(metrics, self.max_pool_size)
+        metrics["result_cache"] = self.result_cache.stats() if self.result_cache is not None else None
+        return metrics
+    
+    async def get_graph_meta(self):
+        """
+        Read the marker node maintained by CSVImporter.
+        
+        Returns:
+            dict: generation, active_database and previous_database, all None if the graph was never imported
+        """
+        records = await self._run_query(GRAPH_META_QUERY, {}, self.meta_database)
+        return records[0] if records else {"generation": None, "active_database": None, "previous_database": None}
+    
+    async def get_graph_generation(self):
+        """
+        Read the graph generation from the marker node maintained by CSVImporter.
+        
+        Returns:
+            int or None: The current generation, None if the graph was never imported
+        """
+        records = await self._run_query(GRAPH_GENERATION_QUERY, {}, self.meta_database)
+        return records[0]["generation"] if records else None
+    
+    async def _check_graph_generation(self):
+        """Invalidate the result cache and switch the read database if an import happened since the last check."""
+        now = time.monotonic()
+        if now - self._last_generation_check < self.generation_check_interval:
+            return
+        self._last_generation_check = now
+        try:
+            meta = await self.get_graph_meta()
+        except Exception as e:
+            print(f"Could not read graph generation, clearing result cache: {e}")
+            if self.result_cache is not None:
+                self.result_cache.clear()
+            return
+        
+        if self.follow_active_database and meta["active_database"] and meta["active_database"] != self.database:
+            print(f"Reading from database {meta['active_database']} (generation {meta['generation']})")
+            self.database = meta["active_database"]
+            if self.result_cache is not None:
+                self.result_cache.clear()
+        if self.result_cache is not None:
+            self.result_cache.set_generation(meta["generation"])
+    
+    def invalidate_cache(self):
+        """Drop all cached results, e.g. right after an import in the same process."""
+        if self.result_cache is not None:
+            self.result_cache.clear()
+            self._last_generation_check = 0.0
+    
+    async def close(self):
+        """Close the Neo4j driver connection"""
+        if self._kill_switch_task is not None:
+            self._kill_switch_task.cancel()
+        if self.driver is not None:
+            await self.driver.close()
@@ -0,0 +1,99 @@
+import threading
+from collections import deque
+
+
+def _timing_summary(samples):
+    """Average, p95 and max of a list of durations in seconds, reported in milliseconds."""
+    if not samples:
+        return {"avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(samples)
+    return {
+        "avg_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p95_ms": round(ordered[max(0, int(len(ordered) * 0.95) - 1)] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+class ClientMetrics:
+    """
+    Counters and recent timings of a Neo4j client, to see where time goes under concurrent sessions.
+
+    Acquisition wait is the time from opening a session until the transaction function starts running,
+    i.e. until the driver handed out a pooled connection and began the transaction. Timings are kept for
+    the last `window` queries.
+    """
+
+    def __init__(self, window=1000):
+        self.queries = 0
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+        self.retries = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        # Queries stopped by their transaction timeout, by cancelling their turn, and by the kill switch
+        self.interruptions = {"timeout": 0, "cancel": 0, "kill_switch": 0}
+        self._acquisition_waits = deque(maxlen=window)
+        self._durations = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def begin(self, read):
+        with self._lock:
+            self.queries += 1
+            if read:
+                self.reads += 1
+            else:
+                self.writes += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def acquired(self, seconds):
+        with self._lock:
+            self._acquisition_waits.append(seconds)
+
+    def end(self, seconds, attempts=1, error=False):
+        with self._lock:
+            self.in_flight -= 1
+            self.retries += max(0, attempts - 1)
+            if error:
+                self.errors += 1
+            self._durations.append(seconds)
+
+    def interrupted(self, kind, count=1):
+        with self._lock:
+            self.interruptions[kind] += count
+
+    def to_dict(self):
+        with self._lock:
+            acquisition_waits = list(self._acquisition_waits)
+            durations = list(self._durations)
+            counters = {
+                "queries": self.queries,
+                "reads": self.reads,
+                "writes": self.writes,
+                "errors": self.errors,
+                "retries": self.retries,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "interruptions": dict(self.interruptions),
+            }
+        counters["acquisition_wait"] = _timing_summary(acquisition_waits)
+        counters["query_time"] = _timing_summary(durations)
+        return counters
+
+
+def pool_usage(counters, max_size):
+    """
+    Connection pool usage estimated from the query counters of ClientMetrics.to_dict(): every query in
+    flight holds or waits for one connection, so up to max_size of them are in use and the rest wait.
+
+    The driver has no public pool API, and its private pool structures change between versions, so the
+    connections of health checks and the kill switch, and idle ones, are not counted.
+    """
+    in_flight = counters["in_flight"]
+    return {
+        "in_use": min(in_flight, max_size),
+        "waiting": max(0, in_flight - max_size),
+        "peak_in_use": min(counters["peak_in_flight"], max_size),
+        "max_size": max_size,
+    }
@@ -1,35 +1,86 @@
 import os
-from .neo4j_client import Neo4jClient
+import csv
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from .json_files import remove_stale_temp_files, write_json_atomic
+from .neo4j_client import Neo4jClient, GRAPH_META_LABEL
+
+# Files in data/ with the nodes and relationships they hold, CSV columns mapped to properties
+CSV_NODES = [
+    ("department", "department.csv", {"name": "Name", "description": "Description"}),
+    ("process", "process.csv", {"name": "Name", "description": "Description"}),
+    ("system", "system.csv", {"category": "Category", "name": "Name", "description": "Description"}),
+    ("role", "role.csv", {"name": "Name", "description": "Description"}),
+    ("step", "process_step.csv", {"name": "Step", "description": "Description"}),
+]
+CSV_RELATIONSHIPS = [
+    ("is_owner_of", "process_department.csv", ("department", "Department"), ("process", "Process")),
+    ("has_step", "process_step.csv", ("process", "Process"), ("step", "Step")),
+    ("performs", "role_step.csv", ("role", "Role"), ("step", "Step")),
+    ("supports", "step_system.csv", ("system", "System"), ("step", "Step")),
+]
+
+
+
+def row_hash(row):
+    """Stable hash of a row's properties, to spot changed rows between imports"""
+    return hashlib.sha1(json.dumps(row, sort_keys=True).encode("utf-8")).hexdigest()
+
 
 class CSVImporter:
-    def __init__(self, github_repo="transentis/knowledgegraph-ai-assistant", branch="main"):
+    def __init__(self, github_repo="transentis/knowledgegraph-ai-assistant", branch="main", local=False, batch_size=1000, workers=4, incremental=False):
         self.client = Neo4jClient()
+        # The client writing the marker node; self.client points at the staging database during blue/green imports
+        self.meta_client = self.client
         self.github_repo = github_repo
         self.branch = branch
         self.base_url = f"https://raw.githubusercontent.com/{github_repo}/{branch}/data"
         self.data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
+        
+        # Local mode streams data/*.csv in UNWIND batches instead of LOAD CSV from GitHub
+        self.local = local
+        self.batch_size = batch_size
+        self.workers = workers
+        
+        # Incremental mode applies only the rows that changed since the import recorded in the state file
+        self.incremental = incremental
+        self.state_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.cache', 'import_state.json')
+        
+        # Full imports go to the inactive database of this pair and readers get switched over afterwards
+        databases = [name.strip() for name in os.getenv("NEO4J_BLUE_GREEN_DATABASES", "").split(",") if name.strip()]
+        if databases and len(databases) != 2:
+            raise ValueError("NEO4J_BLUE_GREEN_DATABASES must name exactly two databases")
+        self.blue_green_databases = databases
     
     def import_all_data(self):
         """Import all CSV data into Neo4j database"""
         try:
-            # Clear existing data
-            self.clear_database()
-            
-            # Create constraints
-            self.create_constraints()
-            
-            # Import entities
-            self.import_departments()
-            self.import_processes()
-            self.import_systems()
-            self.import_roles()
-            self.import_steps()
+            if self.incremental:
+                # Keep the graph online, only write what changed
+                self.create_constraints()
+                self.import_incremental()
+                generation = self.bump_graph_generation()
+            elif self.blue_green_databases and self.supports_blue_green():
+                generation = self.import_blue_green()
+            else:
+                # Clear existing data
+                self.clear_database()
+                
+                # Create constraints
+                self.create_constraints()
+                
+                self.import_data_files()
+                
+                # Signal readers that cached results are stale
+                generation = self.bump_graph_generation()
             
-            # Import relationships
-            self.import_process_department_relationships()
-            self.import_process_step_relationships()
-            self.import_role_step_relationships()
-            self.import_step_system_relationships()
+            # Remember what was imported for the next incremental run; GitHub files may differ from the local ones
+            if self.local or self.incremental:
+                self._save_state(self._hash_local_files(), generation)
+            elif os.path.exists(self.state_file):
+                os.remove(self.state_file)
             
             print("Data import completed successfully!")
             
@@ -37,10 +88,162 @@ class CSVImporter:
             print(f"Error during import: {e}")
             raise
     
+    def import_data_files(self):
+        """Import nodes and relationships from the local files, or with LOAD CSV from GitHub"""
+        if self.local:
+            self.import_local_data()
+            return
+        
+        # Import entities
+        self.import_departments()
+        self.import_processes()
+        self.import_systems()
+        self.import_roles()
+        self.import_steps()
+        
+        # Import relationships
+        self.import_process_department_relationships()
+        self.import_process_step_relationships()
+        self.import_role_step_relationships()
+        self.import_step_system_relationships()
+    
+    def supports_blue_green(self):
+        """
+        Check the server can run blue/green imports, which need CREATE OR REPLACE DATABASE (Enterprise Edition).
+        
+        Returns:
+            bool: False if the server is not Enterprise Edition, so the import goes to the default database instead
+        Raises:
+            ValueError: If the database holding the marker node is one of the blue/green pair
+        """
+        with self.meta_client.session("system") as session:
+            edition = session.run("CALL dbms.components() YIELD edition RETURN edition").single()["edition"]
+            meta_database = self.meta_client.meta_database or \
+                session.run("SHOW DEFAULT DATABASE YIELD name RETURN name").single()["name"]
+        
+        if meta_database in self.blue_green_databases:
+            raise ValueError(
+                f"The marker node database {meta_database} (NEO4J_DATABASE) must not be one of "
+                f"NEO4J_BLUE_GREEN_DATABASES, it would be recreated by the import"
+            )
+        if edition != "enterprise":
+            print(f"⚠️  Blue/green imports need Neo4j Enterprise Edition, this server is {edition}; "
+                  f"importing into the default database instead")
+            return False
+        return True
+    
+    def import_blue_green(self):
+        """
+        Import into the inactive database of the blue/green pair while the active one keeps serving reads,
+        validate the counts, then switch readers over in a single write to the marker node.
+        
+        Returns:
+            int: The new graph generation
+        """
+        active = self.meta_client.get_graph_meta()["active_database"]
+        blue, green = self.blue_green_databases
+        target = green if active == blue else blue
+        print(f"ℹ️  Importing into {target}, {active or 'the default database'} keeps serving reads")
+        
+        try:
+            with self.meta_client.session("system") as session:
+                session.run(f"CREATE OR REPLACE DATABASE `{target}` WAIT").consume()
+            print(f"✅ Database {target} recreated")
+        except Exception as e:
+            print(f"❌ Failed to recreate database {target}: {e}")
+            raise
+        
+        self.client = Neo4jClient(database=target)
+        try:
+            self.create_constraints()
+            self.import_data_files()
+            self.validate_import()
+        finally:
+            self.client.close()
+            self.client = self.meta_client
+        
+        return self.switch_active_database(target)
+    
+    def validate_import(self):
+        """Check every label and relationship type before readers get switched over; local files give exact counts"""
+        expected = None
+        if self.local:
+            expected = self._expected_counts(self._hash_local_files())
+        
+        checks = [(f"{label}:{file_name}", f"MATCH (n:{label}) RETURN count(n) AS count")
+                  for label, file_name, _ in CSV_NODES]
+        checks += [(f"{rel_type}:{file_name}",
+                    f"MATCH (a:{from_label})-[:{rel_type}]->(b:{to_label}) RETURN count(DISTINCT [a.name, b.name]) AS count")
+                   for rel_type, file_name, (from_label, _), (to_label, _) in CSV_RELATIONSHIPS]
+        
+        problems = []
+        for spec_id, query in checks:
+            rows = self.client.execute_query(query)
+            count = rows[0]["count"] if rows else 0
+            if expected is None and count == 0:
+                problems.append(f"{spec_id} is empty")
+            elif expected is not None and count != expected[spec_id]:
+                problems.append(f"{spec_id} has {count} rows, expected {expected[spec_id]}")
+        
+        if problems:
+            raise Exception(f"Import validation failed, readers stay on the current database: {'; '.join(problems)}")
+        print("✅ Import validated")
+    
+    def _expected_counts(self, files):
+        """
+        Elements an import of the local files creates: every node, and the relationships whose two nodes exist.
+        Relationship rows naming a node that is in no node file are never created and get reported.
+        """
+        names = {label: set(files[f"{label}:{file_name}"]) for label, file_name, _ in CSV_NODES}
+        expected = {f"{label}:{file_name}": len(names[label]) for label, file_name, _ in CSV_NODES}
+        for rel_type, file_name, (from_label, _), (to_label, _) in CSV_RELATIONSHIPS:
+            spec_id = f"{rel_type}:{file_name}"
+            dangling = [row for _, row in files[spec_id].values()
+                        if row["from"] not in names[from_label] or row["to"] not in names[to_label]]
+            for row in dangling:
+                print(f"⚠️  {spec_id}: {row['from']} -> {row['to']} names a node that does not exist, skipped")
+            expected[spec_id] = len(files[spec_id]) - len(dangling)
+        return expected
+    
+    def switch_active_database(self, database):
+        """Point readers at a database, keeping the current one as the rollback target"""
+        query = f"""
+        MERGE (m:{GRAPH_META_LABEL} {{key: 'graph'}})
+        WITH m, m.active_database AS previous
+        SET m.active_database = $database,
+            m.previous_database = previous,
+            m.generation = coalesce(m.generation, 0) + 1,
+            m.imported_at = datetime()
+        RETURN m.generation AS generation
+        """
+        try:
+            generation = self.meta_client.update_graph_meta(query, {"database": database})[0]["generation"]
+            print(f"✅ Readers switched to {database} (generation {generation})")
+            return generation
+        except Exception as e:
+            print(f"❌ Failed to switch readers to {database}: {e}")
+            raise
+    
+    def rollback(self):
+        """Switch readers back to the database of the previous blue/green import"""
+        query = f"""
+        MATCH (m:{GRAPH_META_LABEL} {{key: 'graph'}})
+        WHERE m.previous_database IS NOT NULL
+        WITH m, m.active_database AS active, m.previous_database AS previous
+        SET m.active_database = previous,
+            m.previous_database = active,
+            m.generation = m.generation + 1
+        RETURN m.active_database AS active_database, m.generation AS generation
+        """
+        result = self.meta_client.update_graph_meta(query)
+        if not result:
+            raise Exception("No previous database to roll back to")
+        print(f"✅ Readers rolled back to {result[0]['active_database']} (generation {result[0]['generation']})")
+    
     def clear_database(self):
         """Clear all nodes, relationships, and constraints"""
-        # Clear all nodes and relationships
-        query = "MATCH (n) DETACH DELETE n"
+        # Clear all nodes and relationships, keeping the graph generation marker
+        query = f"MATCH (n) WHERE NOT n:{GRAPH_META_LABEL} DETACH DELETE n"
         try:
             self.client.execute_query(query)
             print("✅ Database data cleared successfully")
@@ -70,6 +273,23 @@ class CSVImporter:
             print(f"❌ Failed to clear constraints: {e}")
             raise
     
+    def bump_graph_generation(self):
+        """Increment the generation on the graph marker node so result caches get invalidated"""
+        query = f"""
+        MERGE (m:{GRAPH_META_LABEL} {{key: 'graph'}})
+        SET m.generation = coalesce(m.generation, 0) + 1,
+            m.imported_at = datetime()
+        RETURN m.generation AS generation
+        """
+        try:
+            result = self.meta_client.update_graph_meta(query)
+            generation = result[0]["generation"] if result else None
+            print(f"✅ Graph generation bumped to {generation}")
+            return generation
+        except Exception as e:
+            print(f"❌ Failed to bump graph generation: {e}")
+            raise
+    
     def create_constraints(self):
         """Create NODE KEY constraints for entity IDs (provides uniqueness + Bloom optimization)"""
         # Key constraints for Neo4j Bloom (makes name field primary in display and provides uniqueness)
@@ -246,6 +466,190 @@ class CSVImporter:
             print(f"❌ Failed to import Step-System relationships: {e}")
             raise
     
+    def import_local_data(self):
+        """Import nodes and relationships from the local data directory in batched write transactions"""
+        started = time.perf_counter()
+        
+        # Node labels don't depend on each other, so their files are imported concurrently
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [
+                pool.submit(self._import_file, file_name, f"UNWIND $rows AS row CREATE (n:{label}) SET n = row", columns)
+                for label, file_name, columns in CSV_NODES
+            ]
+            total_rows = sum(future.result() for future in futures)
+        
+        # Relationships lock both end nodes, one file at a time avoids deadlocks between them
+        for rel_type, file_name, (from_label, from_column), (to_label, to_column) in CSV_RELATIONSHIPS:
+            query = f"""
+            UNWIND $rows AS row
+            MATCH (a:{from_label} {{name: row.from}})
+            MATCH (b:{to_label} {{name: row.to}})
+            CREATE (a)-[:{rel_type}]->(b)
+            """
+            total_rows += self._import_file(file_name, query, {"from": from_column, "to": to_column})
+        
+        elapsed = time.perf_counter() - started
+        print(f"✅ Imported {total_rows} rows in {elapsed:.2f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    
+    def import_incremental(self):
+        """Apply only the rows added, changed or removed since the last import, with MERGE in batched transactions"""
+        started = time.perf_counter()
+        previous = self._load_state()
+        if previous is None:
+            print("ℹ️  No import state for this graph, diffing against the keys stored in Neo4j")
+        current = self._hash_local_files()
+        changed_rows = 0
+        node_deletes = []
+        
+        # Upsert nodes first so new relationships find both ends
+        for label, file_name, _ in CSV_NODES:
+            rows = current[f"{label}:{file_name}"]
+            known = self._known_keys(previous, f"{label}:{file_name}", f"MATCH (n:{label}) RETURN n.name AS name")
+            upserts = [row for key, (digest, row) in rows.items() if known.get(key) != digest]
+            deletes = [{"name": key} for key in known if key not in rows]
+            inserted = sum(1 for key in rows if key not in known)
+            
+            self._write_rows(f"UNWIND $rows AS row MERGE (n:{label} {{name: row.name}}) SET n = row", upserts)
+            node_deletes.append((label, deletes))
+            changed_rows += len(upserts) + len(deletes)
+            print(f"✅ {file_name} ({label}): +{inserted} ~{len(upserts) - inserted} -{len(deletes)} of {len(rows)} rows")
+        
+        for rel_type, file_name, (from_label, _), (to_label, _) in CSV_RELATIONSHIPS:
+            rows = current[f"{rel_type}:{file_name}"]
+            known = self._known_keys(
+                previous, f"{rel_type}:{file_name}",
+                f"MATCH (a:{from_label})-[:{rel_type}]->(b:{to_label}) RETURN a.name AS from, b.name AS to"
+            )
+            inserts = [row for key, (_, row) in rows.items() if key not in known]
+            deletes = [json.loads(key) for key in known if key not in rows]
+            
+            self._write_rows(f"""
+            UNWIND $rows AS row
+            MATCH (a:{from_label} {{name: row.from}})-[r:{rel_type}]->(b:{to_label} {{name: row.to}})
+            DELETE r
+            """, [{"from": source, "to": target} for source, target in deletes])
+            self._write_rows(f"""
+            UNWIND $rows AS row
+            MATCH (a:{from_label} {{name: row.from}})
+            MATCH (b:{to_label} {{name: row.to}})
+            MERGE (a)-[:{rel_type}]->(b)
+            """, inserts)
+            changed_rows += len(inserts) + len(deletes)
+            print(f"✅ {file_name} ({rel_type}): +{len(inserts)} -{len(deletes)} of {len(rows)} rows")
+        
+        # Remove vanished nodes last, together with any relationships still attached to them
+        for label, deletes in node_deletes:
+            self._write_rows(f"UNWIND $rows AS row MATCH (n:{label} {{name: row.name}}) DETACH DELETE n", deletes)
+        
+        elapsed = time.perf_counter() - started
+        print(f"✅ Applied {changed_rows} changed rows in {elapsed:.2f}s")
+    
+    def _hash_local_files(self):
+        """
+        Hash every row of the local CSV files, keyed by the graph element it becomes.
+        
+        Returns:
+            dict: "<label or relationship type>:<file>" -> {key: (hash, row)}
+        """
+        files = {}
+        for label, file_name, columns in CSV_NODES:
+            files[f"{label}:{file_name}"] = {
+                row["name"]: (row_hash(row), row) for row in self._read_rows(file_name, columns)
+            }
+        for rel_type, file_name, (_, from_column), (_, to_column) in CSV_RELATIONSHIPS:
+            files[f"{rel_type}:{file_name}"] = {
+                json.dumps([row["from"], row["to"]]): (row_hash(row), row)
+                for row in self._read_rows(file_name, {"from": from_column, "to": to_column})
+            }
+        return files
+    
+    def _known_keys(self, previous, spec_id, keys_query):
+        """
+        Keys and row hashes of the last import, or the keys currently in Neo4j (without hashes)
+        if there is no usable state, so every row gets rewritten and stale elements still get deleted.
+        """
+        if previous is not None and spec_id in previous:
+            return previous[spec_id]
+        known = {}
+        for record in self.client.execute_query(keys_query):
+            if "name" in record:
+                known[record["name"]] = None
+            else:
+                known[json.dumps([record["from"], record["to"]])] = None
+        return known
+    
+    def _load_state(self):
+        """Load the row hashes of the last import, if it was made against the graph generation in Neo4j"""
+        remove_stale_temp_files(os.path.dirname(self.state_file))
+        if not os.path.exists(self.state_file):
+            return None
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            generation = self.meta_client.get_graph_generation()
+        except Exception as e:
+            print(f"⚠️  Warning: Could not load import state: {e}")
+            return None
+        if stored.get("generation") != generation:
+            print("ℹ️  Graph was imported elsewhere since the last recorded import")
+            return None
+        return stored.get("files")
+    
+    def _save_state(self, files, generation):
+        try:
+            write_json_atomic(self.state_file, {
+                "generation": generation,
+                "files": {
+                    spec_id: {key: digest for key, (digest, _) in rows.items()}
+                    for spec_id, rows in files.items()
+                },
+            })
+        except Exception as e:
+            print(f"⚠️  Warning: Could not save import state: {e}")
+    
+    def _read_rows(self, file_name, columns):
+        """Stream the rows of a local CSV file, mapped to property names"""
+        with open(os.path.join(self.data_dir, file_name), newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                yield {key: row.get(column) for key, column in columns.items()}
+    
+    def _read_batches(self, rows):
+        """Group rows into lists of at most batch_size"""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    @staticmethod
+    def _write_batch(tx, query, rows):
+        tx.run(query, rows=rows).consume()
+    
+    def _write_rows(self, query, rows):
+        """Send rows through an UNWIND query, one write transaction per batch"""
+        row_count = 0
+        with self.client.session(self.client.database) as session:
+            for batch in self._read_batches(rows):
+                session.execute_write(self._write_batch, query, batch)
+                row_count += len(batch)
+        return row_count
+    
+    def _import_file(self, file_name, query, columns):
+        """Send one CSV file through an UNWIND query, one write transaction per batch"""
+        started = time.perf_counter()
+        try:
+            row_count = self._write_rows(query, self._read_rows(file_name, columns))
+        except Exception as e:
+            print(f"❌ Failed to import {file_name}: {e}")
+            raise
+        
+        elapsed = time.perf_counter() - started
+        print(f"✅ {file_name}: {row_count} rows in {elapsed:.2f}s ({row_count / max(elapsed, 1e-9):,.0f} rows/s)")
+        return row_count
+    
     def close(self):
         """Close the database connection"""
         self.client.close()
@@ -0,0 +1,294 @@
+import os
+import csv
+import time
+import threading
+from array import array
+from .neo4j_client import GRAPH_META_LABEL
+from .csv_importer import CSV_NODES, CSV_RELATIONSHIPS
+
+# Node labels of the knowledgegraph with the plural used in list template names
+NODE_LABELS = {
+    "department": "departments",
+    "process": "processes",
+    "system": "systems",
+    "role": "roles",
+    "step": "steps",
+}
+
+RELATIONSHIP_TYPES = ["is_owner_of", "has_step", "performs", "supports"]
+
+SNAPSHOT_NODES_QUERY = f"""
+MATCH (n)
+WHERE NOT n:{GRAPH_META_LABEL}
+RETURN labels(n)[0] AS label, properties(n) AS properties
+"""
+SNAPSHOT_RELATIONSHIPS_QUERY = """
+MATCH (a)-[r]->(b)
+WHERE type(r) IN $types
+RETURN type(r) AS type, labels(a)[0] AS from_label, a.name AS from_name, labels(b)[0] AS to_label, b.name AS to_name
+"""
+
+
+class GraphSnapshot:
+    """
+    Read-only in-memory copy of the knowledgegraph.
+
+    Nodes get consecutive integer IDs; relationships of each type are stored as compressed adjacency
+    arrays (offsets into a flat target array) in both directions, so traversals are list slices
+    instead of Neo4j round trips. Only the query templates are answered here, everything else
+    still goes to Neo4j.
+    """
+
+    def __init__(self, nodes, relationships, generation=None):
+        """
+        Args:
+            nodes (list): (label, properties) tuples, properties including the name
+            relationships (list): (type, from_label, from_name, to_label, to_name) tuples
+            generation: Graph generation or CSV version the snapshot was built from
+        """
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.labels = []
+        self.properties = []
+        self.by_label = {label: array("I") for label in NODE_LABELS}
+        self._ids = {}
+
+        for label, properties in nodes:
+            name = properties.get("name")
+            if label not in NODE_LABELS or not name or (label, name) in self._ids:
+                continue
+            node_id = len(self.labels)
+            self._ids[(label, name)] = node_id
+            self.labels.append(label)
+            self.properties.append(dict(properties))
+            self.by_label[label].append(node_id)
+
+        edges = {rel_type: set() for rel_type in RELATIONSHIP_TYPES}
+        for rel_type, from_label, from_name, to_label, to_name in relationships:
+            source = self._ids.get((from_label, from_name))
+            target = self._ids.get((to_label, to_name))
+            if rel_type in edges and source is not None and target is not None:
+                edges[rel_type].add((source, target))
+
+        self._outgoing = {}
+        self._incoming = {}
+        for rel_type, pairs in edges.items():
+            self._outgoing[rel_type] = self._adjacency(sorted(pairs))
+            self._incoming[rel_type] = self._adjacency(sorted((target, source) for source, target in pairs))
+        self.relationship_count = sum(len(pairs) for pairs in edges.values())
+
+    def _adjacency(self, pairs):
+        """Build (offsets, targets) arrays from sorted (source, target) pairs."""
+        offsets = array("I", [0] * (len(self.labels) + 1))
+        targets = array("I", (target for _, target in pairs))
+        for source, _ in pairs:
+            offsets[source + 1] += 1
+        for node_id in range(len(self.labels)):
+            offsets[node_id + 1] += offsets[node_id]
+        return offsets, targets
+
+    @classmethod
+    def from_csv(cls, data_dir):
+        """Build a snapshot from the CSV files CSVImporter imports."""
+        def read_rows(file_name):
+            with open(os.path.join(data_dir, file_name), newline="", encoding="utf-8") as f:
+                return list(csv.DictReader(f))
+
+        nodes = []
+        for label, file_name, columns in CSV_NODES:
+            for row in read_rows(file_name):
+                nodes.append((label, {prop: row.get(column) for prop, column in columns.items()}))
+
+        relationships = []
+        for rel_type, file_name, (from_label, from_column), (to_label, to_column) in CSV_RELATIONSHIPS:
+            for row in read_rows(file_name):
+                relationships.append((rel_type, from_label, row.get(from_column), to_label, row.get(to_column)))
+
+        return cls(nodes, relationships, generation=csv_version(data_dir))
+
+    @classmethod
+    def from_records(cls, node_rows, relationship_rows, generation=None):
+        """Build a snapshot from the rows of SNAPSHOT_NODES_QUERY and SNAPSHOT_RELATIONSHIPS_QUERY."""
+        nodes = [(row["label"], row["properties"] or {}) for row in node_rows]
+        relationships = [
+            (row["type"], row["from_label"], row["from_name"], row["to_label"], row["to_name"])
+            for row in relationship_rows
+        ]
+        return cls(nodes, relationships, generation=generation)
+
+    # Traversal
+
+    def node_id(self, label, name):
+        return self._ids.get((label, name))
+
+    def outgoing(self, node_id, rel_type):
+        offsets, targets = self._outgoing[rel_type]
+        return targets[offsets[node_id]:offsets[node_id + 1]]
+
+    def incoming(self, node_id, rel_type):
+        offsets, targets = self._incoming[rel_type]
+        return targets[offsets[node_id]:offsets[node_id + 1]]
+
+    def prop(self, node_id, key):
+        return self.properties[node_id].get(key)
+
+    def entity_rows(self):
+        """Node labels and names in the shape of the template engine's ENTITY_INDEX_QUERY."""
+        return [{"label": label, "name": props.get("name")} for label, props in zip(self.labels, self.properties)]
+
+    # Query templates
+
+    def answer(self, template_name, params):
+        """
+        Answer a query template with the same rows its Cypher would return.
+
+        Returns:
+            list or None: None if the template is unknown here and Neo4j has to answer it
+        """
+        for label, plural in NODE_LABELS.items():
+            if template_name == f"list_{plural}":
+                return [{label: self.prop(n, "name"), "description": self.prop(n, "description")}
+                        for n in self.by_label[label]]
+
+        handler = getattr(self, f"_answer_{template_name}", None)
+        if handler is None:
+            return None
+        return handler(params.get("name"))
+
+    def _answer_steps_of_process(self, name):
+        process = self.node_id("process", name)
+        if process is None:
+            return []
+        return [{"step": self.prop(s, "name"), "description": self.prop(s, "description")}
+                for s in self.outgoing(process, "has_step")]
+
+    def _answer_roles_in_process(self, name):
+        process = self.node_id("process", name)
+        if process is None:
+            return []
+        return [{"role": self.prop(r, "name"), "step": self.prop(s, "name")}
+                for s in self.outgoing(process, "has_step") for r in self.incoming(s, "performs")]
+
+    def _answer_systems_for_process(self, name):
+        process = self.node_id("process", name)
+        if process is None:
+            return []
+        systems = []
+        for s in self.outgoing(process, "has_step"):
+            for system in self.incoming(s, "supports"):
+                if system not in systems:
+                    systems.append(system)
+        return [{"system": self.prop(sys, "name"), "category": self.prop(sys, "category")} for sys in systems]
+
+    def _answer_systems_for_step(self, name):
+        step = self.node_id("step", name)
+        if step is None:
+            return []
+        return [{"system": self.prop(sys, "name"), "category": self.prop(sys, "category")}
+                for sys in self.incoming(step, "supports")]
+
+    def _answer_owner_of_process(self, name):
+        process = self.node_id("process", name)
+        if process is None:
+            return []
+        return [{"department": self.prop(d, "name")} for d in self.incoming(process, "is_owner_of")]
+
+    def stats(self):
+        return {
+            "nodes": len(self.labels),
+            "relationships": self.relationship_count,
+            "generation": self.generation,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def csv_version(data_dir):
+    """Version of the CSV data, changing whenever one of the files is modified."""
+    return max(os.path.getmtime(os.path.join(data_dir, file_name))
+               for file_name in {spec[1] for spec in CSV_NODES + CSV_RELATIONSHIPS})
+
+
+class GraphSnapshotStore:
+    """
+    Holds the current GraphSnapshot and swaps in a new one when the graph changes.
+
+    With source "neo4j" the snapshot is loaded from Neo4j, which stays the source of truth: every
+    `check_interval` seconds the generation on the graph marker node is compared, so an import by
+    import_data.py is picked up without restarting. With source "csv" the snapshot is built from
+    data/*.csv and rebuilt when the files change. Call invalidate() to force a check right away.
+    """
+
+    def __init__(self, source="neo4j", check_interval=30, data_dir=None):
+        if source not in ("neo4j", "csv"):
+            raise ValueError(f"Unknown graph snapshot source: {source}")
+        self.source = source
+        self.check_interval = check_interval
+        self.data_dir = data_dir or os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
+        self.snapshot = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def begin_check(self):
+        """Claim a due freshness check, so concurrent callers keep using the current snapshot meanwhile."""
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return False
+            self._checked_at = now
+            return True
+
+    def invalidate(self):
+        """Check for a new graph on the next access, e.g. right after an import in this process."""
+        with self._lock:
+            self._checked_at = None
+
+    def _install(self, snapshot):
+        self.snapshot = snapshot
+        stats = snapshot.stats()
+        print(f"Loaded graph snapshot from {self.source}: {stats['nodes']} nodes, "
+              f"{stats['relationships']} relationships (generation {snapshot.generation})")
+
+    def _refresh_csv(self):
+        if self.snapshot is None or csv_version(self.data_dir) != self.snapshot.generation:
+            self._install(GraphSnapshot.from_csv(self.data_dir))
+
+    def current(self, neo4j_client):
+        """
+        Return the snapshot, refreshing it first if a check is due.
+
+        Returns:
+            GraphSnapshot or None: None until a snapshot could be loaded
+        """
+        if self.begin_check():
+            try:
+                if self.source == "csv":
+                    self._refresh_csv()
+                else:
+                    generation = neo4j_client.get_graph_generation()
+                    if self.snapshot is None or generation != self.snapshot.generation:
+                        node_rows = neo4j_client.execute_query(SNAPSHOT_NODES_QUERY, raise_errors=True)
+                        relationship_rows = neo4j_client.execute_query(
+                            SNAPSHOT_RELATIONSHIPS_QUERY, {"types": RELATIONSHIP_TYPES}, raise_errors=True
+                        )
+                        self._install(GraphSnapshot.from_records(node_rows, relationship_rows, generation))
+            except Exception as e:
+                print(f"Could not refresh graph snapshot: {e}")
+        return self.snapshot
+
+    async def current_async(self, neo4j_client):
+        """current() for an AsyncNeo4jClient."""
+        if self.begin_check():
+            try:
+                if self.source == "csv":
+                    self._refresh_csv()
+                else:
+                    generation = await neo4j_client.get_graph_generation()
+                    if self.snapshot is None or generation != self.snapshot.generation:
+                        node_rows = await neo4j_client.execute_query(SNAPSHOT_NODES_QUERY, raise_errors=True)
+                        relationship_rows = await neo4j_client.execute_query(
+                            SNAPSHOT_RELATIONSHIPS_QUERY, {"types": RELATIONSHIP_TYPES}, raise_errors=True
+                        )
+                        self._install(GraphSnapshot.from_records(node_rows, relationship_rows, generation))
+            except Exception as e:
+                print(f"Could not refresh graph snapshot: {e}")
+        return self.snapshot
@@ -0,0 +1,40 @@
+import os
+import json
+import time
+import tempfile
+
+# Temporary files older than this are left over from an interrupted write
+STALE_TEMP_SECONDS = 3600
+
+
+def write_json_atomic(path, payload, **dump_kwargs):
+    """
+    Write payload as JSON through a temporary file in the same directory, which then replaces the
+    file, so readers never see a partial file. The temporary file is removed if anything fails.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp_file = tempfile.NamedTemporaryFile(
+        'w', encoding='utf-8', dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp", delete=False
+    )
+    try:
+        with tmp_file:
+            json.dump(payload, tmp_file, **dump_kwargs)
+        os.replace(tmp_file.name, path)
+    finally:
+        if os.path.exists(tmp_file.name):
+            os.remove(tmp_file.name)
+
+
+def remove_stale_temp_files(directory, max_age_seconds=STALE_TEMP_SECONDS):
+    """Remove the *.tmp files of writes interrupted more than max_age_seconds ago."""
+    if not os.path.isdir(directory):
+        return
+    oldest_allowed = time.time() - max_age_seconds
+    for filename in os.listdir(directory):
+        file_path = os.path.join(directory, filename)
+        try:
+            if filename.endswith(".tmp") and os.path.getmtime(file_path) < oldest_allowed:
+                os.remove(file_path)
+        except OSError:
+            pass
@@ -1,46 +1,466 @@
 import os
-from neo4j import GraphDatabase
+import re
+import time
+import threading
+from neo4j import GraphDatabase, Query, READ_ACCESS, WRITE_ACCESS, unit_of_work
 from dotenv import load_dotenv
+from .result_cache import QueryResultCache, is_read_query
+from .client_metrics import ClientMetrics, pool_usage
+from .query_control import (
+    APP_TRANSACTIONS_QUERY, TERMINATE_TRANSACTIONS_QUERY, Cancelled, TransactionControl, is_timeout
+)
+
+# Marker node holding the graph generation, bumped by CSVImporter after every import,
+# and with blue/green imports the database readers should use
+GRAPH_META_LABEL = "graph_meta"
+GRAPH_GENERATION_QUERY = f"MATCH (m:{GRAPH_META_LABEL} {{key: 'graph'}}) RETURN m.generation AS generation"
+GRAPH_META_QUERY = f"""
+MATCH (m:{GRAPH_META_LABEL} {{key: 'graph'}})
+RETURN m.generation AS generation, m.active_database AS active_database, m.previous_database AS previous_database
+"""
+
+# Driver default for the connection pool size, reported when NEO4J_MAX_POOL_SIZE is not set
+DEFAULT_MAX_POOL_SIZE = 100
+
+# Statements that commit on their own and cannot run inside a managed transaction
+AUTO_COMMIT_STATEMENTS = re.compile(r"\bIN\s+TRANSACTIONS\b|\bPERIODIC\s+COMMIT\b", re.IGNORECASE)
+
+
+class Neo4jQueryError(Exception):
+    """A query failed; code is the Neo4j status code, e.g. Neo.ClientError.Statement.SyntaxError."""
+    
+    def __init__(self, message, code=None, query=None):
+        super().__init__(message)
+        self.code = code
+        self.query = query
+    
+    @classmethod
+    def from_error(cls, error, query):
+        return cls(getattr(error, "message", None) or str(error), getattr(error, "code", None), query)
+    
+    @property
+    def is_query_error(self):
+        """True if the statement itself is at fault (syntax, semantics, types), not the connection or server."""
+        return (self.code or "").startswith("Neo.ClientError.Statement.")
+
+
+def explain_summary(summary):
+    """Plan and planner notifications of an EXPLAIN result summary."""
+    return {
+        "plan": summary.plan,
+        "notifications": [
+            {"gql_status": status.gql_status, "description": status.status_description}
+            for status in summary.gql_status_objects if status.is_notification
+        ],
+    }
+
+
+def driver_config():
+    """Pool, timeout, retry and fetch settings for the driver from the environment; unset values keep the driver defaults."""
+    settings = {
+        "max_connection_pool_size": ("NEO4J_MAX_POOL_SIZE", int),
+        "connection_acquisition_timeout": ("NEO4J_ACQUISITION_TIMEOUT", float),
+        "connection_timeout": ("NEO4J_CONNECTION_TIMEOUT", float),
+        "max_connection_lifetime": ("NEO4J_MAX_CONNECTION_LIFETIME", float),
+        "liveness_check_timeout": ("NEO4J_LIVENESS_CHECK_TIMEOUT", float),
+        "max_transaction_retry_time": ("NEO4J_MAX_RETRY_TIME", float),
+        "fetch_size": ("NEO4J_FETCH_SIZE", int),
+    }
+    return {option: cast(os.getenv(name)) for option, (name, cast) in settings.items() if os.getenv(name)}
+
 
 class Neo4jClient:
-    def __init__(self):
+    def __init__(self, cache_results=None, database=None):
         load_dotenv()
         
         self.uri = os.getenv("NEO4J_URI")
         self.username = os.getenv("NEO4J_USERNAME")
         self.password = os.getenv("NEO4J_PASSWORD")
         
+        config = driver_config()
         self.driver = GraphDatabase.driver(
             self.uri, 
-            auth=(self.username, self.password)
+            auth=(self.username, self.password),
+            **config
         )
+        self.max_pool_size = config.get("max_connection_pool_size", DEFAULT_MAX_POOL_SIZE)
+        
+        # Sessions share bookmarks, so reads after a write (e.g. an import) see it even on another cluster member
+        self.bookmark_manager = GraphDatabase.bookmark_manager()
+        self.metrics = ClientMetrics()
+        
+        # Rows kept in memory by fetch_rows, the rest is only counted (0 keeps all)
+        self.max_result_rows = int(os.getenv("NEO4J_MAX_RESULT_ROWS", "0"))
+        
+        # Optional result cache, invalidated whenever the graph generation changes
+        if cache_results is None:
+            cache_results = os.getenv("NEO4J_RESULT_CACHE", "false").lower() == "true"
+        self.result_cache = None
+        if cache_results:
+            max_mb = float(os.getenv("NEO4J_RESULT_CACHE_MAX_MB", "32"))
+            self.result_cache = QueryResultCache(max_bytes=int(max_mb * 1024 * 1024))
+        self.generation_check_interval = float(os.getenv("NEO4J_GENERATION_CHECK_SECONDS", "30"))
+        self._last_generation_check = 0.0
+        
+        # The marker node lives in the configured (or server default) database; with blue/green
+        # imports reads follow its active database unless this client is pinned to one
+        self.meta_database = os.getenv("NEO4J_DATABASE") or None
+        self.database = database or self.meta_database
+        self.follow_active_database = database is None and bool(os.getenv("NEO4J_BLUE_GREEN_DATABASES"))
+        
+        # Transaction timeouts per query class, turn cancellation and the kill switch
+        self.transaction_control = TransactionControl(self.metrics)
+        self._stop_kill_switch = threading.Event()
+        if self.transaction_control.kill_after > 0:
+            threading.Thread(target=self._run_kill_switch, name="neo4j-kill-switch", daemon=True).start()
+        
+        if self.follow_active_database:
+            self._check_graph_generation()
     
-    def execute_query(self, query, params=None):
+    def execute_query(self, query, params=None, raise_errors=False, query_class=None, cancel_token=None):
         """
         Execute a Cypher query against the Neo4j database
         
         Args:
             query (str): The Cypher query to execute
             params (dict, optional): Parameters for the query
-            
+            raise_errors (bool): Raise Neo4jQueryError on errors instead of returning an empty list
+            query_class (str, optional): Query class picking the transaction timeout, "internal" for reads
+                and "write" for writes by default
+            cancel_token (CancelToken, optional): Token of the chat turn the query belongs to
+        
         Returns:
             list: Query results
+        
+        Raises:
+            Cancelled: If the turn was cancelled
         """
         if params is None:
             params = {}
-            
+        
+        cacheable = self.result_cache is not None and is_read_query(query)
+        if cacheable or self.follow_active_database:
+            self._check_graph_generation()
+        if cacheable:
+            cached = self.result_cache.get(query, params)
+            if cached is not None:
+                return cached
+        
         try:
-            with self.driver.session() as session:
-                result = session.run(query, params)
-                return [record.data() for record in result]
+            results = self._run_query(query, params, self.database, query_class, cancel_token)
+        except Cancelled:
+            raise
         except Exception as e:
             print(f"Error executing Neo4j query: {e}")
+            if raise_errors:
+                raise Neo4jQueryError.from_error(e, query) from e
             return []
+        
+        if cacheable:
+            self.result_cache.put(query, params, results)
+        elif self.result_cache is not None:
+            # Our own writes make every cached result suspect
+            self.result_cache.clear()
+        return results
+    
+    def session(self, database=None, **config):
+        """Open a session sharing this client's bookmarks, e.g. for batched writes."""
+        return self.driver.session(database=database, bookmark_manager=self.bookmark_manager, **config)
+    
+    def stream_query(self, query, params=None, query_class=None, cancel_token=None):
+        """
+        Stream the records of a read query as dicts without materializing the whole result.
+        
+        Records are pulled from the server in batches of NEO4J_FETCH_SIZE while the caller iterates;
+        the session stays open until the generator is exhausted or closed. Errors are raised, and
+        Cancelled once the turn of cancel_token is cancelled.
+        """
+        if self.follow_active_database:
+            self._check_graph_generation()
+        timeout, metadata = self.transaction_control.config(query, query_class, cancel_token)
+        self.transaction_control.begin(cancel_token)
+        self.metrics.begin(True)
+        started = time.perf_counter()
+        error = False
+        try:
+            with self.session(self.database, default_access_mode=READ_ACCESS) as session:
+                with session.begin_transaction(metadata=metadata, timeout=timeout) as tx:
+                    self.metrics.acquired(time.perf_counter() - started)
+                    for record in tx.run(query, params or {}):
+                        self.transaction_control.check(cancel_token)
+                        yield record.data()
+        except Exception as e:
+            error = True
+            if is_timeout(e):
+                self.metrics.interrupted("timeout")
+            raise
+        finally:
+            self.metrics.end(time.perf_counter() - started, error=error)
+            self.transaction_control.end(cancel_token)
+    
+    def fetch_rows(self, query, params=None, max_rows=None, raise_errors=False, query_class=None, cancel_token=None):
+        """
+        Execute a query keeping at most max_rows records, counting the rest without holding them
+        
+        Args:
+            query (str): The Cypher query to execute
+            params (dict, optional): Parameters for the query
+            max_rows (int, optional): Rows to keep, NEO4J_MAX_RESULT_ROWS by default (0 keeps all)
+            raise_errors (bool): Raise Neo4jQueryError on errors instead of returning no rows
+            query_class (str, optional): Query class picking the transaction timeout, see execute_query
+            cancel_token (CancelToken, optional): Token of the chat turn the query belongs to
+        
+        Returns:
+            tuple: (rows, total number of rows the query produced)
+        """
+        if max_rows is None:
+            max_rows = self.max_result_rows
+        if not max_rows or not is_read_query(query):
+            rows = self.execute_query(query, params, raise_errors, query_class, cancel_token)
+            return rows, len(rows)
+        
+        if params is None:
+            params = {}
+        if self.result_cache is not None:
+            self._check_graph_generation()
+            cached = self.result_cache.get(query, params)
+            if cached is not None:
+                return cached[:max_rows], len(cached)
+        
+        rows = []
+        total_rows = 0
+        try:
+            for record in self.stream_query(query, params, query_class, cancel_token):
+                total_rows += 1
+                if total_rows <= max_rows:
+                    rows.append(record)
+        except Cancelled:
+            raise
+        except Exception as e:
+            print(f"Error executing Neo4j query: {e}")
+            if raise_errors:
+                raise Neo4jQueryError.from_error(e, query) from e
+            return [], 0
+        
+        # Only complete results are cached
+        if self.result_cache is not None and total_rows <= max_rows:
+            self.result_cache.put(query, params, rows)
+        return rows, total_rows
+    
+    def explain(self, query, params=None):
+        """
+        Have the server parse and plan a query without running it.
+        
+        Args:
+            query (str): The Cypher query to plan
+            params (dict, optional): Parameters for the query
+        
+        Returns:
+            dict: plan (operator tree with estimated rows, as reported by the server) and
+                notifications (gql_status and description of planner warnings)
+        
+        Raises:
+            neo4j.exceptions.Neo4jError: For syntax and semantic errors of the query
+        """
+        if self.follow_active_database:
+            self._check_graph_generation()
+        access_mode = READ_ACCESS if is_read_query(query) else WRITE_ACCESS
+        timeout, metadata = self.transaction_control.config(query, "internal")
+        with self.session(self.database, default_access_mode=access_mode) as session:
+            return explain_summary(session.run(Query(f"EXPLAIN {query}", metadata, timeout), params or {}).consume())
+    
+    def _run_query(self, query, params, database=None, query_class=None, cancel_token=None):
+        """
+        Run a query and materialize the records.
+        
+        Reads run in read-routed managed transactions and writes in write transactions, both retried by the
+        driver on transient errors. Statements that commit on their own run in an auto-commit transaction.
+        Each transaction gets the timeout of its query class.
+        """
+        timeout, metadata = self.transaction_control.config(query, query_class, cancel_token)
+        self.transaction_control.begin(cancel_token)
+        read = is_read_query(query)
+        self.metrics.begin(read)
+        started = time.perf_counter()
+        attempts = 0
+        
+        @unit_of_work(metadata=metadata, timeout=timeout)
+        def work(tx):
+            nonlocal attempts
+            if attempts == 0:
+                self.metrics.acquired(time.perf_counter() - started)
+            attempts += 1
+            return [record.data() for record in tx.run(query, params)]
+        
+        try:
+            with self.session(database) as session:
+                if AUTO_COMMIT_STATEMENTS.search(query):
+                    attempts = 1
+                    records = [record.data() for record in session.run(Query(query, metadata, timeout), params)]
+                elif read:
+                    records = session.execute_read(work)
+                else:
+                    records = session.execute_write(work)
+        except Exception as e:
+            if is_timeout(e):
+                self.metrics.interrupted("timeout")
+            self.metrics.end(time.perf_counter() - started, attempts, error=True)
+            raise
+        finally:
+            self.transaction_control.end(cancel_token)
+        self.metrics.end(time.perf_counter() - started, attempts)
+        return records
+    
+    def terminate_transactions(self, older_than=0, turn_id=None, excluded_classes=()):
+        """
+        Terminate running transactions of this app.
+        
+        Only the server this client's session is routed to is searched, which in a cluster is not
+        necessarily the one running a given read transaction.
+        
+        Args:
+            older_than (float): Only transactions running for at least this many seconds
+            turn_id (str, optional): Only transactions of this chat turn
+            excluded_classes (list): Query classes to leave running, e.g. ["write"]
+        
+        Returns:
+            int: Number of transactions terminated
+        """
+        params = self.transaction_control.terminate_params(older_than, turn_id, excluded_classes)
+        with self.session(self.meta_database) as session:
+            ids = [record["transactionId"] for record in session.run(APP_TRANSACTIONS_QUERY, params)]
+            if ids:
+                session.run(TERMINATE_TRANSACTIONS_QUERY, {"ids": ids}).consume()
+        return len(ids)
+    
+    def cancel(self, cancel_token):
+        """
+        Cancel a chat turn: its next queries and streamed records raise Cancelled, and its transactions
+        still running on the server are terminated.
+        
+        Returns:
+            int: Number of transactions terminated
+        """
+        cancel_token.cancel()
+        if not self.transaction_control.running(cancel_token.turn_id):
+            return 0
+        try:
+            terminated = self.terminate_transactions(turn_id=cancel_token.turn_id)
+        except Exception as e:
+            print(f"Could not terminate transactions of turn {cancel_token.turn_id}: {e}")
+            return 0
+        self.metrics.interrupted("cancel", terminated)
+        return terminated
+    
+    def _run_kill_switch(self):
+        """Every kill_check_interval seconds, terminate transactions (except writes) running longer than kill_after."""
+        kill_after = self.transaction_control.kill_after
+        while not self._stop_kill_switch.wait(self.transaction_control.kill_check_interval):
+            try:
+                killed = self.terminate_transactions(older_than=kill_after, excluded_classes=["write"])
+            except Exception as e:
+                print(f"Kill switch could not check transactions: {e}")
+                continue
+            if killed:
+                print(f"Kill switch terminated {killed} transactions running longer than {kill_after}s")
+                self.metrics.interrupted("kill_switch", killed)
+    
+    def health(self):
+        """
+        Check that the database is reachable.
+        
+        Returns:
+            dict: status ("ok" or "error"), latency in milliseconds, server agent, read database and error message
+        """
+        started = time.perf_counter()
+        try:
+            server_info = self.driver.get_server_info()
+            return {
+                "status": "ok",
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+                "server": server_info.agent,
+                "database": self.database,
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+                "database": self.database,
+                "error": str(e),
+            }
+    
+    def get_metrics(self):
+        """
+        Query counters and timings, connection pool usage and result cache statistics.
+        
+        Returns:
+            dict: queries, reads, writes, errors, retries, in_flight, peak_in_flight, interruptions (timeout,
+                cancel and kill_switch counts), acquisition_wait, query_time, pool (in use, waiting and peak connections, estimated from the queries in flight) and result_cache (None if disabled)
+        """
+        metrics = self.metrics.to_dict()
+        metrics["pool"] = pool_usage(metrics, self.max_pool_size)
+        metrics["result_cache"] = self.result_cache.stats() if self.result_cache is not None else None
+        return metrics
+    
+    def get_graph_meta(self):
+        """
+        Read the marker node maintained by CSVImporter.
+        
+        Returns:
+            dict: generation, active_database and previous_database, all None if the graph was never imported
+        """
+        records = self._run_query(GRAPH_META_QUERY, {}, self.meta_database)
+        return records[0] if records else {"generation": None, "active_database": None, "previous_database": None}
+    
+    def get_graph_generation(self):
+        """
+        Read the graph generation from the marker node maintained by CSVImporter.
+        
+        Returns:
+            int or None: The current generation, None if the graph was never imported
+        """
+        records = self._run_query(GRAPH_GENERATION_QUERY, {}, self.meta_database)
+        return records[0]["generation"] if records else None
+    
+    def update_graph_meta(self, query, params=None):
+        """Run a write query against the database holding the marker node, raising on errors."""
+        records = self._run_query(query, params or {}, self.meta_database)
+        self.invalidate_cache()
+        return records
+    
+    def _check_graph_generation(self):
+        """Invalidate the result cache and switch the read database if an import happened since the last check."""
+        now = time.monotonic()
+        if now - self._last_generation_check < self.generation_check_interval:
+            return
+        self._last_generation_check = now
+        try:
+            meta = self.get_graph_meta()
+        except Exception as e:
+            print(f"Could not read graph generation, clearing result cache: {e}")
+            if self.result_cache is not None:
+                self.result_cache.clear()
+            return
+        
+        if self.follow_active_database and meta["active_database"] and meta["active_database"] != self.database:
+            print(f"Reading from database {meta['active_database']} (generation {meta['generation']})")
+            self.database = meta["active_database"]
+            if self.result_cache is not None:
+                self.result_cache.clear()
+        if self.result_cache is not None:
+            self.result_cache.set_generation(meta["generation"])
+    
+    def invalidate_cache(self):
+        """Drop all cached results, e.g. right after an import in the same process."""
+        if self.result_cache is not None:
+            self.result_cache.clear()
+            self._last_generation_check = 0.0
     
     def close(self):
         """Close the Neo4j driver connection"""
+        self._stop_kill_switch.set()
         if self.driver is not None:
             self.driver.close()
-            
+    
     def __del__(self):
-        self.close()
\ No newline at end of file
+        self.close()
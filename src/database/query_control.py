@@ -0,0 +1,136 @@
+import os
+import uuid
+import threading
+from collections import Counter
+from .result_cache import is_read_query
+
+# Transactions of this app carry it in their metadata, so they can be found and terminated
+TRANSACTION_APP = "knowledgegraph-ai-assistant"
+
+# Query classes with the variable and default (seconds) of their transaction timeout, 0 keeps the server's
+QUERY_CLASSES = {
+    "generated": ("NEO4J_TIMEOUT_GENERATED", "15"),
+    "template": ("NEO4J_TIMEOUT_TEMPLATE", "5"),
+    "internal": ("NEO4J_TIMEOUT_INTERNAL", "30"),
+    "write": ("NEO4J_TIMEOUT_WRITE", "0"),
+}
+
+# Running transactions of this app, optionally only those of one turn or of one query class
+APP_TRANSACTIONS_QUERY = """
+SHOW TRANSACTIONS YIELD transactionId, elapsedTime, metaData
+WHERE metaData.app = $app
+  AND elapsedTime.milliseconds >= $min_ms
+  AND ($turn IS NULL OR metaData.turn = $turn)
+  AND NOT coalesce(metaData.class, '') IN $excluded_classes
+RETURN transactionId
+"""
+TERMINATE_TRANSACTIONS_QUERY = "TERMINATE TRANSACTIONS $ids"
+
+
+def query_timeouts():
+    """Transaction timeout per query class from the environment, None where the server default applies."""
+    timeouts = {}
+    for query_class, (name, default) in QUERY_CLASSES.items():
+        seconds = float(os.getenv(name, default))
+        timeouts[query_class] = seconds if seconds > 0 else None
+    return timeouts
+
+
+def is_timeout(error):
+    """True if a Neo4j error says the transaction ran into its timeout."""
+    return "TransactionTimedOut" in (getattr(error, "code", None) or "")
+
+
+class Cancelled(Exception):
+    """The chat turn a query or run belongs to was cancelled."""
+
+
+class CancelToken:
+    """
+    Cancellation flag of one chat turn.
+
+    Clients check it before every query and between streamed records, and tag the turn's transactions
+    with its turn_id, so transactions still running when the turn is cancelled can be terminated.
+    """
+
+    def __init__(self, turn_id=None):
+        self.turn_id = turn_id or uuid.uuid4().hex
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled(f"Turn {self.turn_id} was cancelled")
+
+
+class TransactionControl:
+    """
+    Timeouts, metadata and cancellation bookkeeping of a client's transactions, shared by
+    Neo4jClient and AsyncNeo4jClient.
+
+    The kill switch settings are read here; the clients run the periodic check themselves.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.timeouts = query_timeouts()
+        # This app's transactions (except writes) running longer than kill_after seconds are terminated, 0 disables it
+        self.kill_after = float(os.getenv("NEO4J_KILL_AFTER_SECONDS", "0"))
+        self.kill_check_interval = float(os.getenv("NEO4J_KILL_CHECK_SECONDS", "5"))
+        self._turns_in_flight = Counter()
+        self._lock = threading.Lock()
+
+    def config(self, query, query_class=None, cancel_token=None):
+        """
+        Timeout and metadata of a query's transaction; reads are "internal" and writes "write" by default.
+
+        Returns:
+            tuple: (timeout in seconds or None, metadata)
+        """
+        query_class = query_class or ("internal" if is_read_query(query) else "write")
+        metadata = {"app": TRANSACTION_APP, "class": query_class}
+        if cancel_token is not None:
+            metadata["turn"] = cancel_token.turn_id
+        return self.timeouts.get(query_class), metadata
+
+    def begin(self, cancel_token):
+        """Stop if the query's turn was cancelled, otherwise count the query as running for its turn."""
+        if cancel_token is None:
+            return
+        self.check(cancel_token)
+        with self._lock:
+            self._turns_in_flight[cancel_token.turn_id] += 1
+
+    def check(self, cancel_token):
+        """Raise Cancelled, and count it, if the turn was cancelled."""
+        if cancel_token is not None and cancel_token.cancelled:
+            self.metrics.interrupted("cancel")
+            cancel_token.raise_if_cancelled()
+
+    def end(self, cancel_token):
+        if cancel_token is None:
+            return
+        with self._lock:
+            self._turns_in_flight[cancel_token.turn_id] -= 1
+            if self._turns_in_flight[cancel_token.turn_id] <= 0:
+                del self._turns_in_flight[cancel_token.turn_id]
+
+    def running(self, turn_id):
+        """Number of queries of a turn currently running."""
+        with self._lock:
+            return self._turns_in_flight.get(turn_id, 0)
+
+    def terminate_params(self, older_than=0, turn_id=None, excluded_classes=()):
+        """Parameters of APP_TRANSACTIONS_QUERY."""
+        return {
+            "app": TRANSACTION_APP,
+            "min_ms": int(older_than * 1000),
+            "turn": turn_id,
+            "excluded_classes": list(excluded_classes),
+        }
@@ -0,0 +1,133 @@
+import re
+import copy
+import json
+import threading
+from collections import OrderedDict
+
+# Queries containing any of these clauses modify the graph and are never cached
+WRITE_CLAUSES = re.compile(
+    r"\b(CREATE|MERGE|DELETE|DETACH|SET|REMOVE|DROP|FOREACH|LOAD\s+CSV|TERMINATE)\b",
+    re.IGNORECASE
+)
+
+# CALL of a procedure (not of a CALL { ... } subquery, whose clauses are checked like the rest)
+PROCEDURE_CALL = re.compile(r"\bCALL\s+([A-Za-z_][\w.]*)", re.IGNORECASE)
+
+# Procedures known to only read; any other procedure may write and makes the query a write
+READ_PROCEDURES = re.compile(
+    r"^(db\.(labels|relationshipTypes|propertyKeys|indexes|constraints|schema\.\w+)|apoc\.meta\.\w+)$",
+    re.IGNORECASE
+)
+
+# String literals are scanned together with comments, so quotes in comments and // in strings are handled
+_LITERAL_OR_COMMENT = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|//[^\n]*|/\*.*?\*/", re.DOTALL)
+_QUOTED_NAME = re.compile(r"`[^`]*`")
+
+
+def mask_literals(query):
+    """Blank out string literals and comments without moving anything, so spans still fit the query."""
+    def mask(match):
+        text = match.group(0)
+        if text[0] in "'\"":
+            return text[0] + " " * (len(text) - 2) + text[-1]
+        return " " * len(text)
+    return _LITERAL_OR_COMMENT.sub(mask, query)
+
+
+def normalize_query(query):
+    """Collapse whitespace so formatting differences map to the same cache entry."""
+    return " ".join(query.split())
+
+
+def is_read_query(query):
+    """
+    Return True if the query contains no write clause and calls no procedure that may write.
+    Keywords inside string literals, comments and `quoted` names do not count.
+    """
+    masked = _QUOTED_NAME.sub(lambda m: " " * len(m.group(0)), mask_literals(query))
+    if WRITE_CLAUSES.search(masked):
+        return False
+    return all(READ_PROCEDURES.match(name) for name in PROCEDURE_CALL.findall(masked))
+
+
+class QueryResultCache:
+    """
+    LRU cache for Cypher query results, bounded by the approximate size of the
+    cached results in bytes.
+
+    Every entry belongs to a graph generation. When the generation changes
+    (the importer bumps it after each import) the whole cache is dropped.
+
+    Results are copied in and out, so callers may change the rows they get.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.generation = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query, params=None):
+        return (normalize_query(query), json.dumps(params or {}, sort_keys=True, default=str))
+
+    def get(self, query, params=None):
+        """
+        Return cached results for a query, or None on a miss.
+        """
+        key = self.make_key(query, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            results = entry[0]
+        return copy.deepcopy(results)
+
+    def put(self, query, params, results):
+        """Store query results, evicting least recently used entries to stay within max_bytes."""
+        key = self.make_key(query, params)
+        size = len(json.dumps(results, default=str))
+        if size > self.max_bytes:
+            return
+
+        results = copy.deepcopy(results)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self._entries[key] = (results, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def set_generation(self, generation):
+        """Record the current graph generation, clearing the cache if it changed."""
+        with self._lock:
+            if generation != self.generation:
+                if self.generation is not None:
+                    print(f"Graph generation changed to {generation}, clearing query result cache")
+                self._entries.clear()
+                self.current_bytes = 0
+                self.generation = generation
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -1,38 +1,130 @@
 import os
+import re
 import json
-import subprocess
-import tempfile
+import time
+import uuid
+import hashlib
+import threading
 from datetime import datetime
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
+from .typst_compiler import create_compiler
+
+# Bump whenever _create_typst_content changes its markup, so reports cached on disk are rebuilt
+TEMPLATE_VERSION = 1
+
+# Where reports are kept unless the generator is given a reports_dir
+DEFAULT_REPORTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'reports')
+
+# Build files this old were left behind by a process that stopped while compiling a report
+BUILD_FILE_MAX_AGE_SECONDS = 3600
+
 
 class TypstReportGenerator:
-    def __init__(self):
-        self.reports_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'reports')
-        os.makedirs(self.reports_dir, exist_ok=True)
+    """
+    Renders knowledgegraph data as Typst reports and compiles them to PDF.
+    
+    Reports are stored under a hash of the template version, title, data, question and context, so
+    an identical report is served from disk without running typst again (it keeps the date it was
+    first generated on). The reports directory is bounded by max_bytes and max_age_hours, evicting
+    the least recently served reports first; reports being built or served, or touched within
+    grace_seconds, are never evicted.
+    
+    PDFs are compiled by compiler (see utils.typst_compiler), by default the in-process typst bindings
+    when they are installed and the `typst` CLI otherwise.
+    """
+    
+    def __init__(self, max_bytes: int = 200 * 1024 * 1024, max_age_hours: float = 24, compiler=None,
+                 grace_seconds: float = 300, reports_dir: Optional[str] = None):
+        self.reports_dir = reports_dir or DEFAULT_REPORTS_DIR
+        # Reports are compiled here and moved into reports_dir only once both files are complete
+        self.build_dir = os.path.join(self.reports_dir, '.build')
+        os.makedirs(self.build_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_hours = max_age_hours
+        self.grace_seconds = grace_seconds
+        self.compiler = compiler or create_compiler()
+        self.hits = 0
+        self.misses = 0
+        # Identical reports requested concurrently are compiled once; other reports compile in parallel
+        self._key_locks = [threading.Lock() for _ in range(16)]
+        self._evict_lock = threading.Lock()
+        self._remove_stale_builds()
+    
+    @staticmethod
+    def report_key(title: str, data: List[Dict[str, Any]], user_question: str, context: str = "") -> str:
+        """Hash of everything a report's content depends on."""
+        payload = json.dumps(
+            {"template": TEMPLATE_VERSION, "title": title, "data": data, "question": user_question, "context": context},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _key_lock(self, key: str) -> threading.Lock:
+        """Lock held while a report is built, served from the cache or evicted."""
+        return self._key_locks[int(key[:8], 16) % len(self._key_locks)]
+    
+    def _report_paths(self, key: str) -> Tuple[str, str]:
+        base_filename = f"report_{key[:32]}"
+        return (os.path.join(self.reports_dir, f"{base_filename}.typ"),
+                os.path.join(self.reports_dir, f"{base_filename}.pdf"))
+    
+    def _cached(self, key: str) -> Optional[Tuple[str, str]]:
+        typst_file_path, pdf_file_path = self._report_paths(key)
+        try:
+            # Touching the files marks them as recently served for eviction
+            os.utime(typst_file_path)
+            os.utime(pdf_file_path)
+        except OSError:
+            return None
+        self.hits += 1
+        return typst_file_path, pdf_file_path
+    
+    def cached_report(self, title: str, data: List[Dict[str, Any]], user_question: str, context: str = "") -> Optional[Tuple[str, str]]:
+        """
+        Return the files of an identical report generated earlier, or None if there is none.
+        
+        Returns:
+            Tuple of (typst_file_path, pdf_file_path), or None
+        """
+        key = self.report_key(title, data, user_question, context)
+        with self._key_lock(key):
+            return self._cached(key)
     
     def generate_report(self, title: str, data: List[Dict[str, Any]], user_question: str, context: str = "") -> Tuple[str, str]:
         """
-        Generate a Typst report from knowledgegraph data and compile to PDF.
+        Generate a Typst report from knowledgegraph data and compile to PDF, or return the files
+        of an identical report generated earlier.
         
         Returns:
             Tuple of (typst_file_path, pdf_file_path)
         """
-        # Create timestamp for unique filenames
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_filename = f"report_{timestamp}"
-        
-        # Generate Typst content
-        typst_content = self._create_typst_content(title, data, user_question, context)
-        
-        # Write Typst file
-        typst_file_path = os.path.join(self.reports_dir, f"{base_filename}.typ")
-        with open(typst_file_path, 'w', encoding='utf-8') as f:
-            f.write(typst_content)
-        
-        # Compile to PDF
-        pdf_file_path = os.path.join(self.reports_dir, f"{base_filename}.pdf")
-        self._compile_to_pdf(typst_file_path, pdf_file_path)
+        key = self.report_key(title, data, user_question, context)
+        with self._key_lock(key):
+            cached = self._cached(key)
+            if cached is not None:
+                return cached
+            self.misses += 1
+            
+            # Generate Typst content
+            typst_content = self._create_typst_content(title, data, user_question, context)
+            
+            # Write and compile in the build directory, so a report is never served half written
+            build_name = f"{key[:32]}_{uuid.uuid4().hex[:8]}"
+            build_typst_path = os.path.join(self.build_dir, f"{build_name}.typ")
+            build_pdf_path = os.path.join(self.build_dir, f"{build_name}.pdf")
+            typst_file_path, pdf_file_path = self._report_paths(key)
+            try:
+                with open(build_typst_path, 'w', encoding='utf-8') as f:
+                    f.write(typst_content)
+                self._compile_to_pdf(build_typst_path, build_pdf_path)
+                os.replace(build_typst_path, typst_file_path)
+                os.replace(build_pdf_path, pdf_file_path)
+            finally:
+                for path in (build_typst_path, build_pdf_path):
+                    if os.path.exists(path):
+                        os.remove(path)
         
+        self.evict()
         return typst_file_path, pdf_file_path
     
     def _create_typst_content(self, title: str, data: List[Dict[str, Any]], user_question: str, context: str) -> str:
@@ -172,36 +264,84 @@ The following data was retrieved from the knowledgegraph:
     
     def _compile_to_pdf(self, typst_file_path: str, pdf_file_path: str):
         """Compile Typst file to PDF using the Typst compiler."""
-        try:
-            # Try to compile with typst
-            result = subprocess.run([
-                'typst', 'compile', typst_file_path, pdf_file_path
-            ], capture_output=True, text=True, check=True)
-            
-            print(f"Successfully compiled {typst_file_path} to {pdf_file_path}")
+        self.compiler.compile(typst_file_path, pdf_file_path)
+        print(f"Successfully compiled {typst_file_path} to {pdf_file_path} ({self.compiler.name})")
+    
+    def evict(self) -> int:
+        """
+        Remove reports not served for max_age_hours, then the least recently served ones until the
+        reports directory fits in max_bytes. Reports whose key lock is held (being built or served)
+        or that were touched within grace_seconds are skipped. Stale build files are removed as well.
+        
+        Returns:
+            Number of reports removed
+        """
+        with self._evict_lock:
+            self._remove_stale_builds()
+            reports = {}
+            for filename in os.listdir(self.reports_dir):
+                file_path = os.path.join(self.reports_dir, filename)
+                if not os.path.isfile(file_path):
+                    continue
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                # The .typ and .pdf files of a report are evicted together
+                report = reports.setdefault(os.path.splitext(filename)[0], {"files": [], "size": 0, "used": 0})
+                report["files"].append(file_path)
+                report["size"] += stat.st_size
+                report["used"] = max(report["used"], stat.st_mtime)
             
-        except subprocess.CalledProcessError as e:
-            print(f"Error compiling Typst file: {e}")
-            print(f"Stderr: {e.stderr}")
-            raise Exception(f"Failed to compile Typst to PDF: {e.stderr}")
-        
-        except FileNotFoundError:
-            raise Exception("Typst compiler not found. Please install Typst: https://typst.app/docs/installation/")
-    
-    def cleanup_old_reports(self, max_age_hours: int = 24):
-        """Remove old report files to prevent disk space buildup."""
-        import time
-        
-        current_time = time.time()
-        max_age_seconds = max_age_hours * 3600
-        
-        for filename in os.listdir(self.reports_dir):
-            file_path = os.path.join(self.reports_dir, filename)
-            if os.path.isfile(file_path):
-                file_age = current_time - os.path.getmtime(file_path)
-                if file_age > max_age_seconds:
-                    try:
-                        os.remove(file_path)
-                        print(f"Removed old report file: {filename}")
-                    except Exception as e:
-                        print(f"Could not remove {filename}: {e}")
\ No newline at end of file
+            total_bytes = sum(report["size"] for report in reports.values())
+            oldest_allowed = time.time() - self.max_age_hours * 3600
+            removed = 0
+            for name, report in sorted(reports.items(), key=lambda item: item[1]["used"]):
+                if report["used"] >= oldest_allowed and total_bytes <= self.max_bytes:
+                    break
+                if self._evict_report(name, report["files"]):
+                    total_bytes -= report["size"]
+                    removed += 1
+                    print(f"Evicted report: {name}")
+            return removed
+    
+    def _remove_stale_builds(self):
+        """
+        Remove build files not written to for BUILD_FILE_MAX_AGE_SECONDS. Other processes may share the
+        reports directory, so recent build files can belong to a report still being compiled.
+        """
+        oldest_allowed = time.time() - BUILD_FILE_MAX_AGE_SECONDS
+        for filename in os.listdir(self.build_dir):
+            file_path = os.path.join(self.build_dir, filename)
+            try:
+                if os.path.isfile(file_path) and os.stat(file_path).st_mtime < oldest_allowed:
+                    os.remove(file_path)
+                    print(f"Removed stale build file: {filename}")
+            except OSError as e:
+                print(f"Could not remove {filename}: {e}")
+    
+    def _evict_report(self, name: str, files: List[str]) -> bool:
+        """Remove the files of a report unless it is in use or was touched within the grace window."""
+        key = name[len("report_"):]
+        # Reports named by an older scheme have no key and are never built or served again
+        lock = self._key_lock(key) if re.fullmatch(r"[0-9a-f]{32}", key) else threading.Lock()
+        if not lock.acquire(blocking=False):
+            return False
+        try:
+            try:
+                used = max(os.stat(file_path).st_mtime for file_path in files)
+            except OSError:
+                return False
+            if used >= time.time() - self.grace_seconds:
+                return False
+            for file_path in files:
+                try:
+                    os.remove(file_path)
+                except OSError as e:
+                    print(f"Could not remove {os.path.basename(file_path)}: {e}")
+            return True
+        finally:
+            lock.release()
+    
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
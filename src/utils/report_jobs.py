@@ -0,0 +1,136 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ReportQueueFull(Exception):
+    """Raised when a report is submitted while max_pending reports are already queued or running."""
+
+
+class ReportJob:
+    """A report being compiled in the background, and its files or error once it is done."""
+
+    def __init__(self, title, records_count):
+        self.job_id = uuid.uuid4().hex
+        self.title = title
+        self.records_count = records_count
+        self.status = "queued"
+        self.typst_file = None
+        self.pdf_file = None
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Wait until the job is done, at most timeout seconds; returns whether it is done."""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        """The job in the shape of the report data the UI shows, plus job_id and status."""
+        report = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "title": self.title,
+            "records_count": self.records_count,
+        }
+        if self.status == "done":
+            report["typst_file"] = self.typst_file
+            report["pdf_file"] = self.pdf_file
+        elif self.status == "failed":
+            report["error"] = self.error
+        if self.finished is not None:
+            report["seconds"] = round(self.finished - self.submitted, 3)
+        return report
+
+
+class ReportJobQueue:
+    """
+    Compiles reports on a bounded pool of worker threads, so a tool call asking for a report returns
+    as soon as the job is queued instead of waiting for `typst compile`.
+
+    At most max_pending jobs are queued or running at a time; submitting more raises ReportQueueFull.
+    Finished jobs are kept for polling until there are more than max_jobs of them, oldest first.
+    """
+
+    def __init__(self, report_generator, max_workers=2, max_jobs=200, max_pending=50):
+        self.report_generator = report_generator
+        self.max_jobs = max_jobs
+        self.max_pending = max_pending
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+
+    def submit(self, title, data, user_question, context="", on_done=None):
+        """
+        Queue a report for compilation.
+
+        Args:
+            on_done (callable, optional): Called with the job from the worker thread when it is done
+
+        Returns:
+            ReportJob: The queued job
+
+        Raises:
+            ReportQueueFull: If max_pending jobs are already queued or running
+        """
+        job = ReportJob(title, len(data) if data else 0)
+        with self._lock:
+            self._evict()
+            if len(self._jobs) - self._finished_count() >= self.max_pending:
+                raise ReportQueueFull(f"{self.max_pending} reports are already being generated, try again later")
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, data, user_question, context, on_done)
+        return job
+
+    def get(self, job_id):
+        """The job with this id, or None if it is unknown or was evicted."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, data, user_question, context, on_done):
+        job.status = "running"
+        try:
+            job.typst_file, job.pdf_file = self.report_generator.generate_report(
+                title=job.title,
+                data=data,
+                user_question=user_question,
+                context=context
+            )
+            job.status = "done"
+        except Exception as e:
+            print(f"Error generating report {job.job_id}: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        job.finished = time.time()
+        job._done.set()
+        if on_done is not None:
+            try:
+                on_done(job)
+            except Exception as e:
+                print(f"Error in report job callback: {e}")
+
+    def _finished_count(self):
+        return sum(1 for job in self._jobs.values() if job.done)
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for job in jobs:
+            counts[job.status] += 1
+        return counts
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
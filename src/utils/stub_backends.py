@@ -0,0 +1,387 @@
+"""
+Stand-ins for OpenAI and Neo4j used by benchmarks and local testing.
+
+StubOpenAIServer is a local HTTP server speaking the subset of the Assistants API the agents use
+(assistants, threads, messages, runs with and without streaming, threads created with their
+first run, chat completions). Every run and
+completion takes `model_latency` seconds, like a real model would. Runs answer user questions by calling query_knowledgegraph once,
+Cypher generation prompts with a fixed query, and tool outputs with a short summary.
+
+StubNeo4jClient and AsyncStubNeo4jClient return the processes from data/process.csv after
+`query_latency` seconds instead of talking to a database.
+"""
+
+import os
+import csv
+import json
+import time
+import uuid
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_CYPHER_QUERY = "MATCH (p:process) RETURN p.name AS process"
+
+
+def _load_processes():
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
+    with open(os.path.join(data_dir, 'process.csv'), newline='', encoding='utf-8') as f:
+        return [{"process": row["Name"]} for row in csv.DictReader(f)]
+
+
+def _new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Benchmarks open many connections at once; the default backlog of 5 would refuse some
+    request_queue_size = 256
+
+
+class StubOpenAIServer:
+    """Local HTTP server emulating the Assistants API endpoints used by the agents."""
+
+    def __init__(self, model_latency=0.5, host="127.0.0.1", port=0):
+        self.model_latency = model_latency
+        self.threads = {}
+        self.runs = {}
+        self.assistants = {}
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._httpd = _StubHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # Object factories
+
+    def _message(self, thread_id, role, text):
+        return {
+            "id": _new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": role,
+            "status": "completed",
+            "assistant_id": None,
+            "run_id": None,
+            "attachments": [],
+            "metadata": {},
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        }
+
+    def _run(self, thread_id, assistant_id, status, required_action=None):
+        return {
+            "id": _new_id("run"),
+            "object": "thread.run",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "assistant_id": assistant_id,
+            "status": status,
+            "required_action": required_action,
+            "last_error": None,
+            "model": "stub",
+            "instructions": "",
+            "tools": [],
+            "metadata": {},
+            "parallel_tool_calls": True,
+        }
+
+    def _plan_run(self, thread_id, assistant_id=None):
+        """Decide how a run on this thread ends: (status, reply text or tool calls)."""
+        messages = self.threads[thread_id]
+        last = messages[-1]
+        if last["role"] == "tool":
+            return "completed", f"Stub answer based on {last['content']} tool results from the knowledgegraph."
+        text = last["content"][0]["text"]["value"] if isinstance(last["content"], list) else last["content"]
+        if text.startswith("Generate a Neo4j Cypher query"):
+            return "completed", STUB_CYPHER_QUERY
+        arguments = {"user_question": text}
+        # Assistants created in inline Cypher mode take the query as a tool argument
+        tools = self.assistants.get(assistant_id, {}).get("tools", [])
+        for tool in tools:
+            if tool.get("function", {}).get("name") == "query_knowledgegraph":
+                if "cypher" in tool["function"]["parameters"]["properties"]:
+                    arguments["cypher"] = STUB_CYPHER_QUERY
+        return "requires_action", [{
+            "id": _new_id("call"),
+            "type": "function",
+            "function": {
+                "name": "query_knowledgegraph",
+                "arguments": json.dumps(arguments),
+            },
+        }]
+
+    def _finish_run(self, run, status, payload):
+        """Apply the planned outcome to a run, adding the assistant reply to its thread."""
+        run["status"] = status
+        if status == "requires_action":
+            run["required_action"] = {"type": "submit_tool_outputs", "submit_tool_outputs": {"tool_calls": payload}}
+            return None
+        run["required_action"] = None
+        message = self._message(run["thread_id"], "assistant", payload)
+        self.threads[run["thread_id"]].append(message)
+        return message
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _start_events(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+            def _send_event(self, name, data):
+                self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            def _stream_run(self, run, status, payload):
+                self._start_events()
+                self._send_event("thread.run.created", dict(run, status="queued"))
+                self._send_event("thread.run.in_progress", dict(run, status="in_progress"))
+                time.sleep(server.model_latency)
+                with server._lock:
+                    message = server._finish_run(run, status, payload)
+                if message is not None:
+                    self._send_event("thread.message.created", dict(message, status="in_progress", content=[]))
+                    for word in payload.split(" "):
+                        self._send_event("thread.message.delta", {
+                            "id": message["id"],
+                            "object": "thread.message.delta",
+                            "delta": {"content": [{"index": 0, "type": "text", "text": {"value": word + " "}}]},
+                        })
+                    self._send_event("thread.message.completed", message)
+                self._send_event(f"thread.run.{status}", dict(run))
+                self.wfile.write(b"event: done\ndata: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _schedule_run(self, run, status, payload):
+                """Non-streaming runs finish in the background after model_latency."""
+                def finish():
+                    time.sleep(server.model_latency)
+                    with server._lock:
+                        server._finish_run(run, status, payload)
+                run["status"] = "in_progress"
+                threading.Thread(target=finish, daemon=True).start()
+                self._send_json(dict(run))
+
+            def do_GET(self):
+                server.request_count += 1
+                parts = self.path.split("?")[0].strip("/").split("/")[1:]
+                with server._lock:
+                    if parts == ["assistants"]:
+                        return self._send_json({"object": "list", "data": list(server.assistants.values()),
+                                                "has_more": False, "first_id": None, "last_id": None})
+                    if len(parts) == 2 and parts[0] == "assistants":
+                        return self._send_json(server.assistants[parts[1]])
+                    if len(parts) == 2 and parts[0] == "threads":
+                        return self._send_json({"id": parts[1], "object": "thread", "created_at": 0, "metadata": {}})
+                    if len(parts) == 3 and parts[2] == "messages":
+                        data = list(reversed(server.threads[parts[1]]))
+                        data = [m for m in data if m["role"] != "tool"]
+                        return self._send_json({"object": "list", "data": data, "has_more": False,
+                                                "first_id": None, "last_id": None})
+                    if len(parts) == 4 and parts[2] == "runs":
+                        return self._send_json(dict(server.runs[parts[3]]))
+                self._send_json({"error": {"message": "not found"}}, status=404)
+
+            def do_DELETE(self):
+                server.request_count += 1
+                parts = self.path.strip("/").split("/")[1:]
+                with server._lock:
+                    if parts[0] == "assistants":
+                        server.assistants.pop(parts[1], None)
+                        return self._send_json({"id": parts[1], "object": "assistant.deleted", "deleted": True})
+                    server.threads.pop(parts[1], None)
+                self._send_json({"id": parts[1], "object": "thread.deleted", "deleted": True})
+
+            def do_POST(self):
+                server.request_count += 1
+                body = self._read_json()
+                parts = self.path.split("?")[0].strip("/").split("/")[1:]
+
+                if parts == ["assistants"]:
+                    assistant = {"id": _new_id("asst"), "object": "assistant", "created_at": int(time.time()),
+                                 "name": body.get("name"), "model": body.get("model"),
+                                 "instructions": body.get("instructions"), "tools": body.get("tools", []),
+                                 "metadata": body.get("metadata") or {}, "description": None}
+                    with server._lock:
+                        server.assistants[assistant["id"]] = assistant
+                    return self._send_json(assistant)
+
+                if parts == ["chat", "completions"]:
+                    time.sleep(server.model_latency)
+                    return self._send_json({
+                        "id": _new_id("chatcmpl"),
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [{
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": json.dumps({"cypher": STUB_CYPHER_QUERY})},
+                        }],
+                    })
+
+                if parts == ["threads"]:
+                    thread_id = _new_id("thread")
+                    with server._lock:
+                        server.threads[thread_id] = [
+                            server._message(thread_id, m["role"], m["content"]) for m in body.get("messages", [])
+                        ]
+                    return self._send_json({"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}})
+
+                if len(parts) == 3 and parts[2] == "messages":
+                    with server._lock:
+                        message = server._message(parts[1], body["role"], body["content"])
+                        server.threads[parts[1]].append(message)
+                    return self._send_json(message)
+
+                if parts[-1] == "runs" and body.get("assistant_id") not in server.assistants:
+                    return self._send_json({"error": {"message": f"No assistant found with id '{body.get('assistant_id')}'."}},
+                                           status=404)
+
+                if parts == ["threads", "runs"]:
+                    thread_id = _new_id("thread")
+                    with server._lock:
+                        server.threads[thread_id] = [
+                            server._message(thread_id, m["role"], m["content"])
+                            for m in (body.get("thread") or {}).get("messages", [])
+                        ]
+                    parts = ["threads", thread_id, "runs"]
+
+                if len(parts) == 3 and parts[2] == "runs":
+                    with server._lock:
+                        for m in body.get("additional_messages") or []:
+                            server.threads[parts[1]].append(server._message(parts[1], m["role"], m["content"]))
+                        run = server._run(parts[1], body.get("assistant_id"), "queued")
+                        server.runs[run["id"]] = run
+                        status, payload = server._plan_run(parts[1], body.get("assistant_id"))
+                    if body.get("stream"):
+                        return self._stream_run(run, status, payload)
+                    return self._schedule_run(run, status, payload)
+
+                if len(parts) == 5 and parts[4] == "submit_tool_outputs":
+                    with server._lock:
+                        run = server.runs[parts[3]]
+                        server.threads[run["thread_id"]].append({"role": "tool", "content": len(body["tool_outputs"])})
+                        status, payload = server._plan_run(run["thread_id"], run["assistant_id"])
+                    if body.get("stream"):
+                        return self._stream_run(run, status, payload)
+                    return self._schedule_run(run, status, payload)
+
+                if len(parts) == 5 and parts[4] == "cancel":
+                    with server._lock:
+                        run = server.runs[parts[3]]
+                        run["status"] = "cancelled"
+                    return self._send_json(dict(run))
+
+                self._send_json({"error": {"message": "not found"}}, status=404)
+
+        return Handler
+
+
+class StubNeo4jClient:
+    """Neo4jClient stand-in returning the sample processes after a fixed latency."""
+
+    def __init__(self, query_latency=0.05):
+        self.query_latency = query_latency
+        self.rows = _load_processes()
+        self.query_count = 0
+
+    def execute_query(self, query, params=None, raise_errors=False, query_class=None, cancel_token=None):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        self.query_count += 1
+        time.sleep(self.query_latency)
+        return [dict(row) for row in self.rows]
+
+    def fetch_rows(self, query, params=None, max_rows=None, raise_errors=False, query_class=None, cancel_token=None):
+        rows = self.execute_query(query, params, cancel_token=cancel_token)
+        return rows, len(rows)
+
+    def explain(self, query, params=None):
+        return {"plan": None, "notifications": []}
+
+    def health(self):
+        return {"status": "ok", "latency_ms": 0.0, "server": "stub", "database": None}
+
+    def get_metrics(self):
+        return {"queries": self.query_count}
+
+    def terminate_transactions(self, older_than=0, turn_id=None, excluded_classes=()):
+        return 0
+
+    def cancel(self, cancel_token):
+        cancel_token.cancel()
+        return 0
+
+    def close(self):
+        pass
+
+
+class AsyncStubNeo4jClient(StubNeo4jClient):
+    """AsyncNeo4jClient stand-in returning the sample processes after a fixed latency."""
+
+    async def execute_query(self, query, params=None, raise_errors=False, query_class=None, cancel_token=None):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        self.query_count += 1
+        await asyncio.sleep(self.query_latency)
+        return [dict(row) for row in self.rows]
+
+    async def fetch_rows(self, query, params=None, max_rows=None, raise_errors=False, query_class=None, cancel_token=None):
+        rows = await self.execute_query(query, params, cancel_token=cancel_token)
+        return rows, len(rows)
+
+    async def explain(self, query, params=None):
+        return {"plan": None, "notifications": []}
+
+    async def health(self):
+        return {"status": "ok", "latency_ms": 0.0, "server": "stub", "database": None}
+
+    async def terminate_transactions(self, older_than=0, turn_id=None, excluded_classes=()):
+        return 0
+
+    async def cancel(self, cancel_token):
+        cancel_token.cancel()
+        return 0
+
+    async def close(self):
+        pass
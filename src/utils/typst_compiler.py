@@ -0,0 +1,125 @@
+import os
+import threading
+import subprocess
+
+try:
+    import typst
+except ImportError:
+    typst = None
+
+# How reports are compiled to PDF
+BACKENDS = ["auto", "bindings", "cli"]
+
+
+class TypstCliCompiler:
+    """Compiles each report with a fresh `typst compile` process, which loads the fonts every time."""
+
+    name = "cli"
+
+    def compile(self, typst_file_path, pdf_file_path):
+        try:
+            subprocess.run([
+                'typst', 'compile', typst_file_path, pdf_file_path
+            ], capture_output=True, text=True, check=True)
+
+        except subprocess.CalledProcessError as e:
+            print(f"Error compiling Typst file: {e}")
+            print(f"Stderr: {e.stderr}")
+            raise Exception(f"Failed to compile Typst to PDF: {e.stderr}")
+
+        except FileNotFoundError:
+            raise Exception("Typst compiler not found. Please install Typst: https://typst.app/docs/installation/")
+
+    def warm_up(self):
+        pass
+
+
+class TypstBindingsCompiler:
+    """
+    Compiles reports in process with the typst Python bindings.
+
+    The fonts are discovered once and shared by a pool of up to pool_size compilers, which stay alive
+    between reports and keep what they have already parsed and laid out, such as the report preamble.
+    Each compiler is used by one report at a time, so up to pool_size reports compile in parallel.
+
+    Errors in the document (TypstError) fail the report. Any other failure of the bindings, such as
+    fonts that cannot be loaded or a panic, discards the compiler and compiles the report with the
+    `typst` CLI instead.
+    """
+
+    name = "bindings"
+
+    def __init__(self, pool_size=2):
+        if typst is None:
+            raise RuntimeError("The typst Python package is not installed")
+        self.pool_size = max(1, pool_size)
+        self._fonts = None
+        self._created = 0
+        self._idle = []
+        # Notified when a compiler is returned to the pool or dropped from it
+        self._available = threading.Condition()
+        self.fallback = TypstCliCompiler()
+        self.fallbacks = 0
+
+    def _acquire(self):
+        """Take an idle compiler, create one while the pool is not full, or wait for one otherwise."""
+        with self._available:
+            while not self._idle and self._created >= self.pool_size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            if self._fonts is None:
+                self._fonts = typst.Fonts()
+            compiler = typst.Compiler(font_paths=self._fonts)
+            self._created += 1
+            return compiler
+
+    def _release(self, compiler):
+        with self._available:
+            self._idle.append(compiler)
+            self._available.notify()
+
+    def _discard(self):
+        """Drop a broken compiler, so a report waiting for one can create a new compiler instead."""
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def compile(self, typst_file_path, pdf_file_path):
+        compiler = None
+        try:
+            compiler = self._acquire()
+            compiler.compile(input=typst_file_path, output=pdf_file_path, format="pdf",
+                             root=os.path.dirname(os.path.abspath(typst_file_path)))
+        except typst.TypstError as e:
+            if compiler is not None:
+                self._release(compiler)
+            print(f"Error compiling Typst file: {e.diagnostic or e.message}")
+            raise Exception(f"Failed to compile Typst to PDF: {e.message}")
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except BaseException as e:
+            # Panics of the bindings do not derive from Exception; the compiler may be broken, so drop it
+            if compiler is not None:
+                self._discard()
+            self.fallbacks += 1
+            print(f"Typst bindings failed ({type(e).__name__}: {e}), compiling with the CLI instead")
+            self.fallback.compile(typst_file_path, pdf_file_path)
+        else:
+            self._release(compiler)
+
+    def warm_up(self):
+        """Discover the fonts and create a compiler now instead of on the first report."""
+        self._release(self._acquire())
+
+
+def create_compiler(backend="auto", pool_size=2):
+    """
+    Create the Typst compiler for a backend: "bindings", "cli", or "auto" for the bindings when
+    the typst package is installed and the CLI otherwise.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown Typst backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    if backend == "cli" or (backend == "auto" and typst is None):
+        return TypstCliCompiler()
+    return TypstBindingsCompiler(pool_size=pool_size)
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from api_server import ReportRequest, create_app
+
+
+class RecordingAgent:
+    def __init__(self):
+        self.reports = []
+
+    async def generate_report(self, report_title, user_question, neo4j_client, context="", cypher=None):
+        self.reports.append(cypher)
+        return {"report": {"job_id": "job-1", "state": "queued"}, "executed_queries": [], "metrics": {}}
+
+
+def post_report(query_enabled, **body):
+    app = create_app(api_keys=["key"], query_enabled=query_enabled)
+    app.state.agent = RecordingAgent()
+    app.state.neo4j_client = None
+    endpoint = next(route.endpoint for route in app.routes if getattr(route, "path", None) == "/reports")
+    response = asyncio.run(endpoint(ReportRequest(question="Which processes are there?", **body)))
+    return response, app.state.agent.reports
+
+
+@pytest.mark.parametrize("cypher", [
+    "CREATE (p:process {name: 'Injected'})",
+    "MATCH (n) DETACH DELETE n",
+    "CALL apoc.periodic.iterate('MATCH (n) RETURN n', 'DETACH DELETE n', {})",
+])
+def test_report_cypher_must_only_read(cypher):
+    with pytest.raises(HTTPException) as error:
+        post_report(True, cypher=cypher)
+    assert error.value.status_code == 400
+
+
+def test_report_cypher_needs_query_enabled():
+    with pytest.raises(HTTPException) as error:
+        post_report(False, cypher="MATCH (p:process) RETURN p.name")
+    assert error.value.status_code == 403
+
+
+def test_reports_without_cypher_or_with_read_queries_are_queued():
+    response, reports = post_report(False)
+    assert response.status_code == 202 and reports == [None]
+    response, reports = post_report(True, cypher="MATCH (p:process) RETURN p.name")
+    assert response.status_code == 202 and reports == ["MATCH (p:process) RETURN p.name"]
+
+
+def test_query_route_needs_query_enabled():
+    paths = {getattr(route, "path", None) for route in create_app(api_keys=["key"], query_enabled=False).routes}
+    assert "/query" not in paths and "/reports" in paths
+
+
+def test_full_report_queue_is_a_503():
+    class BusyAgent(RecordingAgent):
+        async def generate_report(self, *args, **kwargs):
+            return {"report": {"error": "2 reports are already being generated", "title": "t", "queue_full": True},
+                    "executed_queries": [], "metrics": {}}
+
+    app = create_app(api_keys=["key"], query_enabled=False)
+    app.state.agent = BusyAgent()
+    app.state.neo4j_client = None
+    endpoint = next(route.endpoint for route in app.routes if getattr(route, "path", None) == "/reports")
+    response = asyncio.run(endpoint(ReportRequest(question="Which processes are there?")))
+    assert response.status_code == 503 and "Retry-After" in response.headers
@@ -0,0 +1,85 @@
+import json
+import pytest
+from types import SimpleNamespace
+from openai.types.beta import Assistant
+from agent.assistant_registry import AssistantRegistry
+
+DEFINITION = {
+    "name": "Knowledgegraph Assistant",
+    "model": "gpt-4o",
+    "instructions": "Answer questions about the knowledgegraph.",
+    "tools": [{"type": "function", "function": {"name": "query_knowledgegraph", "parameters": {"type": "object"}}}],
+}
+
+
+class FakeAssistants:
+    def __init__(self):
+        self.created = []
+        self.calls = 0
+
+    def retrieve(self, assistant_id):
+        self.calls += 1
+        raise LookupError(assistant_id)
+
+    def list(self, limit=100):
+        self.calls += 1
+        return list(self.created)
+
+    def create(self, metadata=None, **definition):
+        self.calls += 1
+        assistant = Assistant(id=f"asst_{len(self.created)}", created_at=0, object="assistant",
+                              metadata=metadata, **definition)
+        self.created.append(assistant)
+        return assistant
+
+
+def fake_client(base_url="https://api.openai.com/v1/"):
+    return SimpleNamespace(base_url=base_url, beta=SimpleNamespace(assistants=FakeAssistants()))
+
+
+@pytest.fixture
+def cache_file(tmp_path, monkeypatch):
+    monkeypatch.delenv("OPENAI_ASSISTANT_ID", raising=False)
+    return str(tmp_path / "assistants.json")
+
+
+def test_resolves_from_memory_and_disk_without_api_calls(cache_file):
+    client = fake_client()
+    assistant = AssistantRegistry(cache_file).resolve(client, DEFINITION)
+    calls = client.beta.assistants.calls
+
+    assert AssistantRegistry(cache_file).resolve(client, DEFINITION).id == assistant.id
+    assert client.beta.assistants.calls == calls
+
+
+def test_other_base_url_is_resolved_again_and_replaces_the_entry(cache_file):
+    registry = AssistantRegistry(cache_file)
+    registry.resolve(fake_client(), DEFINITION)
+    stub = fake_client("http://127.0.0.1:51234/v1/")
+    registry.resolve(stub, DEFINITION)
+
+    assert stub.beta.assistants.created
+    with open(cache_file, encoding="utf-8") as f:
+        stored = json.load(f)
+    assert [entry["base_url"] for entry in stored.values()] == ["http://127.0.0.1:51234/v1/"]
+
+
+def test_changed_definition_drops_the_old_entry(cache_file):
+    registry = AssistantRegistry(cache_file)
+    client = fake_client()
+    registry.resolve(client, DEFINITION)
+    registry.resolve(client, {**DEFINITION, "instructions": "Answer briefly."})
+    registry.resolve(client, {**DEFINITION, "name": "Knowledgegraph Assistant (inline Cypher)"})
+
+    with open(cache_file, encoding="utf-8") as f:
+        stored = json.load(f)
+    assert sorted(entry["name"] for entry in stored.values()) == [
+        "Knowledgegraph Assistant", "Knowledgegraph Assistant (inline Cypher)"
+    ]
+
+
+def test_entries_of_the_old_layout_are_ignored(cache_file):
+    with open(cache_file, "w", encoding="utf-8") as f:
+        json.dump({"https://api.openai.com/v1/#abc": {"id": "asst_old"}}, f)
+    client = fake_client()
+    assert AssistantRegistry(cache_file).resolve(client, DEFINITION).id == "asst_0"
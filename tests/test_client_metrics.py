@@ -0,0 +1,10 @@
+from database.client_metrics import ClientMetrics, pool_usage
+
+
+def test_pool_usage_is_estimated_from_queries_in_flight():
+    metrics = ClientMetrics()
+    for _ in range(3):
+        metrics.begin(True)
+    metrics.end(0.01)
+    assert pool_usage(metrics.to_dict(), 2) == {"in_use": 2, "waiting": 0, "peak_in_use": 2, "max_size": 2}
+    assert pool_usage(metrics.to_dict(), 1) == {"in_use": 1, "waiting": 1, "peak_in_use": 1, "max_size": 1}
@@ -0,0 +1,83 @@
+import os
+import re
+from contextlib import contextmanager
+import pytest
+from database.csv_importer import CSVImporter
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+class CountingClient:
+    """Answers the validation count queries with the counts an import of the local files creates."""
+
+    def __init__(self, counts):
+        self.counts = counts
+
+    def execute_query(self, query):
+        match = re.search(r"\(n:(\w+)\)|\[:(\w+)\]", query)
+        name = match.group(1) or match.group(2)
+        return [{"count": count for spec_id, count in self.counts.items() if spec_id.startswith(name + ":")}]
+
+
+class SystemClient:
+    def __init__(self, edition="enterprise", meta_database=None, default_database="neo4j"):
+        self.meta_database = meta_database
+        self.answers = {"dbms.components": {"edition": edition}, "DEFAULT DATABASE": {"name": default_database}}
+
+    @contextmanager
+    def session(self, database):
+        assert database == "system"
+        yield self
+
+    def run(self, query):
+        answers = self.answers
+
+        class Result:
+            def single(self):
+                return next(answer for key, answer in answers.items() if key in query)
+
+        return Result()
+
+
+def make_importer(client=None, blue_green_databases=()):
+    importer = CSVImporter.__new__(CSVImporter)
+    importer.data_dir = DATA_DIR
+    importer.local = True
+    importer.client = importer.meta_client = client
+    importer.blue_green_databases = list(blue_green_databases)
+    return importer
+
+
+def test_expected_counts_leave_out_relationships_to_missing_nodes(capsys):
+    importer = make_importer()
+    files = importer._hash_local_files()
+    expected = importer._expected_counts(files)
+    # One role_step.csv row names "Preventative Maintenance Specialist", which is a role, not a step
+    assert expected["performs:role_step.csv"] == len(files["performs:role_step.csv"]) - 1
+    assert expected["has_step:process_step.csv"] == len(files["has_step:process_step.csv"])
+    assert "Preventative Maintenance Specialist" in capsys.readouterr().out
+
+
+def test_validation_passes_a_complete_import_of_the_shipped_data():
+    importer = make_importer()
+    importer.client = CountingClient(importer._expected_counts(importer._hash_local_files()))
+    importer.validate_import()
+
+    importer.client.counts["supports:step_system.csv"] -= 1
+    with pytest.raises(Exception, match="supports:step_system.csv has"):
+        importer.validate_import()
+
+
+def test_blue_green_needs_enterprise_edition():
+    blue_green = ["kg-blue", "kg-green"]
+    assert make_importer(SystemClient("enterprise"), blue_green).supports_blue_green()
+    assert not make_importer(SystemClient("community"), blue_green).supports_blue_green()
+
+
+@pytest.mark.parametrize("client", [
+    SystemClient(meta_database="kg-blue"),
+    SystemClient(default_database="kg-green"),
+])
+def test_marker_database_must_not_be_part_of_the_pair(client):
+    with pytest.raises(ValueError, match="must not be one of"):
+        make_importer(client, ["kg-blue", "kg-green"]).supports_blue_green()
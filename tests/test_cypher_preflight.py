@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+from agent.cypher_preflight import CypherPreflight, CypherPreflightError
+
+
+class FakeNeo4jError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class ExplainClient:
+    def __init__(self, explained=None, error=None):
+        self.explained = explained or {"plan": None, "notifications": []}
+        self.error = error
+        self.queries = []
+
+    def explain(self, query, params=None):
+        self.queries.append(query)
+        if self.error is not None:
+            raise self.error
+        return self.explained
+
+
+class AsyncExplainClient(ExplainClient):
+    async def explain(self, query, params=None):
+        return super().explain(query, params)
+
+
+@pytest.fixture
+def preflight():
+    return CypherPreflight(max_path_length=4, max_estimated_rows=1000)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("MATCH (p:Process)-[:HAS_STEP]->(s:step) RETURN s.name",
+     "MATCH (p:process)-[:has_step]->(s:step) RETURN s.name"),
+    ("MATCH (s:step)-[:has_step]->(p:process) RETURN p.name",
+     "MATCH (s:step)<-[:has_step]-(p:process) RETURN p.name"),
+    ("MATCH (p:process)-[:has_step*]->(s) RETURN s",
+     "MATCH (p:process)-[:has_step*1..4]->(s) RETURN s"),
+    ("MATCH (p:process)-[:has_step*2..]->(s) RETURN s",
+     "MATCH (p:process)-[:has_step*2..4]->(s) RETURN s"),
+    ("MATCH (s:step)<-[:has_step]-(p:process) RETURN p.name",
+     "MATCH (s:step)<-[:has_step]-(p:process) RETURN p.name"),
+    ("MATCH (p:process {name: '(x:Foo)-[:BAR]->(y)'}) RETURN p",
+     "MATCH (p:process {name: '(x:Foo)-[:BAR]->(y)'}) RETURN p"),
+])
+def test_static_check_rewrites_slips(preflight, query, expected):
+    assert preflight.check_static(query) == expected
+
+
+@pytest.mark.parametrize("query, code", [
+    ("   ", "empty_query"),
+    ("MATCH (x:customer) RETURN x", "unknown_label"),
+    ("MATCH (p:process)-[:owns]->(d) RETURN d", "unknown_relationship_type"),
+    ("MATCH (p:process) RETURN p.owner", "unknown_property"),
+    ("MATCH (p:process {owner: 'IT'}) RETURN p", "unknown_property"),
+    ("MATCH (p:process)-[r:has_step]->(s) RETURN r.since", "unknown_property"),
+    ("MATCH (p:process)-[:has_step*1..10]->(s) RETURN s", "path_too_long"),
+    ("MATCH (p:process)-[:performs]->(s:step) RETURN s", "wrong_endpoints"),
+])
+def test_static_check_rejects(preflight, query, code):
+    with pytest.raises(CypherPreflightError) as error:
+        preflight.check_static(query)
+    assert error.value.code == code
+
+
+def test_plan_check_rejects_cartesian_products(preflight):
+    explained = {"plan": {"operatorType": "ProduceResults", "children": [{"operatorType": "CartesianProduct@neo4j"}]},
+                 "notifications": []}
+    with pytest.raises(CypherPreflightError) as error:
+        preflight.check_plan(explained)
+    assert error.value.code == "cartesian_product"
+
+
+def test_plan_check_rejects_large_row_estimates(preflight):
+    explained = {"plan": {"operatorType": "ProduceResults", "args": {"EstimatedRows": 10.0},
+                          "children": [{"operatorType": "AllNodesScan", "args": {"EstimatedRows": 5000.0}}]},
+                 "notifications": []}
+    with pytest.raises(CypherPreflightError) as error:
+        preflight.check_plan(explained)
+    assert error.value.code == "row_estimate"
+    preflight.check_plan({"plan": {"operatorType": "ProduceResults", "args": {"EstimatedRows": 10.0}}})
+
+
+def test_check_explains_the_rewritten_query(preflight):
+    client = ExplainClient()
+    assert preflight.check("MATCH (p:Process) RETURN p.name", client) == "MATCH (p:process) RETURN p.name"
+    assert client.queries == ["MATCH (p:process) RETURN p.name"]
+
+
+def test_check_rejects_statement_errors_and_passes_on_others(preflight):
+    syntax_error = FakeNeo4jError("Neo.ClientError.Statement.SyntaxError", "Invalid input 'RETRUN'")
+    with pytest.raises(CypherPreflightError) as error:
+        preflight.check("MATCH (p:process) RETRUN p", ExplainClient(error=syntax_error))
+    assert error.value.code == "Neo.ClientError.Statement.SyntaxError"
+
+    unavailable = FakeNeo4jError("Neo.TransientError.General.DatabaseUnavailable", "Database unavailable")
+    assert preflight.check("MATCH (p:process) RETURN p", ExplainClient(error=unavailable)) == \
+        "MATCH (p:process) RETURN p"
+
+
+def test_check_async_matches_check(preflight):
+    client = AsyncExplainClient()
+    query = asyncio.run(preflight.check_async("MATCH (s:step)-[:has_step]->(p:process) RETURN p", client))
+    assert query == "MATCH (s:step)<-[:has_step]-(p:process) RETURN p"
+    assert client.queries == [query]
@@ -0,0 +1,67 @@
+import os
+import pytest
+from database.graph_snapshot import GraphSnapshot
+
+CSV_FILES = {
+    "department.csv": "Name,Description\nTechnology,Runs the platform\n",
+    "process.csv": "Name,Description\nCar Rental,Renting cars\nCar Maintenance,Keeping cars running\n",
+    "system.csv": "Category,Name,Description\nCustomer-Facing System,Mobile App,Booking app\nBackend,Fleet Telematics,Vehicle data\n",
+    "role.csv": "Name,Description\nCustomer Service Agent,Helps members\nFleet Operator,Runs the fleet\n",
+    "process_step.csv": "Process,Step,Description\nCar Rental,Booking,Members book a car\nCar Rental,Vehicle Access,Members unlock the car\n",
+    "process_department.csv": "Process,Department\nCar Rental,Technology\nCar Rental,Unknown Department\n",
+    "role_step.csv": "Role,Step\nCustomer Service Agent,Booking\nFleet Operator,Vehicle Access\n",
+    "step_system.csv": "Step,System\nBooking,Mobile App\nVehicle Access,Mobile App\nVehicle Access,Fleet Telematics\n",
+}
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    for file_name, content in CSV_FILES.items():
+        (tmp_path / file_name).write_text(content, encoding="utf-8")
+    return GraphSnapshot.from_csv(str(tmp_path))
+
+
+def test_from_csv_loads_nodes_and_relationships(snapshot, tmp_path):
+    # Relationships to nodes that do not exist, like "Unknown Department", are skipped
+    assert snapshot.stats()["nodes"] == 9
+    assert snapshot.stats()["relationships"] == 8
+    assert snapshot.generation == max(os.path.getmtime(tmp_path / name) for name in CSV_FILES)
+    assert {"label": "step", "name": "Booking"} in snapshot.entity_rows()
+
+
+def test_adjacency_in_both_directions(snapshot):
+    car_rental = snapshot.node_id("process", "Car Rental")
+    steps = [snapshot.prop(s, "name") for s in snapshot.outgoing(car_rental, "has_step")]
+    assert steps == ["Booking", "Vehicle Access"]
+    booking = snapshot.node_id("step", "Booking")
+    assert [snapshot.prop(p, "name") for p in snapshot.incoming(booking, "has_step")] == ["Car Rental"]
+    assert list(snapshot.outgoing(snapshot.node_id("process", "Car Maintenance"), "has_step")) == []
+
+
+@pytest.mark.parametrize("template_name, name, rows", [
+    ("steps_of_process", "Car Rental", [
+        {"step": "Booking", "description": "Members book a car"},
+        {"step": "Vehicle Access", "description": "Members unlock the car"},
+    ]),
+    ("roles_in_process", "Car Rental", [
+        {"role": "Customer Service Agent", "step": "Booking"},
+        {"role": "Fleet Operator", "step": "Vehicle Access"},
+    ]),
+    ("systems_for_process", "Car Rental", [
+        {"system": "Mobile App", "category": "Customer-Facing System"},
+        {"system": "Fleet Telematics", "category": "Backend"},
+    ]),
+    ("systems_for_step", "Booking", [{"system": "Mobile App", "category": "Customer-Facing System"}]),
+    ("owner_of_process", "Car Rental", [{"department": "Technology"}]),
+    ("owner_of_process", "Car Sharing", []),
+])
+def test_answers_templates(snapshot, template_name, name, rows):
+    assert snapshot.answer(template_name, {"name": name}) == rows
+
+
+def test_answers_list_templates_and_passes_on_unknown_ones(snapshot):
+    assert snapshot.answer("list_roles", {}) == [
+        {"role": "Customer Service Agent", "description": "Helps members"},
+        {"role": "Fleet Operator", "description": "Runs the fleet"},
+    ]
+    assert snapshot.answer("busiest_roles", {}) is None
@@ -0,0 +1,76 @@
+import pytest
+from agent.query_cache import CypherQueryCache, normalize_text, tokenize
+
+QUESTION = ("Which roles perform steps of the Car Rental process that are supported by "
+            "the Mobile Application Platform")
+CYPHER = ("MATCH (r:role)-[:PERFORMS]->(s:step)<-[:HAS_STEP]-(p:process {name: 'Car Rental'}), "
+          "(s)-[:SUPPORTED_BY]->(:system {name: 'Mobile Application Platform'}) RETURN DISTINCT r.name")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CypherQueryCache(cache_file=str(tmp_path / "cypher_cache.json"))
+    cache.put(QUESTION, "", CYPHER)
+    return cache
+
+
+def test_exact_hit_ignores_case_and_punctuation(cache):
+    assert cache.get(QUESTION.upper() + "?") == CYPHER
+    assert cache.hits == 1
+
+
+def test_near_duplicate_reuses_query(cache):
+    assert cache.get(QUESTION.replace("Which roles", "Show me the roles")) == CYPHER
+    assert cache.near_hits == 1
+
+
+@pytest.mark.parametrize("question", [
+    QUESTION.replace("that are supported", "that are not supported"),
+    QUESTION.replace("that are supported", "that aren't supported"),
+    QUESTION.replace("roles perform", "roles never perform"),
+    QUESTION.replace("Which roles", "Which roles only"),
+    QUESTION.replace("Which roles", "Which two roles"),
+])
+def test_near_duplicate_with_other_qualifiers_is_a_miss(cache, question):
+    assert cache.get(question) is None
+    assert cache.misses == 1
+
+
+def test_near_duplicate_with_other_literal_is_a_miss(cache):
+    assert cache.get(QUESTION.replace("Car Rental", "Car Maintenance")) is None
+
+
+def test_contractions_are_spelled_out():
+    assert normalize_text("Which steps don't use it?") == "which steps do not use it"
+    assert "not" in tokenize("Roles that aren't assigned")
+
+
+def test_cache_is_persisted(cache):
+    cache.flush()
+    reloaded = CypherQueryCache(cache_file=cache.cache_file)
+    assert reloaded.get(QUESTION) == CYPHER
+
+
+def test_saves_are_batched(tmp_path, monkeypatch):
+    writes = []
+    monkeypatch.setattr("agent.query_cache.write_json_atomic", lambda path, payload: writes.append(payload))
+    cache = CypherQueryCache(cache_file=str(tmp_path / "cypher_cache.json"), save_delay=60)
+    for i in range(5):
+        cache.put(f"question {i}", "", f"RETURN {i}")
+    assert writes == []
+    cache.flush()
+    cache.flush()
+    assert len(writes) == 1 and len(writes[0]["entries"]) == 5
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path):
+    from database.json_files import write_json_atomic
+    with pytest.raises(TypeError):
+        write_json_atomic(str(tmp_path / "state.json"), {"value": object()})
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_schema_change_discards_cache(cache):
+    cache.flush()
+    reloaded = CypherQueryCache(cache_file=cache.cache_file, schema_hash="other")
+    assert reloaded.get(QUESTION) is None
@@ -0,0 +1,96 @@
+import pytest
+from agent.query_templates import QueryTemplateEngine, TemplateMatch
+
+INDEX_ROWS = [
+    {"label": "process", "name": "Car Rental"},
+    {"label": "process", "name": "Car Maintenance"},
+    {"label": "step", "name": "Reservation and Booking"},
+    {"label": "system", "name": "Mobile Application Platform"},
+    {"label": "department", "name": "Technology"},
+    {"label": "customer", "name": "Jane Doe"},
+]
+
+
+@pytest.fixture
+def engine():
+    engine = QueryTemplateEngine()
+    assert engine.needs_refresh()
+    engine.load_index(INDEX_ROWS)
+    assert not engine.needs_refresh()
+    return engine
+
+
+@pytest.mark.parametrize("question, template_name, params", [
+    ("What are the steps of the Car Rental process?", "steps_of_process", {"name": "Car Rental"}),
+    ("Who performs the steps of car rental", "roles_in_process", {"name": "Car Rental"}),
+    ("Which systems support Car Maintenance?", "systems_for_process", {"name": "Car Maintenance"}),
+    ("Which systems are used in Reservation and Booking?", "systems_for_step", {"name": "Reservation and Booking"}),
+    ("Who owns the Car Rental process?", "owner_of_process", {"name": "Car Rental"}),
+    ("List all processes", "list_processes", {}),
+    ("show me the systems", "list_systems", {}),
+])
+def test_common_questions_match_a_template(engine, question, template_name, params):
+    match = engine.match(question)
+    assert match is not None
+    assert (match.template_name, match.params) == (template_name, params)
+    assert engine.hits == 1
+
+
+@pytest.mark.parametrize("question", [
+    "Why does Car Rental have so many steps?",
+    "Which steps of Car Rental are not supported by a system?",
+    "What are the steps of Car Rental and Car Maintenance?",
+    "Which roles and systems are involved in Car Rental?",
+    "What are the steps of the onboarding process?",
+    "Summarize the Car Rental process",
+    "",
+])
+def test_other_questions_go_to_the_llm(engine, question):
+    assert engine.match(question) is None
+    assert engine.misses == 1
+
+
+def test_entities_prefer_the_longest_name(engine):
+    engine.load_index(INDEX_ROWS + [{"label": "step", "name": "Car Rental Return"}])
+    assert engine.find_entities("steps after car rental return") == [("step", "Car Rental Return")]
+    assert engine.stats()["names"] == 6
+
+
+def test_format_answer():
+    match = TemplateMatch("systems_for_process", "", {"name": "Car Rental"}, "Systems supporting the Car Rental process")
+    answer = QueryTemplateEngine.format_answer(match, [
+        {"system": "Mobile Application Platform", "category": "Customer-Facing System"},
+        {"system": "Fleet Telematics", "category": None},
+    ])
+    assert answer == ("**Systems supporting the Car Rental process** (2)\n\n"
+                      "- **Mobile Application Platform** (Customer-Facing System)\n"
+                      "- **Fleet Telematics**")
+    assert "no matching data" in QueryTemplateEngine.format_answer(match, [])
+
+
+@pytest.mark.parametrize("question", [
+    "Does Car Rental have steps?",
+    "Is the Customer Portal used by Car Rental?",
+    "What is the first step of Car Rental?",
+    "Which step comes next after Vehicle Inspection?",
+])
+def test_yes_no_and_ordinal_questions_are_not_answered_directly(question):
+    assert not QueryTemplateEngine.answers_directly(question)
+    assert not QueryTemplateEngine.answers_directly(question, in_conversation=True)
+
+
+@pytest.mark.parametrize("question", [
+    "and its first step?",
+    "Which systems support it?",
+    "What about the Fleet Manager role?",
+    "Who owns that process?",
+])
+def test_follow_ups_in_a_conversation_are_not_answered_directly(question):
+    assert not QueryTemplateEngine.answers_directly(question, in_conversation=True)
+
+
+def test_standalone_questions_are_answered_directly():
+    question = "What are the steps of the Car Rental process?"
+    assert QueryTemplateEngine.answers_directly(question)
+    assert QueryTemplateEngine.answers_directly(question, in_conversation=True)
+    assert QueryTemplateEngine.answers_directly("Who owns that process?")
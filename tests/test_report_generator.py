@@ -0,0 +1,96 @@
+import os
+import time
+import pytest
+from utils.report_generator import BUILD_FILE_MAX_AGE_SECONDS, TypstReportGenerator
+
+ROWS = [{"process": "Car Rental", "owner": "Fleet"}, {"process": "Car Maintenance", "owner": "Service"}]
+
+
+class FakeCompiler:
+    name = "fake"
+
+    def __init__(self):
+        self.compiled = 0
+
+    def compile(self, typst_file_path, pdf_file_path):
+        self.compiled += 1
+        with open(typst_file_path, 'rb') as source, open(pdf_file_path, 'wb') as pdf:
+            pdf.write(b"%PDF-" + source.read())
+
+
+@pytest.fixture
+def generator(tmp_path):
+    return TypstReportGenerator(compiler=FakeCompiler(), grace_seconds=0, reports_dir=str(tmp_path))
+
+
+def age(files, seconds):
+    for file_path in files:
+        used = time.time() - seconds
+        os.utime(file_path, (used, used))
+
+
+def test_identical_report_is_served_from_disk(generator):
+    first = generator.generate_report("Processes", ROWS, "Which processes exist?")
+    second = generator.generate_report("Processes", ROWS, "Which processes exist?")
+    assert first == second
+    assert generator.compiler.compiled == 1
+    assert generator.stats() == {"hits": 1, "misses": 1}
+    assert generator.cached_report("Processes", ROWS, "Which processes exist?") == first
+
+
+def test_different_data_is_a_new_report(generator):
+    first = generator.generate_report("Processes", ROWS, "Which processes exist?")
+    second = generator.generate_report("Processes", ROWS[:1], "Which processes exist?")
+    assert first != second
+    assert generator.compiler.compiled == 2
+    assert os.listdir(generator.build_dir) == []
+
+
+def test_evicts_reports_older_than_max_age(generator):
+    old = generator.generate_report("Old", ROWS, "q")
+    age(old, 25 * 3600)
+    new = generator.generate_report("New", ROWS, "q")
+    assert not any(os.path.exists(file_path) for file_path in old)
+    assert all(os.path.exists(file_path) for file_path in new)
+
+
+def test_evicts_least_recently_served_reports_over_max_bytes(generator):
+    first = generator.generate_report("First", ROWS, "q")
+    second = generator.generate_report("Second", ROWS, "q")
+    age(first, 20)
+    age(second, 10)
+    generator.max_bytes = sum(os.path.getsize(file_path) for file_path in first) + 1
+    generator.cached_report("First", ROWS, "q")
+    age(first, 5)
+    generator.evict()
+    assert all(os.path.exists(file_path) for file_path in first)
+    assert not any(os.path.exists(file_path) for file_path in second)
+
+
+def test_eviction_skips_recent_and_locked_reports(generator):
+    recent = generator.generate_report("Recent", ROWS, "q")
+    locked = generator.generate_report("Locked", ROWS, "q")
+    age(locked, 25 * 3600)
+    generator.grace_seconds = 60
+    generator.max_bytes = 0
+    key = generator.report_key("Locked", ROWS, "q")
+    with generator._key_lock(key):
+        assert generator.evict() == 0
+    assert all(os.path.exists(file_path) for file_path in recent + locked)
+    assert generator.evict() == 1
+    assert not any(os.path.exists(file_path) for file_path in locked)
+
+
+def test_stale_build_files_are_removed(tmp_path):
+    build_dir = tmp_path / ".build"
+    build_dir.mkdir()
+    stale, current = build_dir / "stale.typ", build_dir / "current.typ"
+    stale.write_text("= Stale")
+    current.write_text("= Current")
+    age([stale], BUILD_FILE_MAX_AGE_SECONDS + 60)
+
+    generator = TypstReportGenerator(compiler=FakeCompiler(), reports_dir=str(tmp_path))
+    assert os.listdir(generator.build_dir) == ["current.typ"]
+    age([current], BUILD_FILE_MAX_AGE_SECONDS + 60)
+    generator.evict()
+    assert os.listdir(generator.build_dir) == []
@@ -0,0 +1,32 @@
+import threading
+import pytest
+from utils.report_jobs import ReportJobQueue, ReportQueueFull
+
+
+class BlockingGenerator:
+    """Generates reports only once released, so submitted jobs stay queued or running."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def generate_report(self, title, data, user_question, context):
+        self.release.wait(30)
+        return f"{title}.typ", f"{title}.pdf"
+
+
+def test_submit_refuses_jobs_over_max_pending():
+    generator = BlockingGenerator()
+    jobs = ReportJobQueue(generator, max_workers=1, max_pending=2)
+    try:
+        first = jobs.submit("first", [], "q")
+        jobs.submit("second", [], "q")
+        with pytest.raises(ReportQueueFull):
+            jobs.submit("third", [], "q")
+
+        generator.release.set()
+        assert first.wait(30)
+        jobs.get(jobs.submit("third", [], "q").job_id).wait(30)
+        assert jobs.stats() == {"queued": 0, "running": 0, "done": 3, "failed": 0}
+    finally:
+        generator.release.set()
+        jobs.shutdown()
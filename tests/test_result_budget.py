@@ -0,0 +1,66 @@
+import json
+import pytest
+from agent import result_budget
+from agent.result_budget import ResultBudget
+
+
+def decode_columnar(text):
+    """Rows of a columnar tool output, with shared value references resolved."""
+    encoded = json.loads(text.split("\n\nNote: ")[0])
+    values = encoded.get("values", [])
+    return [
+        {column: values[int(cell[1:])] if isinstance(cell, str) and cell.startswith("$") else cell
+         for column, cell in zip(encoded["columns"], row)}
+        for row in encoded["rows"]
+    ]
+
+
+def test_unknown_encoding_is_rejected():
+    with pytest.raises(ValueError):
+        ResultBudget(encoding="xml")
+
+
+def test_columnar_round_trips_and_shares_repeated_values():
+    description = "Handles every customer facing booking"
+    rows = [{"step": f"Step {i}", "description": description, "order": i} for i in range(3)]
+    rows.append({"step": "$0", "description": None, "order": 3})
+    text, selected = ResultBudget().format_rows(rows)
+    assert selected == rows
+    assert text.count(description) == 1
+    assert decode_columnar(text) == rows
+    assert '"$0" stand for' in text
+
+
+def test_rows_beyond_the_budget_are_left_out_with_a_note():
+    rows = [{"name": f"Process {i}"} for i in range(50)]
+    text, selected = ResultBudget(max_rows=10, encoding="json").format_rows(rows, total_rows=120)
+    assert len(selected) == 10
+    assert "Showing 10 of 120 rows, 110 rows were left out" in text
+
+    text, selected = ResultBudget(max_bytes=100, encoding="json").format_rows(rows)
+    assert 0 < len(selected) < 50
+    assert f"Showing {len(selected)} of 50 rows" in text
+
+
+def test_one_row_is_sent_even_if_it_exceeds_the_byte_budget():
+    budget = ResultBudget(max_bytes=10, max_value_chars=50, encoding="json")
+    text, selected = budget.format_rows([{"description": "x" * 200}])
+    assert selected == [{"description": "x" * 50 + "…"}]
+    assert "1 long text values were shortened to 50 characters." in text
+
+
+def test_tsv_escapes_separators():
+    text, _ = ResultBudget(encoding="tsv").format_rows([{"name": "a\tb", "note": "line\nbreak", "count": None}])
+    assert text == "name\tnote\tcount\na\\tb\tline\\nbreak\t"
+
+
+def test_json_encoding_is_compact():
+    text, _ = ResultBudget(encoding="json").format_rows([{"name": "Car Rental", "steps": 5}])
+    assert text == '[{"name":"Car Rental","steps":5}]'
+
+
+def test_token_count_is_estimated_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(result_budget, "tiktoken", None)
+    monkeypatch.setattr(result_budget, "_tokenizer", None)
+    assert result_budget.count_tokens("x" * 10) == 3
+    assert result_budget.tokens_are_estimated()
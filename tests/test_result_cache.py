@@ -0,0 +1,68 @@
+import pytest
+from database.result_cache import QueryResultCache, is_read_query, mask_literals
+
+
+@pytest.mark.parametrize("query", [
+    "MATCH (s:step) WHERE s.name = 'Set up rental' RETURN s",
+    "MATCH (s:step {name: \"Create account\"}) RETURN s.name",
+    "MATCH (p:process) // delete this later\nRETURN p",
+    "MATCH (p:process) /* MERGE\n duplicates */ RETURN p.name AS `set`",
+    "MATCH (n) WHERE n.url = 'http://example.com/remove' RETURN n",
+    "CALL db.labels() YIELD label RETURN label",
+    "CALL apoc.meta.graph()",
+    "MATCH (p:process) CALL { WITH p MATCH (p)-[:HAS_STEP]->(s) RETURN count(s) AS steps } RETURN p, steps",
+    "SHOW TRANSACTIONS YIELD transactionId RETURN transactionId",
+])
+def test_read_queries(query):
+    assert is_read_query(query)
+
+
+@pytest.mark.parametrize("query", [
+    "CREATE (p:process {name: 'Car Rental'})",
+    "MATCH (p:process {name: 'x'}) SET p.owner = 'y'",
+    "MATCH (n) DETACH DELETE n",
+    "MERGE (s:system {name: $name})",
+    "LOAD CSV WITH HEADERS FROM 'file:///processes.csv' AS row RETURN row",
+    "TERMINATE TRANSACTIONS $ids",
+    "CALL apoc.create.node(['process'], {name: 'x'})",
+    "CALL apoc.periodic.iterate('MATCH (n) RETURN n', 'DETACH DELETE n', {})",
+    "MATCH (n) WHERE n.name = 'it''s' DELETE n",
+])
+def test_write_queries(query):
+    assert not is_read_query(query)
+
+
+def test_mask_literals_keeps_positions():
+    query = "MATCH (n {name: 'Set // x'}) // CREATE\nRETURN n"
+    masked = mask_literals(query)
+    assert len(masked) == len(query)
+    assert "Set" not in masked and "CREATE" not in masked
+    assert masked.endswith("RETURN n")
+
+
+def test_result_cache_is_bounded_and_lru():
+    cache = QueryResultCache(max_bytes=60)
+    cache.put("MATCH (a) RETURN a", {}, [{"name": "a" * 10}])
+    cache.put("MATCH (b) RETURN b", {}, [{"name": "b" * 10}])
+    assert cache.get("MATCH   (a)  RETURN a") is not None
+    cache.put("MATCH (c) RETURN c", {}, [{"name": "c" * 10}])
+    assert cache.get("MATCH (b) RETURN b") is None
+    assert cache.get("MATCH (a) RETURN a") == [{"name": "a" * 10}]
+    assert cache.current_bytes <= cache.max_bytes
+
+
+def test_result_cache_keys_on_params():
+    cache = QueryResultCache()
+    cache.put("MATCH (p {name: $name}) RETURN p", {"name": "x"}, [1])
+    assert cache.get("MATCH (p {name: $name}) RETURN p", {"name": "y"}) is None
+
+
+def test_result_cache_hands_out_copies():
+    cache = QueryResultCache()
+    rows = [{"process": "Car Rental", "steps": ["Booking"]}]
+    cache.put("MATCH (p:process) RETURN p.name AS process", None, rows)
+    rows[0]["process"] = "changed after put"
+    cached = cache.get("MATCH (p:process) RETURN p.name AS process")
+    cached[0]["steps"].append("changed after get")
+    cached.clear()
+    assert cache.get("MATCH (p:process) RETURN p.name AS process") == [{"process": "Car Rental", "steps": ["Booking"]}]
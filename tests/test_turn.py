@@ -0,0 +1,115 @@
+import json
+import time
+from types import SimpleNamespace
+import pytest
+from agent.metrics import TurnMetrics
+from agent.turn import PendingMessages, RunOutcome, Turn, LOCAL_THREAD_PREFIX
+
+RESPONSE_KEYS = {"message", "thread_id", "executed_queries", "generated_reports", "metrics", "answered_by", "status", "error"}
+
+
+def event(name, data):
+    return SimpleNamespace(event=name, data=data)
+
+
+def text_delta(text):
+    content = SimpleNamespace(type="text", text=SimpleNamespace(value=text))
+    return event("thread.message.delta", SimpleNamespace(delta=SimpleNamespace(content=[content])))
+
+
+def message_completed(text):
+    return event("thread.message.completed",
+                 SimpleNamespace(content=[SimpleNamespace(type="text", text=SimpleNamespace(value=text))]))
+
+
+def run(status, tool_calls=(), thread_id="thread_1"):
+    required_action = SimpleNamespace(submit_tool_outputs=SimpleNamespace(tool_calls=list(tool_calls)))
+    return SimpleNamespace(id="run_1", thread_id=thread_id, status=status, required_action=required_action,
+                           last_error=None)
+
+
+def tool_call(call_id, name, arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+def test_run_outcome_reads_a_stream():
+    outcome = RunOutcome(TurnMetrics("stream"))
+    deltas = []
+    for stream_event in [event("thread.run.created", run("queued")), text_delta("Hel"), text_delta("lo"),
+                         message_completed("Hello"), event("thread.run.completed", run("completed"))]:
+        deltas += outcome.read(stream_event)
+    assert [delta["text"] for delta in deltas] == ["Hel", "lo"]
+    assert outcome.finish().status == "completed"
+    assert outcome.message_text == "Hello"
+
+
+def test_run_outcome_ignores_run_steps():
+    # The tool calls step completes before the run asks for its tool outputs
+    outcome = RunOutcome(TurnMetrics("stream"))
+    for stream_event in [event("thread.run.step.created", run("in_progress")),
+                         event("thread.run.step.completed", run("completed")),
+                         event("thread.run.requires_action", run("requires_action"))]:
+        outcome.read(stream_event)
+    assert outcome.finish().status == "requires_action"
+
+    outcome = RunOutcome(TurnMetrics("stream"))
+    outcome.read(event("thread.run.step.completed", run("completed")))
+    with pytest.raises(Exception, match="before the run reached a final state"):
+        outcome.finish()
+
+
+def test_run_outcome_without_text_and_unfinished_streams():
+    outcome = RunOutcome(TurnMetrics("stream"), emit_text=False)
+    assert outcome.read(text_delta("SELECT")) == []
+    with pytest.raises(Exception, match="before the run reached a final state"):
+        outcome.finish()
+    with pytest.raises(Exception, match="Run stream error"):
+        outcome.read(event("error", "server_error"))
+
+
+def test_turn_merges_tool_outcomes_in_call_order():
+    calls = [tool_call("call_1", "query_knowledgegraph", {"user_question": "a"}),
+             tool_call("call_2", "generate_report", {"report_title": "b"})]
+    turn = Turn(TurnMetrics("stream"))
+    turn.follow(run("requires_action", calls))
+    assert [e["name"] for e in turn.tool_call_events()] == ["query_knowledgegraph", "generate_report"]
+
+    outputs = turn.add_tool_outcomes(calls, [("rows", [{"query": "q1", "results": []}], []),
+                                             ("report", [{"query": "q2", "results": [1]}], [{"title": "b"}])])
+    assert outputs == [{"tool_call_id": "call_1", "output": "rows"}, {"tool_call_id": "call_2", "output": "report"}]
+    assert [e["type"] for e in turn.result_events()] == ["query_result", "query_result", "report"]
+    assert turn.result_events() == []
+
+
+def test_turn_thread_ids():
+    assert Turn(TurnMetrics("stream"), f"{LOCAL_THREAD_PREFIX}abc").openai_thread_id is None
+    assert Turn(TurnMetrics("stream"), "thread_1").openai_thread_id == "thread_1"
+    assert Turn.start_messages([("user", "q"), ("assistant", "a")], "next") == [
+        {"role": "user", "content": "q"}, {"role": "assistant", "content": "a"}, {"role": "user", "content": "next"}
+    ]
+
+
+def test_every_response_has_the_same_keys():
+    turn = Turn(TurnMetrics("stream"), "thread_1")
+    responses = [turn.done("answer")["response"], turn.cancelled()["response"],
+                 turn.failed(ValueError("boom"))["response"],
+                 turn.done("answer", answered_by="template")["response"]]
+    assert all(set(response) == RESPONSE_KEYS for response in responses)
+    assert [response["status"] for response in responses] == ["success", "cancelled", "error", "success"]
+    assert responses[2]["error"] == "boom"
+
+
+def test_pending_messages_are_bounded(monkeypatch):
+    pending = PendingMessages(max_threads=2, ttl=60)
+    pending.add("thread_1", [("user", "q1")])
+    pending.add("thread_2", [("user", "q2")])
+    pending.add("thread_1", [("assistant", "a1")])
+    pending.add("thread_3", [("user", "q3")])
+    # thread_2 was used least recently
+    assert len(pending) == 2 and pending.take("thread_2") == []
+    assert pending.take("thread_1") == [("user", "q1"), ("assistant", "a1")]
+    assert pending.take("thread_1") == []
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert pending.take("thread_3") == [] and len(pending) == 0
@@ -0,0 +1,91 @@
+import threading
+import pytest
+from utils.typst_compiler import TypstBindingsCompiler, TypstCliCompiler, create_compiler
+
+typst = pytest.importorskip("typst")
+
+
+class RecordingCompiler:
+    def __init__(self):
+        self.calls = []
+
+    def compile(self, typst_file_path, pdf_file_path):
+        self.calls.append((typst_file_path, pdf_file_path))
+
+
+class BrokenBindings:
+    def compile(self, **kwargs):
+        raise RuntimeError("could not load fonts")
+
+
+@pytest.fixture
+def document(tmp_path):
+    typst_file_path = tmp_path / "report.typ"
+    typst_file_path.write_text("= Processes\n\n- Car Rental\n", encoding="utf-8")
+    return str(typst_file_path), str(tmp_path / "report.pdf")
+
+
+def test_compiles_with_bindings(document):
+    compiler = TypstBindingsCompiler(pool_size=1)
+    compiler.compile(*document)
+    with open(document[1], 'rb') as f:
+        assert f.read(5) == b"%PDF-"
+    assert compiler.fallbacks == 0
+
+
+def test_document_errors_are_not_retried_with_the_cli(document):
+    with open(document[0], 'w', encoding='utf-8') as f:
+        f.write("#let x = (")
+    compiler = TypstBindingsCompiler(pool_size=1)
+    compiler.fallback = RecordingCompiler()
+    with pytest.raises(Exception, match="Failed to compile Typst to PDF"):
+        compiler.compile(*document)
+    assert compiler.fallback.calls == []
+
+
+def test_binding_failures_fall_back_to_the_cli(document):
+    compiler = TypstBindingsCompiler(pool_size=1)
+    compiler.fallback = RecordingCompiler()
+    compiler._created = 1
+    compiler._release(BrokenBindings())
+    compiler.compile(*document)
+    assert compiler.fallback.calls == [document]
+    assert compiler.fallbacks == 1
+    # The broken compiler is dropped and replaced by a new one
+    compiler.compile(*document)
+    assert compiler.fallbacks == 1
+
+
+def test_dropping_a_broken_compiler_wakes_a_waiting_report(document, tmp_path):
+    failing = threading.Event()
+
+    class SlowBrokenBindings(BrokenBindings):
+        def compile(self, **kwargs):
+            failing.wait(30)
+            super().compile(**kwargs)
+
+    compiler = TypstBindingsCompiler(pool_size=1)
+    compiler.fallback = RecordingCompiler()
+    compiler._created = 1
+    compiler._release(SlowBrokenBindings())
+    broken_report = threading.Thread(target=compiler.compile, args=document)
+    broken_report.start()
+    # The only compiler of the pool is busy, so the second report waits for it
+    waiting_report = threading.Thread(target=compiler.compile, args=(document[0], str(tmp_path / "second.pdf")))
+    waiting_report.start()
+    waiting_report.join(0.2)
+    assert waiting_report.is_alive()
+
+    failing.set()
+    broken_report.join(30)
+    waiting_report.join(30)
+    assert not waiting_report.is_alive()
+    assert compiler.fallback.calls == [document]
+    assert (tmp_path / "second.pdf").exists() and compiler._created == 1
+
+
+def test_create_compiler():
+    assert isinstance(create_compiler("cli"), TypstCliCompiler)
+    assert isinstance(create_compiler("auto"), TypstBindingsCompiler)
+    with pytest.raises(ValueError):
+        create_compiler("watch")